@@ -0,0 +1,110 @@
+"""
+Agent Pilot - Peticiones de respaldo (hedging)
+==============================================
+FAST y CREATIVE dependen de una sola llamada a DeepSeek, así que su
+latencia de cola es la nuestra. Con hedging, si la llamada principal no ha
+terminado cuando supera el percentil p90 (móvil) de ese proveedor, se
+lanza una llamada de respaldo con otra key (o con el proveedor de
+respaldo); gana la primera respuesta válida y la otra se cancela.
+
+Un presupuesto limita las llamadas extra (p. ej. 5% de las llamadas), de
+modo que la cola baja sin duplicar el gasto. Los proveedores no usan
+streaming, así que el umbral se aplica a la respuesta completa y no al
+primer token.
+"""
+
+from collections import deque
+from typing import Dict, Optional
+
+
+class LatencyWindow:
+    """Últimas N latencias de un proveedor, con percentiles."""
+
+    def __init__(self, size: int = 200):
+        self._values: deque = deque(maxlen=size)
+        self._sorted: Optional[list] = None
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def add(self, seconds: float) -> None:
+        self._values.append(seconds)
+        self._sorted = None
+
+    def percentile(self, p: float) -> float:
+        if self._sorted is None:
+            self._sorted = sorted(self._values)
+        index = min(len(self._sorted) - 1, int(p * len(self._sorted)))
+        return self._sorted[index]
+
+
+class HedgePolicy:
+    """Cuándo lanzar una llamada de respaldo y cuántas se permiten."""
+
+    def __init__(
+        self,
+        percentile: float = 0.9,
+        budget: float = 0.05,
+        window: int = 200,
+        min_samples: int = 20,
+        min_delay: float = 0.5,
+        budget_window: int = 1000
+    ):
+        """
+        Args:
+            percentile: Percentil de latencia tras el que se lanza el respaldo
+            budget: Fracción máxima de llamadas extra (0.05 = 5%)
+            window: Latencias recientes por proveedor que se consideran
+            min_samples: Latencias necesarias antes de activar el hedging
+            min_delay: Espera mínima (s) antes de un respaldo
+            budget_window: Llamadas sobre las que se mide el presupuesto
+        """
+        self.percentile = percentile
+        self.budget = budget
+        self.window = window
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.budget_window = budget_window
+        self._latencies: Dict[str, LatencyWindow] = {}
+        self.calls = 0
+        self.hedges = 0
+        self.backup_wins = 0
+
+    def record(self, provider: str, seconds: float) -> None:
+        """Latencia de una llamada principal."""
+        latencies = self._latencies.get(provider)
+        if latencies is None:
+            latencies = self._latencies[provider] = LatencyWindow(self.window)
+        latencies.add(seconds)
+
+    def delay(self, provider: str) -> Optional[float]:
+        """Segundos tras los que lanzar el respaldo (None: sin datos suficientes)."""
+        self.calls += 1
+        if self.calls > 2 * self.budget_window:
+            # Medir el presupuesto sobre las llamadas recientes
+            self.calls //= 2
+            self.hedges //= 2
+            self.backup_wins //= 2
+        latencies = self._latencies.get(provider)
+        if latencies is None or len(latencies) < self.min_samples:
+            return None
+        return max(self.min_delay, latencies.percentile(self.percentile))
+
+    def try_acquire(self) -> bool:
+        """Reserva un respaldo si el presupuesto lo permite."""
+        if self.hedges + 1 > self.budget * self.calls:
+            return False
+        self.hedges += 1
+        return True
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "backup_wins": self.backup_wins,
+            "threshold_s": {
+                provider: round(latencies.percentile(self.percentile), 3)
+                for provider, latencies in self._latencies.items() if len(latencies)
+            },
+        }
@@ -0,0 +1,211 @@
+"""
+Agent Pilot - Pools de API keys
+===============================
+Varias keys por proveedor (del sistema o BYOA) con rotación ponderada:
+
+- Peso de cada key = prioridad × cuota restante × penalización por 429
+  recientes × huecos libres. Una key que recibe un 429 se enfría unos
+  segundos (backoff exponencial).
+- Cada key tiene su propio límite de concurrencia.
+- El uso mensual (`uso_actual_mes`) de las keys BYOA se acumula en memoria
+  y se vuelca a la base de datos por lotes.
+
+El estado de cada key (semáforo, 429, uso, cliente del SDK) se guarda por
+huella de la key, así que se comparte entre peticiones y usuarios.
+"""
+
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Ventana (s) en la que cuentan los 429 para penalizar una key
+RATE_LIMIT_WINDOW = 60
+MAX_COOLDOWN = 60
+
+UsageSink = Callable[[Dict[str, int]], Awaitable[None]]
+
+
+def is_rate_limited(error: Optional[str]) -> bool:
+    """¿El error de un proveedor es un 429 / rate limit?"""
+    if not error:
+        return False
+    error = error.lower()
+    return "429" in error or "rate limit" in error or "rate_limit" in error
+
+
+@dataclass
+class KeySpec:
+    """Una key tal y como llega de Settings o de credenciales_api."""
+    api_key: str
+    priority: int = 0
+    monthly_limit: Optional[int] = None
+    used: int = 0
+    credential_id: Optional[str] = None  # Solo keys BYOA
+
+    @classmethod
+    def parse(cls, value: Union[str, dict, List]) -> List["KeySpec"]:
+        """
+        Normaliza una o varias keys: "k1,k2", ["k1", "k2"] o dicts con
+        api_key/priority/monthly_limit/used/credential_id.
+        """
+        if isinstance(value, str):
+            value = value.split(",")
+        elif isinstance(value, dict):
+            value = [value]
+
+        specs = []
+        for item in value:
+            if isinstance(item, KeySpec):
+                specs.append(item)
+            elif isinstance(item, dict):
+                specs.append(cls(**item))
+            elif item and item.strip():
+                specs.append(cls(api_key=item.strip()))
+        return specs
+
+    @property
+    def fingerprint(self) -> str:
+        return hashlib.sha256(self.api_key.encode()).hexdigest()[:16]
+
+
+@dataclass
+class KeyState:
+    """Estado vivo de una key."""
+    spec: KeySpec
+    concurrency: int
+    is_user_owned: bool = False
+    rate_limits: deque = field(default_factory=deque)
+    cooldown_until: float = 0.0
+    in_flight: int = 0
+    pending_usage: int = 0
+    provider: Any = None  # Instancia del proveedor (cliente SDK reutilizado)
+    _semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    @property
+    def exhausted(self) -> bool:
+        # Las llamadas en curso cuentan para no pasarse del límite en ráfagas
+        limit = self.spec.monthly_limit
+        return limit is not None and self.spec.used + self.in_flight >= limit
+
+    def recent_rate_limits(self, now: float) -> int:
+        while self.rate_limits and self.rate_limits[0] < now - RATE_LIMIT_WINDOW:
+            self.rate_limits.popleft()
+        return len(self.rate_limits)
+
+    def weight(self, now: float) -> float:
+        weight = 1.0 + max(0, self.spec.priority)
+        if self.spec.monthly_limit:
+            remaining = 1 - self.spec.used / self.spec.monthly_limit
+            weight *= max(0.05, remaining)
+        weight /= 1 + self.recent_rate_limits(now)
+        free = self.concurrency - self.in_flight
+        weight *= max(0.1, free / self.concurrency)
+        return weight
+
+    def record_rate_limit(self, now: float) -> None:
+        self.rate_limits.append(now)
+        self.cooldown_until = now + min(MAX_COOLDOWN, 2 ** self.recent_rate_limits(now))
+
+
+class KeyPoolManager:
+    """Registro de estados de key y contadores de uso pendientes."""
+
+    def __init__(
+        self,
+        key_concurrency: int = 8,
+        usage_sink: Optional[UsageSink] = None,
+        flush_interval: float = 30.0,
+        max_keys: int = 4096
+    ):
+        self.key_concurrency = key_concurrency
+        self.usage_sink = usage_sink
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        self._states: "OrderedDict[str, KeyState]" = OrderedDict()
+        self._last_flush = time.monotonic()
+        self._flushing = False
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def states_for(self, specs: List[KeySpec], is_user_owned: bool) -> List[KeyState]:
+        """Estados (creados o actualizados) para un conjunto de keys."""
+        states = []
+        for spec in specs:
+            fingerprint = spec.fingerprint
+            state = self._states.get(fingerprint)
+            if state is None:
+                state = KeyState(spec, self.key_concurrency, is_user_owned)
+                self._states[fingerprint] = state
+            else:
+                # Datos frescos de la BD sin perder el uso local aún no reflejado
+                used = max(state.spec.used, spec.used)
+                state.spec = spec
+                state.spec.used = used
+                self._states.move_to_end(fingerprint)
+            states.append(state)
+
+        while len(self._states) > self.max_keys:
+            fingerprint, state = next(iter(self._states.items()))
+            if state.in_flight or state.pending_usage:
+                self._states.move_to_end(fingerprint)
+                break
+            self._states.popitem(last=False)
+        return states
+
+    @staticmethod
+    def choose(states: List[KeyState], exclude: tuple = ()) -> Optional[KeyState]:
+        """Elige una key al azar ponderando por su peso."""
+        now = time.monotonic()
+        candidates = [s for s in states if s not in exclude and not s.exhausted]
+        ready = [s for s in candidates if s.cooldown_until <= now]
+        if not ready:
+            # Todas enfriándose: la que antes se recupere
+            return min(candidates, key=lambda s: s.cooldown_until, default=None)
+        return random.choices(ready, weights=[s.weight(now) for s in ready])[0]
+
+    def record_usage(self, state: KeyState) -> None:
+        state.spec.used += 1
+        if state.spec.credential_id:
+            state.pending_usage += 1
+        if (
+            self.usage_sink
+            and not self._flushing
+            and time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self._flush_task = asyncio.create_task(self.flush_usage())
+
+    async def flush_usage(self) -> None:
+        """Vuelca a la BD el uso acumulado de las keys BYOA."""
+        self._last_flush = time.monotonic()
+        increments = {}
+        for state in self._states.values():
+            if state.pending_usage:
+                increments[state.spec.credential_id] = state.pending_usage
+                state.pending_usage = 0
+        if not increments or not self.usage_sink:
+            return
+
+        self._flushing = True
+        try:
+            await self.usage_sink(increments)
+        except Exception as e:
+            logger.error(f"No se pudo guardar el uso de {len(increments)} keys: {e}")
+            # Devolver los contadores para el siguiente volcado
+            by_id = {s.spec.credential_id: s for s in self._states.values()}
+            for credential_id, count in increments.items():
+                if credential_id in by_id:
+                    by_id[credential_id].pending_usage += count
+        finally:
+            self._flushing = False
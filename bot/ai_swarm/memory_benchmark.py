@@ -0,0 +1,145 @@
+"""
+Agent Pilot - Benchmark de memoria por solicitud
+================================================
+Mide con tracemalloc la memoria que mantiene viva cada solicitud
+CONSENSUS (SwarmResult + tres AIResponse + UserContext) mientras el
+handler la procesa, comparando:
+
+- antes: dataclasses con __dict__ y respuesta completa de cada API
+- ahora: dataclasses con __slots__ y sin raw_response (por defecto)
+- ahora con retain_raw (modo depuración/auditoría)
+
+Las respuestas de las APIs se simulan con el mismo formato JSON que
+devuelven DeepSeek, Perplexity y Anthropic; no se hace ninguna llamada.
+
+    python -m ai_swarm.memory_benchmark [--requests 1000] [--answer-chars 3000]
+"""
+
+import argparse
+import gc
+import json
+import tracemalloc
+from dataclasses import MISSING, field, fields, make_dataclass
+
+from .orchestrator import AIResponse, ProviderType, SwarmMode, SwarmResult, UserContext
+
+
+def _without_slots(cls):
+    """Copia de una dataclass sin __slots__ (como eran antes)."""
+    spec = []
+    for f in fields(cls):
+        if f.default_factory is not MISSING:
+            spec.append((f.name, f.type, field(default_factory=f.default_factory)))
+        elif f.default is not MISSING:
+            spec.append((f.name, f.type, field(default=f.default)))
+        else:
+            spec.append((f.name, f.type))
+    return make_dataclass(f"{cls.__name__}Dict", spec)
+
+
+def _payloads(answer: str) -> dict:
+    """JSON de cada API tal como llega (se decodifica, como hace aiohttp)."""
+    usage = {"prompt_tokens": 900, "completion_tokens": 700, "total_tokens": 1600}
+    deepseek = {
+        "id": "chatcmpl-0", "object": "chat.completion", "created": 1700000000,
+        "model": "deepseek-chat", "system_fingerprint": "fp_0",
+        "choices": [{
+            "index": 0, "finish_reason": "stop", "logprobs": None,
+            "message": {"role": "assistant", "content": answer, "tool_calls": None},
+        }],
+        "usage": {**usage, "prompt_cache_hit_tokens": 512, "prompt_cache_miss_tokens": 388},
+    }
+    perplexity = {
+        "id": "pplx-0", "model": "sonar-pro", "created": 1700000000,
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": answer}}],
+        "citations": [f"https://example.com/fuente-{i}" for i in range(8)],
+        "search_results": [
+            {"title": f"Fuente {i}", "url": f"https://example.com/fuente-{i}",
+             "date": "2025-01-01", "snippet": "Lorem ipsum dolor sit amet. " * 20}
+            for i in range(8)
+        ],
+        "usage": usage,
+    }
+    anthropic = {
+        "id": "msg_0", "type": "message", "role": "assistant",
+        "model": "claude-3-5-sonnet-20241022", "stop_reason": "end_turn",
+        "content": [{"type": "text", "text": answer}],
+        "usage": {"input_tokens": 900, "output_tokens": 700},
+    }
+    return {
+        name: json.dumps(data)
+        for name, data in (("deepseek", deepseek), ("perplexity", perplexity), ("anthropic", anthropic))
+    }
+
+
+def _request(classes, payloads: dict, retain_raw: bool, index: int):
+    """Objetos que deja vivos una solicitud CONSENSUS."""
+    response_cls, result_cls, context_cls = classes
+    responses = {}
+    for name, provider in (
+        ("perplexity", ProviderType.PERPLEXITY),
+        ("anthropic", ProviderType.ANTHROPIC),
+        ("deepseek", ProviderType.DEEPSEEK),
+    ):
+        data = json.loads(payloads[name])
+        content = (
+            data["choices"][0]["message"]["content"] if "choices" in data
+            else data["content"][0]["text"]
+        )
+        responses[name] = response_cls(
+            provider=provider,
+            content=content,
+            tokens_used=1600,
+            duration_ms=1200,
+            raw_response=data if retain_raw else None,
+            metadata={"is_user_owned": False},
+        )
+    context = context_cls(user_id=f"user-{index}", telegram_id=index, plan="pro")
+    result = result_cls(
+        final_response=responses["deepseek"].content,
+        mode=SwarmMode.CONSENSUS,
+        individual_responses=responses,
+        total_tokens=4800,
+        total_duration_ms=3000,
+        credits_consumed=10,
+        stage_timings={"experts": 1800, "judge": 1200},
+    )
+    return context, result
+
+
+def measure(classes, payloads: dict, retain_raw: bool, requests: int) -> float:
+    """Bytes que siguen asignados por solicitud."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    alive = [_request(classes, payloads, retain_raw, i) for i in range(requests)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del alive
+    return (after - before) / requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Memoria por solicitud CONSENSUS")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--answer-chars", type=int, default=3000)
+    args = parser.parse_args()
+
+    payloads = _payloads("Respuesta de ejemplo. " * (args.answer_chars // 22))
+    legacy = tuple(_without_slots(cls) for cls in (AIResponse, SwarmResult, UserContext))
+    compact = (AIResponse, SwarmResult, UserContext)
+
+    rows = [
+        ("antes (__dict__ + raw_response)", measure(legacy, payloads, True, args.requests)),
+        ("ahora (__slots__, sin raw)", measure(compact, payloads, False, args.requests)),
+        ("ahora con retain_raw", measure(compact, payloads, True, args.requests)),
+    ]
+    baseline = rows[0][1]
+    print(f"{args.requests} solicitudes CONSENSUS, respuestas de ~{args.answer_chars} caracteres")
+    for name, per_request in rows:
+        print(f"  {name:34} {per_request / 1024:8.1f} KiB/solicitud  ({per_request / baseline:5.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,21 +8,33 @@ Modos de operación:
 - FAST: Solo DeepSeek (rápido, económico)
 - CONSENSUS: Perplexity + Claude/GPT-4 -> DeepSeek como Juez
 - CREATIVE: Especializado en generación de contenido viral
+- CREATIVE_BUNDLE: Varios formatos CREATIVE en paralelo sobre un mismo contexto
+- DEEP: Todos los proveedores en paralelo -> reducción jerárquica con Juez
+- CASCADE: FAST primero; escala a CONSENSUS solo si hace falta
 Autor: Agent Pilot Team
 Versión: 1.0
 """
 
 import asyncio
+import contextvars
 import logging
 import time
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from enum import Enum
-from typing import Optional, Dict, List, Any, Callable
+from typing import Optional, Dict, List, Any, Callable, AsyncIterator, Iterable, Tuple, Union
 from datetime import datetime
 import json
-import aiohttp
-from openai import AsyncOpenAI
+import re
+from collections import Counter, OrderedDict
+
+# Los SDKs (openai, aiohttp) se importan en el primer uso de cada proveedor
+# para que arrancar el bot no pague su coste de importación.
+
+from .tokens import estimate_tokens, split_into_chunks, PromptTooLargeError, TokenBudgeter
+from .similarity import text_similarity, merge_responses
+from .key_pool import KeyPoolManager, KeySpec, KeyState, UsageSink, is_rate_limited
+from .hedging import HedgePolicy
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +47,9 @@ class SwarmMode(Enum):
     FAST = "fast"
     CONSENSUS = "consensus"
     CREATIVE = "creative"
+    CREATIVE_BUNDLE = "creative_bundle"
+    DEEP = "deep_analysis"
+    CASCADE = "cascade"
 
 
 class ProviderType(Enum):
@@ -46,7 +61,10 @@ class ProviderType(Enum):
     GROQ = "groq"
 
 
-@dataclass
+# Dataclasses con __slots__: se crean varias por solicitud y viven mientras
+# dura (individual_responses), así que cada instancia ocupa lo mínimo
+
+@dataclass(slots=True)
 class AIResponse:
     """Respuesta de un proveedor de IA individual."""
     provider: ProviderType
@@ -55,11 +73,12 @@ class AIResponse:
     duration_ms: int = 0
     success: bool = True
     error: Optional[str] = None
+    # Respuesta completa de la API; solo con retain_raw (depuración/auditoría)
     raw_response: Optional[Dict] = None
     metadata: Dict = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(slots=True)
 class SwarmResult:
     """Resultado final del Enjambre."""
     final_response: str
@@ -70,9 +89,11 @@ class SwarmResult:
     credits_consumed: int = 0
     success: bool = True
     error: Optional[str] = None
+    stage_timings: Dict[str, int] = field(default_factory=dict)
+    metadata: Dict = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(slots=True)
 class UserContext:
     """Contexto del usuario para personalizar respuestas."""
     user_id: str
@@ -82,7 +103,8 @@ class UserContext:
     preferencias: Dict = field(default_factory=dict)
     plan: str = "free"
     creditos_disponibles: int = 0
-    api_keys: Dict[str, str] = field(default_factory=dict)
+    # proveedor -> key, "k1,k2" o lista de dicts (ver KeySpec.parse)
+    api_keys: Dict[str, Any] = field(default_factory=dict, repr=False)
 
 
 @dataclass
@@ -91,6 +113,8 @@ class APICredentials:
     api_key: str
     is_user_owned: bool = False
     provider: ProviderType = None
+    # Guardar la respuesta completa de la API en AIResponse.raw_response
+    retain_raw: bool = False
 
 
 # ============================================================================
@@ -140,6 +164,7 @@ class DeepSeekProvider(BaseAIProvider):
     def __init__(self, credentials: APICredentials):
         super().__init__(credentials)
         self.provider_type = ProviderType.DEEPSEEK
+        from openai import AsyncOpenAI
         self.client = AsyncOpenAI(
             api_key=credentials.api_key,
             base_url="https://api.deepseek.com"
@@ -172,7 +197,10 @@ class DeepSeekProvider(BaseAIProvider):
                 tokens_used=tokens,
                 duration_ms=duration,
                 success=True,
-                raw_response=response.model_dump() if hasattr(response, 'model_dump') else None
+                raw_response=(
+                    response.model_dump()
+                    if self.credentials.retain_raw and hasattr(response, 'model_dump') else None
+                )
             )
         except Exception as e:
             logger.error(f"DeepSeek error: {e}")
@@ -209,6 +237,7 @@ class PerplexityProvider(BaseAIProvider):
         temperature: float = 0.3,
         **kwargs
     ) -> AIResponse:
+        import aiohttp
         start_time = time.time()
         try:
             messages = self._build_messages(prompt, system_prompt)
@@ -240,7 +269,7 @@ class PerplexityProvider(BaseAIProvider):
                             tokens_used=tokens,
                             duration_ms=duration,
                             success=True,
-                            raw_response=data,
+                            raw_response=data if self.credentials.retain_raw else None,
                             metadata={"citations": data.get('citations', [])}
                         )
                     else:
@@ -270,6 +299,7 @@ class OpenAIProvider(BaseAIProvider):
     def __init__(self, credentials: APICredentials):
         super().__init__(credentials)
         self.provider_type = ProviderType.OPENAI
+        from openai import AsyncOpenAI
         self.client = AsyncOpenAI(api_key=credentials.api_key)
         self.model = "gpt-4-turbo-preview"
 
@@ -335,6 +365,7 @@ class AnthropicProvider(BaseAIProvider):
         temperature: float = 0.7,
         **kwargs
     ) -> AIResponse:
+        import aiohttp
         start_time = time.time()
         try:
             headers = {
@@ -368,7 +399,7 @@ class AnthropicProvider(BaseAIProvider):
                             tokens_used=tokens,
                             duration_ms=duration,
                             success=True,
-                            raw_response=data
+                            raw_response=data if self.credentials.retain_raw else None
                         )
                     else:
                         error_text = await response.text()
@@ -391,6 +422,127 @@ class AnthropicProvider(BaseAIProvider):
             return False
 
 
+# Límites de llamadas simultáneas por proveedor del lote en curso (ver
+# CouncilOfWiseMen.process_many); None fuera de un lote
+_provider_limits: contextvars.ContextVar[Optional[Dict[ProviderType, asyncio.Semaphore]]] = (
+    contextvars.ContextVar("provider_limits", default=None)
+)
+
+
+class PooledProvider(BaseAIProvider):
+    """
+    Proxy sobre un pool de keys del mismo proveedor.
+
+    Cada llamada elige una key (ver key_pool), respeta su límite de
+    concurrencia y, si recibe un 429, reintenta una vez con otra key.
+    Las llamadas canceladas (el usuario canceló o sustituyó la solicitud)
+    se anotan en cancel_stats con los tokens de salida que no se gastaron.
+    """
+
+    def __init__(
+        self,
+        provider_type: ProviderType,
+        provider_class: type,
+        states: List[KeyState],
+        pool: KeyPoolManager,
+        retain_raw: bool = False,
+        cancel_stats: Optional[Counter] = None
+    ):
+        self.provider_class = provider_class
+        self.states = states
+        self.pool = pool
+        self.retain_raw = retain_raw
+        self.cancel_stats = cancel_stats
+        first = self._instance(states[0], provider_type)
+        super().__init__(first.credentials)
+        self.provider_type = provider_type
+        self.model = getattr(first, "model", None)
+
+    def _instance(self, state: KeyState, provider_type: ProviderType = None) -> BaseAIProvider:
+        """Proveedor concreto de una key (se crea una vez y se reutiliza)."""
+        if state.provider is None:
+            state.provider = self.provider_class(APICredentials(
+                api_key=state.spec.api_key,
+                is_user_owned=state.is_user_owned,
+                provider=provider_type or self.provider_type,
+                retain_raw=self.retain_raw
+            ))
+        return state.provider
+
+    async def generate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> AIResponse:
+        limits = _provider_limits.get()
+        semaphore = limits.get(self.provider_type) if limits else None
+        try:
+            if semaphore is None:
+                return await self._generate(prompt, system_prompt, **kwargs)
+            async with semaphore:
+                return await self._generate(prompt, system_prompt, **kwargs)
+        except asyncio.CancelledError:
+            if self.cancel_stats is not None:
+                # Cota superior: la salida que ya no se generará
+                self.cancel_stats["calls"] += 1
+                self.cancel_stats["tokens_saved"] += kwargs.get("max_tokens") or 0
+            raise
+
+    async def _generate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        prefer_idle_key: bool = False,
+        **kwargs
+    ) -> AIResponse:
+        response = None
+        tried: tuple = ()
+        if prefer_idle_key:
+            # Respaldo (hedging): evitar las keys con llamadas en curso si hay otras
+            busy = tuple(s for s in self.states if s.in_flight)
+            if len(busy) < len(self.states):
+                tried = busy
+        for _ in range(2):
+            state = self.pool.choose(self.states, exclude=tried)
+            if state is None:
+                break
+
+            # Todas las keys enfriándose tras un 429: esperar un poco
+            wait = state.cooldown_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(min(wait, 5))
+
+            async with state.semaphore:
+                state.in_flight += 1
+                try:
+                    response = await self._instance(state).generate(
+                        prompt, system_prompt, **kwargs
+                    )
+                finally:
+                    state.in_flight -= 1
+
+            response.metadata["is_user_owned"] = state.is_user_owned
+            if response.success:
+                self.pool.record_usage(state)
+                return response
+            if not is_rate_limited(response.error):
+                return response
+            state.record_rate_limit(time.monotonic())
+            tried += (state,)
+
+        return response or AIResponse(
+            provider=self.provider_type,
+            content="",
+            success=False,
+            error=f"Todas las keys de {self.provider_type.value} han agotado su límite mensual"
+        )
+
+    async def health_check(self) -> bool:
+        state = self.pool.choose(self.states) or self.states[0]
+        return await self._instance(state).health_check()
+
+
 # ============================================================================
 # SISTEMA DE PROMPTS
 # ============================================================================
@@ -487,6 +639,162 @@ sobre la siguiente solicitud del usuario:
 
 Responde SOLO con la respuesta final, sin explicar tu proceso de síntesis."""
 
+    @staticmethod
+    def build_finalize_prompt(original_request: str, notes: str) -> str:
+        """
+        Prompt para redactar la respuesta final a partir de notas de
+        experto que ya no hace falta sintetizar (un solo experto, o dos
+        que coinciden).
+        """
+        return f"""Convierte estas notas de trabajo en la respuesta final a la solicitud del usuario.
+
+=== SOLICITUD ORIGINAL ===
+{original_request}
+
+=== NOTAS ===
+{notes}
+
+Mantén los datos y las recomendaciones de las notas, completa lo que haya quedado
+cortado y redacta una respuesta clara y lista para usar. Responde SOLO con la
+respuesta final."""
+
+    @staticmethod
+    def build_merge_prompt(
+        original_request: str,
+        analyses: List[tuple],
+        max_chars_per_analysis: int = 4000
+    ) -> str:
+        """
+        Construye el prompt del Juez para N análisis (modo DEEP).
+
+        Cada análisis se recorta a max_chars_per_analysis para que la
+        entrada del Juez quede acotada aunque haya muchos expertos.
+        """
+        sections = ""
+        for label, content in analyses:
+            if len(content) > max_chars_per_analysis:
+                content = content[:max_chars_per_analysis] + " [...]"
+            sections += f"\n=== ANÁLISIS: {label} ===\n{content}\n"
+
+        return f"""Eres el JUEZ FINAL del Consejo de Sabios. Has recibido {len(analyses)} análisis
+independientes sobre la siguiente solicitud del usuario:
+
+=== SOLICITUD ORIGINAL ===
+{original_request}
+{sections}
+=== TU TAREA ===
+1. Sintetiza los mejores elementos de todos los análisis
+2. Resuelve cualquier contradicción entre ellos
+3. Produce una RESPUESTA FINAL completa, factualmente correcta y lista para usar
+
+Responde SOLO con la respuesta final, sin explicar tu proceso de síntesis."""
+
+
+# Rol, plantilla de prompt y temperatura de cada experto en modo DEEP
+DEEP_EXPERT_ROLES = {
+    ProviderType.PERPLEXITY: (
+        "fact_checker",
+        "Verifica los hechos y proporciona datos actuales sobre: {prompt}",
+        0.3
+    ),
+    ProviderType.ANTHROPIC: (
+        "style_analyzer",
+        "Analiza el estilo, tono y psicología para optimizar: {prompt}",
+        0.7
+    ),
+    ProviderType.OPENAI: (
+        "style_analyzer",
+        "Analiza el estilo, tono y psicología para optimizar: {prompt}",
+        0.7
+    ),
+    ProviderType.DEEPSEEK: (
+        "general",
+        "Analiza en profundidad: {prompt}",
+        0.7
+    ),
+}
+
+
+# Temas que necesitan datos actuales: en CASCADE van directos al Consejo
+CURRENT_DATA_RE = re.compile(
+    r"\b(hoy|ayer|actual(es|mente)?|[uú]ltim[oa]s?|reciente(s|mente)?|noticias?|"
+    r"ahora mismo|esta semana|este (mes|a[nñ]o)|20[2-9]\d|precio|cotizaci[oó]n|"
+    r"elecciones|encuestas?)\b",
+    re.IGNORECASE
+)
+
+CONFIDENCE_INSTRUCTION = """
+
+Al final de tu respuesta añade una última línea con el formato exacto
+"CONFIANZA: N", donde N (0-100) es tu confianza en que la respuesta es
+correcta y completa sin necesidad de verificar datos externos."""
+
+CONFIDENCE_RE = re.compile(r"\n?\s*CONFIANZA:\s*(\d{1,3})\s*%?\s*$", re.IGNORECASE)
+
+# Plantillas de CREATIVE por tipo de contenido
+CREATIVE_PROMPTS = {
+    "reel": """Crea un GUIÓN DE REEL de 1 minuto con esta estructura:
+
+🎣 GANCHO (0-3 segundos):
+- Frase impactante que detenga el scroll
+- Pregunta provocadora o dato sorprendente
+
+📚 VALOR (3-50 segundos):
+- Contenido principal dividido en 3-5 puntos
+- Cada punto debe ser tweeteable por sí solo
+- Usa transiciones claras
+
+🎯 CTA (50-60 segundos):
+- Llamada a la acción clara
+- Invita a comentar, guardar o compartir
+
+TEMA: {prompt}
+
+Incluye también:
+- 3 opciones de texto para overlay
+- Sugerencia de música/sonido trending
+- 10 hashtags optimizados""",
+
+    "thread": """Crea un HILO DE TWITTER viral con esta estructura:
+
+1️⃣ TWEET GANCHO:
+- Máximo 280 caracteres
+- Debe generar curiosidad o controversia
+
+2️⃣-8️⃣ TWEETS DE DESARROLLO:
+- Cada uno autónomo pero conectado
+- Mezcla de datos, opiniones y preguntas
+
+9️⃣ TWEET RESUMEN:
+- Recapitula el mensaje principal
+
+🔟 TWEET CTA:
+- Invita a RT, seguir o comentar
+
+TEMA: {prompt}""",
+
+    "caption": """Crea un CAPTION DE INSTAGRAM optimizado para engagement:
+
+📝 PRIMERA LÍNEA (CRUCIAL):
+- Gancho que aparece antes del "más..."
+- Máximo 125 caracteres
+
+📖 CUERPO:
+- Historia o valor en 3-4 párrafos cortos
+- Usa emojis estratégicamente
+- Incluye pregunta para generar comentarios
+
+🎯 CTA:
+- Guarda este post si...
+- Comenta [emoji] si...
+- Comparte con alguien que...
+
+#️⃣ HASHTAGS:
+- 25-30 hashtags en 3 niveles (popular, medio, nicho)
+
+TEMA: {prompt}"""
+}
+
 
 # ============================================================================
 # CONSEJO DE SABIOS - ORQUESTADOR PRINCIPAL
@@ -503,23 +811,82 @@ class CouncilOfWiseMen:
     def __init__(
         self,
         system_credentials: Dict[str, str],
-        cost_config: Optional[Dict[str, int]] = None
+        cost_config: Optional[Dict[str, int]] = None,
+        byoa_cost_config: Optional[Dict[str, int]] = None,
+        long_input_threshold: int = 3000,
+        chunk_tokens: int = 1500,
+        chunk_overlap_tokens: int = 150,
+        chunk_concurrency: int = 4,
+        cascade_confidence_threshold: int = 70,
+        cascade_plan_policy: Optional[Dict[str, str]] = None,
+        agreement_threshold: float = 0.8,
+        response_cache=None,
+        key_concurrency: int = 8,
+        usage_sink: Optional[UsageSink] = None,
+        retain_raw: bool = False,
+        hedging: Optional[HedgePolicy] = None,
+        hedge_fallback: Optional[ProviderType] = None
     ):
         """
         Inicializa el Consejo de Sabios.
 
         Args:
-            system_credentials: Dict con API keys del sistema
-                               {"deepseek": "sk-xxx", "perplexity": "pplx-xxx", ...}
-            cost_config: Configuración de costes por operación
+            system_credentials: Dict con API keys del sistema; admite varias
+                               por proveedor separadas por comas
+                               {"deepseek": "sk-xxx,sk-yyy", "perplexity": "pplx-xxx", ...}
+            cost_config: Configuración de costes por operación (por defecto,
+                         CREDIT_COSTS de config.py)
+            byoa_cost_config: Coste por operación cuando responden las API
+                              keys del usuario (sin entrada: 25% de
+                              descuento por key propia, hasta el 70%)
+            long_input_threshold: Tokens estimados a partir de los cuales la
+                                  entrada se trocea y se analiza por fragmentos
+            chunk_tokens: Tamaño máximo (tokens estimados) de cada fragmento
+            chunk_overlap_tokens: Solape entre fragmentos consecutivos
+            chunk_concurrency: Fragmentos analizados a la vez
+            cascade_confidence_threshold: En CASCADE, confianza autodeclarada
+                                          por debajo de la cual se escala
+            cascade_plan_policy: Política de escalado por plan: "never",
+                                 "auto" o "always" (por defecto "auto")
+            agreement_threshold: En CONSENSUS, similitud entre expertos a
+                                 partir de la cual se omite el Juez
+            response_cache: ResponseCache opcional para FAST y CREATIVE
+            key_concurrency: Llamadas simultáneas máximas por API key
+            usage_sink: Corrutina que recibe {credential_id: nº de llamadas}
+                        para actualizar uso_actual_mes por lotes
+            retain_raw: Conservar la respuesta completa de cada API en
+                        AIResponse.raw_response (depuración o auditoría);
+                        por defecto solo se guarda el texto y las métricas
+            hedging: HedgePolicy para FAST y CREATIVE (None: desactivado)
+            hedge_fallback: Proveedor del respaldo cuando el principal solo
+                            tiene una key (por defecto, la misma key)
         """
         self.system_credentials = system_credentials
-        self.cost_config = cost_config or {
-            "fast": 2,
-            "consensus": 10,
-            "creative": 8
-        }
+        if cost_config is None:
+            # Misma fuente que el catálogo de precios sin base de datos
+            from config import CREDIT_COSTS
+            cost_config = CREDIT_COSTS
+        self.cost_config = cost_config
+        self.byoa_cost_config = byoa_cost_config or {}
         self.prompt_builder = PromptBuilder()
+        self.token_budgeter = TokenBudgeter()
+        self.long_input_threshold = long_input_threshold
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.chunk_concurrency = chunk_concurrency
+        self.cascade_confidence_threshold = cascade_confidence_threshold
+        self.cascade_plan_policy = cascade_plan_policy or {}
+        self.agreement_threshold = agreement_threshold
+        self.response_cache = response_cache
+        self.key_pools = KeyPoolManager(key_concurrency, usage_sink)
+        self.retain_raw = retain_raw
+        self.hedging = hedging
+        self.hedge_fallback = hedge_fallback
+
+        # Decisiones de CASCADE (motivo -> nº de veces) para ajustar la política
+        self.cascade_stats: Counter = Counter()
+        # Llamadas canceladas a mitad y tokens de salida ahorrados
+        self.cancel_stats: Counter = Counter()
 
         # Callbacks para monitoreo
         self.on_provider_start: Optional[Callable] = None
@@ -534,6 +901,9 @@ class CouncilOfWiseMen:
         """
         Obtiene un proveedor de IA, priorizando API keys del usuario (BYOA).
 
+        Devuelve un PooledProvider que reparte las llamadas entre todas las
+        keys disponibles (del usuario o, si no tiene, del sistema).
+
         Args:
             provider_type: Tipo de proveedor a obtener
             user_context: Contexto del usuario (puede tener sus propias API keys)
@@ -542,62 +912,96 @@ class CouncilOfWiseMen:
             Instancia del proveedor o None si no hay credenciales
         """
         provider_name = provider_type.value
-
-        # Prioridad 1: API key del usuario (BYOA)
-        if provider_name in user_context.api_keys:
-            api_key = user_context.api_keys[provider_name]
-            is_user_owned = True
-            logger.info(f"Usando API key propia del usuario para {provider_name}")
-        # Prioridad 2: API key del sistema
-        elif provider_name in self.system_credentials:
-            api_key = self.system_credentials[provider_name]
-            is_user_owned = False
-            logger.info(f"Usando API key del sistema para {provider_name}")
-        else:
-            logger.warning(f"No hay credenciales disponibles para {provider_name}")
-            return None
-
-        credentials = APICredentials(
-            api_key=api_key,
-            is_user_owned=is_user_owned,
-            provider=provider_type
-        )
-
-        # Mapeo de tipos a clases
-        provider_classes = {
+        provider_class = {
             ProviderType.DEEPSEEK: DeepSeekProvider,
             ProviderType.PERPLEXITY: PerplexityProvider,
             ProviderType.OPENAI: OpenAIProvider,
             ProviderType.ANTHROPIC: AnthropicProvider
-        }
+        }.get(provider_type)
+        if not provider_class:
+            return None
+
+        # Prioridad 1: API keys del usuario (BYOA) con cuota disponible
+        states = None
+        user_keys = user_context.api_keys.get(provider_name)
+        if user_keys:
+            states = self.key_pools.states_for(KeySpec.parse(user_keys), is_user_owned=True)
+            if all(state.exhausted for state in states):
+                logger.info(f"Keys propias del usuario para {provider_name} sin cuota, usando las del sistema")
+                states = None
+            else:
+                logger.info(f"Usando API key propia del usuario para {provider_name}")
+
+        # Prioridad 2: API keys del sistema
+        if states is None:
+            system_keys = KeySpec.parse(self.system_credentials.get(provider_name) or [])
+            if not system_keys:
+                logger.warning(f"No hay credenciales disponibles para {provider_name}")
+                return None
+            states = self.key_pools.states_for(system_keys, is_user_owned=False)
+            logger.info(f"Usando API key del sistema para {provider_name}")
 
-        provider_class = provider_classes.get(provider_type)
-        if provider_class:
-            return provider_class(credentials)
-        return None
+        return PooledProvider(
+            provider_type, provider_class, states, self.key_pools,
+            self.retain_raw, self.cancel_stats
+        )
+
+    @staticmethod
+    def _billing_operation(mode: SwarmMode, content_type: Optional[str] = None) -> str:
+        """Operación de la tarifa: CREATIVE se cobra por formato (reel, thread, caption)."""
+        if mode == SwarmMode.CREATIVE:
+            if content_type not in CREATIVE_PROMPTS:
+                content_type = "reel"
+            return f"{mode.value}:{content_type}"
+        return mode.value
 
     def _calculate_credits(
         self,
         mode: SwarmMode,
         responses: Dict[str, AIResponse],
-        user_context: UserContext
+        user_context: UserContext,
+        operation: Optional[str] = None
     ) -> int:
-        """Calcula los créditos a consumir basándose en el modo y uso de API propias."""
-        base_cost = self.cost_config.get(mode.value, 5)
+        """
+        Calcula los créditos a consumir basándose en la operación (por
+        defecto, el modo) y el uso de API propias.
+        """
+        operation = operation or mode.value
+        base_cost = self.cost_config.get(operation, self.cost_config.get(mode.value, 5))
 
         # Descuento por usar API keys propias
+        answered = [resp for resp in responses.values() if resp.success]
         user_owned_count = sum(
-            1 for resp in responses.values()
-            if resp.success and resp.metadata.get('is_user_owned', False)
+            1 for resp in answered if resp.metadata.get('is_user_owned', False)
         )
 
         if user_owned_count > 0:
-            # Hasta 70% de descuento si usa todas sus propias APIs
-            discount = min(0.7, user_owned_count * 0.25)
-            base_cost = int(base_cost * (1 - discount))
+            byoa_cost = self.byoa_cost_config.get(
+                operation, self.byoa_cost_config.get(mode.value)
+            )
+            if byoa_cost is not None:
+                # Precio con API propia; proporcional si solo algunas lo son
+                share = user_owned_count / len(answered)
+                base_cost = round(base_cost - (base_cost - byoa_cost) * share)
+            else:
+                # Hasta 70% de descuento si usa todas sus propias APIs
+                discount = min(0.7, user_owned_count * 0.25)
+                base_cost = int(base_cost * (1 - discount))
 
         return max(1, base_cost)
 
+    def _budget(
+        self,
+        provider: BaseAIProvider,
+        role: str,
+        prompt: str,
+        system_prompt: str = ""
+    ) -> int:
+        """max_tokens para una llamada según el rol (ver TokenBudgeter)."""
+        return self.token_budgeter.max_tokens(
+            role, prompt, system_prompt, getattr(provider, "model", None)
+        )
+
     async def process(
         self,
         prompt: str,
@@ -611,8 +1015,10 @@ class CouncilOfWiseMen:
         Args:
             prompt: La consulta del usuario
             user_context: Contexto completo del usuario
-            mode: Modo de operación (FAST, CONSENSUS, CREATIVE)
-            **kwargs: Argumentos adicionales (content_type, etc.)
+            mode: Modo de operación (FAST, CONSENSUS, CREATIVE, CREATIVE_BUNDLE,
+                  DEEP, CASCADE)
+            **kwargs: Argumentos adicionales (content_type, content_types,
+                      research, etc.)
 
         Returns:
             SwarmResult con la respuesta final y métricas
@@ -620,23 +1026,104 @@ class CouncilOfWiseMen:
         start_time = time.time()
 
         try:
+            # Entradas largas: se condensan por fragmentos en paralelo antes
+            # de aplicar el modo (CREATIVE trabaja sobre un tema, no un documento)
+            chunk_responses = {}
+            if (
+                mode not in (SwarmMode.CREATIVE, SwarmMode.CREATIVE_BUNDLE)
+                and estimate_tokens(prompt) > self.long_input_threshold
+            ):
+                chunking_start = time.time()
+                prompt, chunk_responses = await self._condense_long_input(
+                    prompt, user_context
+                )
+                chunking_ms = int((time.time() - chunking_start) * 1000)
+
+            # Caché de respuestas (solo FAST/CREATIVE sobre entradas cortas)
+            cache_key = None
+            if (
+                self.response_cache is not None
+                and mode in (SwarmMode.FAST, SwarmMode.CREATIVE)
+                and not chunk_responses
+            ):
+                cache_key = self.response_cache.partition_key(
+                    user_context.bio_entrenamiento,
+                    user_context.memoria,
+                    mode.value,
+                    kwargs.get("content_type")
+                )
+                hit = self.response_cache.get(cache_key, prompt)
+                if hit:
+                    return SwarmResult(
+                        final_response=hit.response,
+                        mode=mode,
+                        total_duration_ms=int((time.time() - start_time) * 1000),
+                        credits_consumed=self._calculate_credits(
+                            mode, {}, user_context,
+                            self._billing_operation(mode, kwargs.get("content_type"))
+                        ),
+                        metadata={"cache": {
+                            "hit": True,
+                            "age_s": hit.age_s,
+                        }}
+                    )
+
             if mode == SwarmMode.FAST:
                 result = await self._process_fast(prompt, user_context, **kwargs)
             elif mode == SwarmMode.CONSENSUS:
                 result = await self._process_consensus(prompt, user_context, **kwargs)
             elif mode == SwarmMode.CREATIVE:
                 result = await self._process_creative(prompt, user_context, **kwargs)
+            elif mode == SwarmMode.CREATIVE_BUNDLE:
+                result = await self._process_creative_bundle(prompt, user_context, **kwargs)
+            elif mode == SwarmMode.DEEP:
+                result = await self._process_deep(prompt, user_context, **kwargs)
+            elif mode == SwarmMode.CASCADE:
+                result = await self._process_cascade(prompt, user_context, **kwargs)
             else:
                 raise ValueError(f"Modo no soportado: {mode}")
 
+            if chunk_responses:
+                result.individual_responses = {
+                    **chunk_responses, **result.individual_responses
+                }
+                result.stage_timings = {"chunks": chunking_ms, **result.stage_timings}
+
             # Calcular métricas finales
             result.total_duration_ms = int((time.time() - start_time) * 1000)
             result.total_tokens = sum(
                 r.tokens_used for r in result.individual_responses.values()
             )
-            result.credits_consumed = self._calculate_credits(
-                mode, result.individual_responses, user_context
-            )
+            # CASCADE se cobra como el modo que terminó ejecutándose (sin el
+            # borrador descartado), CREATIVE según el formato y
+            # CREATIVE_BUNDLE como la suma de sus formatos generados
+            billing_mode = SwarmMode(result.metadata.get("billing_mode", mode.value))
+            billing_operations = result.metadata.get("billing_operations")
+            if billing_operations:
+                result.credits_consumed = sum(
+                    self._calculate_credits(
+                        billing_mode,
+                        {name: result.individual_responses[name]},
+                        user_context,
+                        operation
+                    )
+                    for name, operation in billing_operations.items()
+                )
+            else:
+                excluded = result.metadata.get("billing_exclude", ())
+                result.credits_consumed = self._calculate_credits(
+                    billing_mode,
+                    {
+                        name: response
+                        for name, response in result.individual_responses.items()
+                        if name not in excluded
+                    },
+                    user_context,
+                    result.metadata.get("billing_operation")
+                )
+
+            if cache_key and result.success and result.final_response:
+                self.response_cache.put(cache_key, prompt, result.final_response)
 
             return result
 
@@ -647,9 +1134,266 @@ class CouncilOfWiseMen:
                 mode=mode,
                 success=False,
                 error=str(e),
-                total_duration_ms=int((time.time() - start_time) * 1000)
+                total_duration_ms=int((time.time() - start_time) * 1000),
+                # Error atribuible a la entrada del usuario, no al proveedor
+                metadata={"user_error": isinstance(e, PromptTooLargeError)}
             )
 
+    async def process_many(
+        self,
+        items: Union[Iterable[tuple], AsyncIterator[tuple]],
+        concurrency: int = 8,
+        provider_limits: Optional[Dict[Union[ProviderType, str], int]] = None,
+        dedup_cache: int = 1024
+    ) -> AsyncIterator[Tuple[int, SwarmResult]]:
+        """
+        Procesa muchas solicitudes y devuelve los resultados según terminan.
+
+        Los elementos se leen de `items` a medida que hay hueco, así que la
+        memoria no depende del tamaño del lote. Un fallo en un elemento se
+        devuelve como SwarmResult(success=False) sin afectar al resto.
+
+        Args:
+            items: (prompt, user_context, mode) o (prompt, user_context, mode,
+                   kwargs), iterable normal o asíncrono
+            concurrency: Elementos procesándose a la vez
+            provider_limits: Llamadas simultáneas máximas del lote por
+                             proveedor ({"deepseek": 16, ...}), además del
+                             límite por key; deja margen al tráfico del bot
+            dedup_cache: Resultados recientes que se reutilizan para
+                         elementos idénticos (mismo prompt, usuario, modo y
+                         kwargs)
+
+        Yields:
+            (índice del elemento en `items`, SwarmResult). Los duplicados
+            llevan metadata["duplicate_of"] y no suman tokens ni créditos.
+        """
+        limits = {
+            ProviderType(provider): asyncio.Semaphore(limit)
+            for provider, limit in (provider_limits or {}).items()
+        }
+
+        async def run(prompt: str, user_context: UserContext, mode: SwarmMode, kwargs: Dict) -> SwarmResult:
+            # Cada tarea tiene su propia copia del contexto
+            _provider_limits.set(limits)
+            try:
+                return await self.process(prompt, user_context, mode, **kwargs)
+            except Exception as e:
+                return SwarmResult(final_response="", mode=mode, success=False, error=str(e))
+
+        def duplicate(result: SwarmResult, original: int) -> SwarmResult:
+            return replace(
+                result,
+                total_tokens=0,
+                credits_consumed=0,
+                metadata={**result.metadata, "duplicate_of": original}
+            )
+
+        if hasattr(items, "__aiter__"):
+            source = items.__aiter__()
+        else:
+            source = iter(items)
+        exhausted = False
+        index = -1
+
+        async def next_item():
+            if hasattr(source, "__anext__"):
+                try:
+                    return await source.__anext__()
+                except StopAsyncIteration:
+                    return None
+            return next(source, None)
+
+        running: Dict[asyncio.Task, tuple] = {}    # tarea -> (clave, índice)
+        waiting: Dict[tuple, List[int]] = {}       # clave en curso -> duplicados
+        finished: "OrderedDict[tuple, tuple]" = OrderedDict()  # clave -> (índice, resultado)
+
+        try:
+            while running or not exhausted:
+                while not exhausted and len(running) < concurrency:
+                    item = await next_item()
+                    if item is None:
+                        exhausted = True
+                        break
+                    index += 1
+                    prompt, user_context, mode = item[:3]
+                    kwargs = item[3] if len(item) > 3 else {}
+                    key = (
+                        prompt, user_context.user_id, mode,
+                        json.dumps(kwargs, sort_keys=True, default=str)
+                    )
+
+                    if key in finished:
+                        finished.move_to_end(key)
+                        original, result = finished[key]
+                        yield index, duplicate(result, original)
+                    elif key in waiting:
+                        waiting[key].append(index)
+                    else:
+                        waiting[key] = []
+                        task = asyncio.create_task(run(prompt, user_context, mode, kwargs))
+                        running[task] = (key, index)
+
+                if not running:
+                    continue
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    key, original = running.pop(task)
+                    result = task.result()
+                    yield original, result
+                    for dup in waiting.pop(key, []):
+                        yield dup, duplicate(result, original)
+                    if dedup_cache > 0:
+                        finished[key] = (original, result)
+                        if len(finished) > dedup_cache:
+                            finished.popitem(last=False)
+        finally:
+            # El consumidor dejó de iterar: no dejar llamadas huérfanas
+            for task in running:
+                task.cancel()
+
+    async def _generate_hedged(
+        self,
+        provider: BaseAIProvider,
+        user_context: UserContext,
+        **kwargs
+    ) -> AIResponse:
+        """
+        Llamada única (FAST, CREATIVE) con respaldo contra la latencia de cola.
+
+        Si la principal no ha terminado tras el umbral de HedgePolicy y el
+        presupuesto lo permite, lanza la misma llamada con otra key (o con
+        hedge_fallback si el proveedor solo tiene una). Gana la primera
+        respuesta válida; la otra se cancela.
+        """
+        policy = self.hedging
+        if policy is None:
+            return await provider.generate(**kwargs)
+
+        name = provider.provider_type.value
+        delay = policy.delay(name)
+        start = time.monotonic()
+        primary = asyncio.create_task(provider.generate(**kwargs))
+        pending = {primary}
+        hedged = False
+        try:
+            if delay is not None:
+                await asyncio.wait(pending, timeout=delay)
+            if primary.done() or delay is None or not policy.try_acquire():
+                response = await primary
+                policy.record(name, time.monotonic() - start)
+                return response
+
+            backup_provider = provider
+            if self.hedge_fallback and len(getattr(provider, "states", ())) < 2:
+                backup_provider = self._get_provider(self.hedge_fallback, user_context) or provider
+            backup_kwargs = dict(kwargs)
+            if backup_provider is provider:
+                backup_kwargs["prefer_idle_key"] = True
+            logger.info(f"Hedging {name}: sin respuesta tras {delay:.2f}s, lanzando respaldo")
+            backup = asyncio.create_task(backup_provider.generate(**backup_kwargs))
+            pending.add(backup)
+            hedged = True
+
+            response = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task is primary:
+                        policy.record(name, time.monotonic() - start)
+                    result = task.result()
+                    if result.success:
+                        if task is backup:
+                            policy.backup_wins += 1
+                        result.metadata["hedge"] = {
+                            "delay_ms": int(delay * 1000),
+                            "winner": "backup" if task is backup else "primary",
+                            "backup_provider": backup_provider.provider_type.value,
+                        }
+                        return result
+                    response = response or result
+            return response
+        finally:
+            if hedged and not primary.done():
+                # La principal perdió: su latencia es al menos la transcurrida
+                policy.record(name, time.monotonic() - start)
+            for task in pending:
+                task.cancel()
+
+    async def _condense_long_input(
+        self,
+        text: str,
+        user_context: UserContext
+    ) -> tuple:
+        """
+        Trocea un texto largo y extrae las ideas clave de cada fragmento.
+
+        Los fragmentos se analizan en paralelo (acotado por chunk_concurrency),
+        así que la latencia crece con nº_fragmentos / concurrencia y no con
+        la longitud total del documento.
+
+        Returns:
+            (prompt condensado, respuestas por fragmento)
+        """
+        deepseek = self._get_provider(ProviderType.DEEPSEEK, user_context)
+        if not deepseek:
+            raise ValueError("DeepSeek no disponible")
+
+        chunks = split_into_chunks(text, self.chunk_tokens, self.chunk_overlap_tokens)
+        system_prompt = self.prompt_builder.build_system_prompt(user_context, "general")
+        semaphore = asyncio.Semaphore(self.chunk_concurrency)
+
+        async def analyze_chunk(index: int, chunk: str) -> AIResponse:
+            async with semaphore:
+                if self.on_provider_start:
+                    self.on_provider_start(ProviderType.DEEPSEEK)
+                chunk_prompt = (
+                    f"Este es el fragmento {index + 1} de {len(chunks)} de un documento "
+                    f"largo. Extrae sus ideas, datos y afirmaciones clave en puntos "
+                    f"breves, sin introducción:\n\n{chunk}"
+                )
+                response = await deepseek.generate(
+                    prompt=chunk_prompt,
+                    system_prompt=system_prompt,
+                    temperature=0.3,
+                    max_tokens=self._budget(deepseek, "chunk", chunk_prompt, system_prompt)
+                )
+                if self.on_provider_complete:
+                    self.on_provider_complete(ProviderType.DEEPSEEK, response)
+                return response
+
+        results = await asyncio.gather(
+            *(analyze_chunk(i, chunk) for i, chunk in enumerate(chunks)),
+            return_exceptions=True
+        )
+
+        responses = {}
+        notes = []
+        for index, (chunk, result) in enumerate(zip(chunks, results)):
+            if isinstance(result, Exception):
+                result = AIResponse(
+                    provider=ProviderType.DEEPSEEK,
+                    content="",
+                    success=False,
+                    error=str(result)
+                )
+            responses[f"chunk_{index}"] = result
+            if result.success and result.content:
+                notes.append(f"### Fragmento {index + 1}\n{result.content}")
+            else:
+                # Sin análisis: conservar un extracto del fragmento original
+                notes.append(f"### Fragmento {index + 1} (extracto)\n{chunk[:1000]}")
+
+        if not any(r.success for r in responses.values()):
+            raise ValueError("No se pudo analizar ningún fragmento del documento")
+
+        condensed = (
+            f"Analiza el siguiente documento. Es largo, así que se ha dividido en "
+            f"{len(chunks)} fragmentos y se incluyen sus ideas clave en orden:\n\n"
+            + "\n\n".join(notes)
+        )
+        return condensed, responses
+
     async def _process_fast(
         self,
         prompt: str,
@@ -662,11 +1406,16 @@ class CouncilOfWiseMen:
             raise ValueError("DeepSeek no disponible")
 
         system_prompt = self.prompt_builder.build_system_prompt(user_context, "general")
+        kwargs.setdefault(
+            "max_tokens", self._budget(deepseek, "final", prompt, system_prompt)
+        )
 
         if self.on_provider_start:
             self.on_provider_start(ProviderType.DEEPSEEK)
 
-        response = await deepseek.generate(
+        response = await self._generate_hedged(
+            deepseek,
+            user_context,
             prompt=prompt,
             system_prompt=system_prompt,
             **kwargs
@@ -707,6 +1456,13 @@ class CouncilOfWiseMen:
         if not deepseek:
             raise ValueError("DeepSeek (Juez) no disponible")
 
+        # Comprobar antes de gastar en los expertos que el prompt del Juez
+        # (solicitud + dos análisis de tamaño máximo) cabrá en su contexto
+        expert_max = self.token_budgeter.role_budgets["expert"][1]
+        self.token_budgeter.ensure_fits(
+            deepseek.model, 2 * estimate_tokens(prompt) + 2 * expert_max, "judge"
+        )
+
         responses = {}
 
         # Fase 1: Consultas paralelas a fact-checker y analizador de estilo
@@ -715,12 +1471,14 @@ class CouncilOfWiseMen:
                 system_prompt = self.prompt_builder.build_system_prompt(
                     user_context, "fact_checker"
                 )
+                expert_prompt = f"Verifica los hechos y proporciona datos actuales sobre: {prompt}"
                 if self.on_provider_start:
                     self.on_provider_start(ProviderType.PERPLEXITY)
                 response = await perplexity.generate(
-                    prompt=f"Verifica los hechos y proporciona datos actuales sobre: {prompt}",
+                    prompt=expert_prompt,
                     system_prompt=system_prompt,
-                    temperature=0.3
+                    temperature=0.3,
+                    max_tokens=self._budget(perplexity, "expert", expert_prompt, system_prompt)
                 )
                 if self.on_provider_complete:
                     self.on_provider_complete(ProviderType.PERPLEXITY, response)
@@ -737,12 +1495,14 @@ class CouncilOfWiseMen:
                     user_context, "style_analyzer"
                 )
                 provider_type = style_provider.provider_type
+                expert_prompt = f"Analiza el estilo, tono y psicología para optimizar: {prompt}"
                 if self.on_provider_start:
                     self.on_provider_start(provider_type)
                 response = await style_provider.generate(
-                    prompt=f"Analiza el estilo, tono y psicología para optimizar: {prompt}",
+                    prompt=expert_prompt,
                     system_prompt=system_prompt,
-                    temperature=0.7
+                    temperature=0.7,
+                    max_tokens=self._budget(style_provider, "expert", expert_prompt, system_prompt)
                 )
                 if self.on_provider_complete:
                     self.on_provider_complete(provider_type, response)
@@ -754,6 +1514,7 @@ class CouncilOfWiseMen:
             )
 
         # Ejecutar en paralelo
+        experts_start = time.time()
         fact_check_result, style_result = await asyncio.gather(
             run_fact_checker(),
             run_style_analyzer(),
@@ -779,6 +1540,60 @@ class CouncilOfWiseMen:
 
         responses["perplexity"] = fact_check_result
         responses["style_analyzer"] = style_result
+        stage_timings = {"experts": int((time.time() - experts_start) * 1000)}
+
+        # Atajo: con un solo experto válido, o si ambos coinciden, no hace
+        # falta el Juez. Las notas se generaron con el presupuesto "expert"
+        # (solo las lee el Juez), así que una llamada de redacción barata,
+        # sin síntesis, las convierte en la respuesta final
+        succeeded = [
+            r for r in (fact_check_result, style_result) if r.success and r.content
+        ]
+        metadata = {"judge": "full"}
+        final_response = None
+
+        if len(succeeded) == 1:
+            final_response = succeeded[0].content
+            metadata["judge"] = "skipped_single_expert"
+        elif len(succeeded) == 2:
+            merge_start = time.time()
+            similarity = text_similarity(fact_check_result.content, style_result.content)
+            metadata["expert_similarity"] = round(similarity, 3)
+            if similarity >= self.agreement_threshold:
+                final_response = merge_responses(
+                    fact_check_result.content, style_result.content
+                )
+                metadata["judge"] = "merged_agreement"
+            stage_timings["merge"] = int((time.time() - merge_start) * 1000)
+
+        if final_response is not None:
+            logger.info(f"CONSENSUS sin Juez: {metadata}")
+            editor_prompt = self.prompt_builder.build_finalize_prompt(prompt, final_response)
+            editor_system = self.prompt_builder.build_system_prompt(user_context)
+
+            if self.on_provider_start:
+                self.on_provider_start(ProviderType.DEEPSEEK)
+            editor_start = time.time()
+            editor_response = await deepseek.generate(
+                prompt=editor_prompt,
+                system_prompt=editor_system,
+                temperature=0.3,
+                max_tokens=self._budget(deepseek, "final", editor_prompt, editor_system)
+            )
+            stage_timings["editor"] = int((time.time() - editor_start) * 1000)
+            if self.on_provider_complete:
+                self.on_provider_complete(ProviderType.DEEPSEEK, editor_response)
+
+            responses["deepseek_editor"] = editor_response
+            return SwarmResult(
+                final_response=editor_response.content,
+                mode=SwarmMode.CONSENSUS,
+                individual_responses=responses,
+                success=editor_response.success,
+                error=editor_response.error,
+                stage_timings=stage_timings,
+                metadata=metadata
+            )
 
         # Fase 2: DeepSeek como Juez
         judge_prompt = self.prompt_builder.build_judge_prompt(
@@ -792,11 +1607,14 @@ class CouncilOfWiseMen:
         if self.on_provider_start:
             self.on_provider_start(ProviderType.DEEPSEEK)
 
+        judge_start = time.time()
         judge_response = await deepseek.generate(
             prompt=judge_prompt,
             system_prompt=judge_system,
-            temperature=0.5
+            temperature=0.5,
+            max_tokens=self._budget(deepseek, "judge", judge_prompt, judge_system)
         )
+        stage_timings["judge"] = int((time.time() - judge_start) * 1000)
 
         if self.on_provider_complete:
             self.on_provider_complete(ProviderType.DEEPSEEK, judge_response)
@@ -808,92 +1626,242 @@ class CouncilOfWiseMen:
             mode=SwarmMode.CONSENSUS,
             individual_responses=responses,
             success=judge_response.success,
-            error=judge_response.error
+            error=judge_response.error,
+            stage_timings=stage_timings,
+            metadata=metadata
         )
 
-    async def _process_creative(
+    async def _process_deep(
         self,
         prompt: str,
         user_context: UserContext,
-        content_type: str = "reel",
+        max_concurrency: int = 4,
+        fan_in: int = 4,
         **kwargs
     ) -> SwarmResult:
         """
-        Modo CREATIVE: Optimizado para contenido viral.
+        Modo DEEP: Fan-out a todos los proveedores + reducción jerárquica.
 
-        Args:
-            prompt: Tema o idea base
-            content_type: Tipo de contenido (reel, thread, caption)
+        Flujo:
+        1. Todos los proveedores disponibles analizan en paralelo
+           (concurrencia acotada por max_concurrency)
+        2. DeepSeek reduce los análisis en grupos de hasta fan_in; si hay
+           más grupos se repite por niveles hasta quedar una respuesta.
+           Con fan_in >= nº de expertos es una sola llamada al Juez.
         """
         deepseek = self._get_provider(ProviderType.DEEPSEEK, user_context)
         if not deepseek:
-            raise ValueError("DeepSeek no disponible para modo creativo")
+            raise ValueError("DeepSeek (Juez) no disponible")
 
-        # Prompts específicos por tipo de contenido
-        creative_prompts = {
-            "reel": """Crea un GUIÓN DE REEL de 1 minuto con esta estructura:
+        experts = []
+        for provider_type in DEEP_EXPERT_ROLES:
+            provider = self._get_provider(provider_type, user_context)
+            if provider:
+                experts.append(provider)
 
-🎣 GANCHO (0-3 segundos):
-- Frase impactante que detenga el scroll
-- Pregunta provocadora o dato sorprendente
+        semaphore = asyncio.Semaphore(max_concurrency)
 
-📚 VALOR (3-50 segundos):
-- Contenido principal dividido en 3-5 puntos
-- Cada punto debe ser tweeteable por sí solo
-- Usa transiciones claras
+        async def run_expert(provider: BaseAIProvider) -> AIResponse:
+            role, template, temperature = DEEP_EXPERT_ROLES[provider.provider_type]
+            system_prompt = self.prompt_builder.build_system_prompt(user_context, role)
+            expert_prompt = template.format(prompt=prompt)
+            async with semaphore:
+                if self.on_provider_start:
+                    self.on_provider_start(provider.provider_type)
+                response = await provider.generate(
+                    prompt=expert_prompt,
+                    system_prompt=system_prompt,
+                    temperature=temperature,
+                    max_tokens=self._budget(provider, "expert", expert_prompt, system_prompt)
+                )
+                if self.on_provider_complete:
+                    self.on_provider_complete(provider.provider_type, response)
+                return response
 
-🎯 CTA (50-60 segundos):
-- Llamada a la acción clara
-- Invita a comentar, guardar o compartir
+        # Fase 1: Fan-out
+        experts_start = time.time()
+        results = await asyncio.gather(
+            *(run_expert(provider) for provider in experts),
+            return_exceptions=True
+        )
+        stage_timings = {"experts": int((time.time() - experts_start) * 1000)}
 
-TEMA: {prompt}
+        responses = {}
+        analyses = []
+        for provider, result in zip(experts, results):
+            name = provider.provider_type.value
+            if isinstance(result, Exception):
+                result = AIResponse(
+                    provider=provider.provider_type,
+                    content="",
+                    success=False,
+                    error=str(result)
+                )
+            responses[name] = result
+            if result.success and result.content:
+                analyses.append((name, result.content))
 
-Incluye también:
-- 3 opciones de texto para overlay
-- Sugerencia de música/sonido trending
-- 10 hashtags optimizados""",
+        if not analyses:
+            raise ValueError("Ningún experto pudo completar el análisis")
 
-            "thread": """Crea un HILO DE TWITTER viral con esta estructura:
+        # Fase 2: Reducción jerárquica
+        judge_system = self.prompt_builder.build_system_prompt(user_context, "judge")
+        fan_in = max(2, fan_in)
+        level = 0
 
-1️⃣ TWEET GANCHO:
-- Máximo 280 caracteres
-- Debe generar curiosidad o controversia
+        async def run_judge(group: List[tuple]) -> AIResponse:
+            merge_prompt = self.prompt_builder.build_merge_prompt(prompt, group)
+            async with semaphore:
+                if self.on_provider_start:
+                    self.on_provider_start(ProviderType.DEEPSEEK)
+                response = await deepseek.generate(
+                    prompt=merge_prompt,
+                    system_prompt=judge_system,
+                    temperature=0.5,
+                    max_tokens=self._budget(deepseek, "judge", merge_prompt, judge_system)
+                )
+                if self.on_provider_complete:
+                    self.on_provider_complete(ProviderType.DEEPSEEK, response)
+                return response
 
-2️⃣-8️⃣ TWEETS DE DESARROLLO:
-- Cada uno autónomo pero conectado
-- Mezcla de datos, opiniones y preguntas
+        while True:
+            level_start = time.time()
+            groups = [analyses[i:i + fan_in] for i in range(0, len(analyses), fan_in)]
+            judged = await asyncio.gather(*(run_judge(group) for group in groups))
+            stage_timings[f"judge_level_{level}"] = int((time.time() - level_start) * 1000)
+
+            if len(judged) == 1:
+                final = judged[0]
+                responses["deepseek_judge"] = final
+                break
+
+            analyses = []
+            for index, response in enumerate(judged):
+                responses[f"deepseek_judge_{level}_{index}"] = response
+                if response.success and response.content:
+                    analyses.append((f"síntesis {index + 1}", response.content))
+            if not analyses:
+                raise ValueError("El Juez no pudo sintetizar los análisis")
+            level += 1
 
-9️⃣ TWEET RESUMEN:
-- Recapitula el mensaje principal
+        return SwarmResult(
+            final_response=final.content,
+            mode=SwarmMode.DEEP,
+            individual_responses=responses,
+            success=final.success,
+            error=final.error,
+            stage_timings=stage_timings
+        )
 
-🔟 TWEET CTA:
-- Invita a RT, seguir o comentar
+    async def _process_cascade(
+        self,
+        prompt: str,
+        user_context: UserContext,
+        **kwargs
+    ) -> SwarmResult:
+        """
+        Modo CASCADE: FAST primero, CONSENSUS solo cuando hace falta.
 
-TEMA: {prompt}""",
+        Escala directamente (sin llamar a FAST) si la política del plan es
+        "always" o el tema necesita datos actuales. Si no, ejecuta FAST
+        pidiendo una confianza autodeclarada y escala si queda por debajo
+        del umbral o FAST falla. Con política "never" no escala nunca.
+        """
+        policy = self.cascade_plan_policy.get(user_context.plan, "auto")
+        reason = None
+        confidence = None
+        fast_result = None
+
+        if policy == "always":
+            reason = "plan"
+        elif policy == "auto" and CURRENT_DATA_RE.search(prompt):
+            reason = "current_data"
+        else:
+            deepseek = self._get_provider(ProviderType.DEEPSEEK, user_context)
+            if not deepseek:
+                raise ValueError("DeepSeek no disponible")
 
-            "caption": """Crea un CAPTION DE INSTAGRAM optimizado para engagement:
+            system_prompt = (
+                self.prompt_builder.build_system_prompt(user_context, "general")
+                + CONFIDENCE_INSTRUCTION
+            )
+            if self.on_provider_start:
+                self.on_provider_start(ProviderType.DEEPSEEK)
+            response = await deepseek.generate(
+                prompt=prompt,
+                system_prompt=system_prompt,
+                max_tokens=self._budget(deepseek, "final", prompt, system_prompt)
+            )
+            if self.on_provider_complete:
+                self.on_provider_complete(ProviderType.DEEPSEEK, response)
+
+            if response.success:
+                match = CONFIDENCE_RE.search(response.content)
+                if match:
+                    confidence = min(100, int(match.group(1)))
+                    response.content = response.content[:match.start()].rstrip()
+
+            fast_result = SwarmResult(
+                final_response=response.content,
+                mode=SwarmMode.CASCADE,
+                individual_responses={"deepseek": response},
+                success=response.success,
+                error=response.error
+            )
 
-📝 PRIMERA LÍNEA (CRUCIAL):
-- Gancho que aparece antes del "más..."
-- Máximo 125 caracteres
+            if policy == "auto":
+                if not response.success:
+                    reason = "fast_error"
+                elif confidence is None or confidence < self.cascade_confidence_threshold:
+                    reason = "low_confidence"
+
+        if reason is None:
+            self.cascade_stats["fast"] += 1
+            logger.info(f"CASCADE resuelto con FAST (confianza={confidence}, plan={user_context.plan})")
+            fast_result.metadata = {
+                "billing_mode": SwarmMode.FAST.value,
+                "cascade": {"escalated": False, "confidence": confidence},
+            }
+            return fast_result
 
-📖 CUERPO:
-- Historia o valor en 3-4 párrafos cortos
-- Usa emojis estratégicamente
-- Incluye pregunta para generar comentarios
+        self.cascade_stats[reason] += 1
+        logger.info(f"CASCADE escala a CONSENSUS: {reason} (confianza={confidence}, plan={user_context.plan})")
 
-🎯 CTA:
-- Guarda este post si...
-- Comenta [emoji] si...
-- Comparte con alguien que...
+        result = await self._process_consensus(prompt, user_context)
+        if fast_result:
+            result.individual_responses = {
+                "fast_deepseek": fast_result.individual_responses["deepseek"],
+                **result.individual_responses
+            }
+        result.mode = SwarmMode.CASCADE
+        result.metadata = {
+            **result.metadata,
+            "billing_mode": SwarmMode.CONSENSUS.value,
+            # El borrador de FAST descartado no entra en la proporción BYOA
+            "billing_exclude": ["fast_deepseek"] if fast_result else [],
+            "cascade": {"escalated": True, "reason": reason, "confidence": confidence},
+        }
+        return result
 
-#️⃣ HASHTAGS:
-- 25-30 hashtags en 3 niveles (popular, medio, nicho)
+    async def _process_creative(
+        self,
+        prompt: str,
+        user_context: UserContext,
+        content_type: str = "reel",
+        **kwargs
+    ) -> SwarmResult:
+        """
+        Modo CREATIVE: Optimizado para contenido viral.
 
-TEMA: {prompt}"""
-        }
+        Args:
+            prompt: Tema o idea base
+            content_type: Tipo de contenido (reel, thread, caption)
+        """
+        deepseek = self._get_provider(ProviderType.DEEPSEEK, user_context)
+        if not deepseek:
+            raise ValueError("DeepSeek no disponible para modo creativo")
 
-        creative_prompt = creative_prompts.get(content_type, creative_prompts["reel"])
+        creative_prompt = CREATIVE_PROMPTS.get(content_type, CREATIVE_PROMPTS["reel"])
         formatted_prompt = creative_prompt.format(prompt=prompt)
 
         system_prompt = self.prompt_builder.build_system_prompt(user_context, "creative")
@@ -901,11 +1869,13 @@ TEMA: {prompt}"""
         if self.on_provider_start:
             self.on_provider_start(ProviderType.DEEPSEEK)
 
-        response = await deepseek.generate(
+        response = await self._generate_hedged(
+            deepseek,
+            user_context,
             prompt=formatted_prompt,
             system_prompt=system_prompt,
             temperature=0.8,
-            max_tokens=3000
+            max_tokens=self._budget(deepseek, "creative", formatted_prompt, system_prompt)
         )
 
         if self.on_provider_complete:
@@ -916,7 +1886,142 @@ TEMA: {prompt}"""
             mode=SwarmMode.CREATIVE,
             individual_responses={"deepseek": response},
             success=response.success,
-            error=response.error
+            error=response.error,
+            metadata={
+                "billing_operation": self._billing_operation(SwarmMode.CREATIVE, content_type),
+            }
+        )
+
+    async def _process_creative_bundle(
+        self,
+        prompt: str,
+        user_context: UserContext,
+        content_types: Optional[List[str]] = None,
+        research: bool = False,
+        **kwargs
+    ) -> SwarmResult:
+        """
+        Modo CREATIVE_BUNDLE: varios formatos CREATIVE en una sola solicitud.
+
+        Todos los formatos comparten el mismo prefijo (prompt de sistema +
+        tema + investigación) y solo difieren en las instrucciones finales,
+        así que el proveedor puede reutilizar su caché de prefijo. Los
+        formatos se generan en paralelo: la latencia total es la de la
+        investigación (opcional, una sola llamada a Perplexity) más la del
+        formato más lento.
+
+        Args:
+            prompt: Tema o idea base
+            content_types: Formatos a generar (por defecto todos)
+            research: Si True, Perplexity reúne datos actuales del tema una
+                      vez y se comparten con todos los formatos
+        """
+        content_types = list(dict.fromkeys(content_types or CREATIVE_PROMPTS))
+        unknown = [ct for ct in content_types if ct not in CREATIVE_PROMPTS]
+        if unknown:
+            raise ValueError(f"Tipos de contenido no soportados: {', '.join(unknown)}")
+
+        deepseek = self._get_provider(ProviderType.DEEPSEEK, user_context)
+        if not deepseek:
+            raise ValueError("DeepSeek no disponible para modo creativo")
+
+        responses = {}
+        stage_timings = {}
+
+        # Investigación compartida (si falla, se genera sin ella)
+        research_notes = ""
+        perplexity = self._get_provider(ProviderType.PERPLEXITY, user_context) if research else None
+        if perplexity:
+            research_start = time.time()
+            system_prompt = self.prompt_builder.build_system_prompt(user_context, "fact_checker")
+            research_prompt = (
+                f"Reúne datos actuales, cifras, tendencias y ejemplos sobre este tema "
+                f"para crear contenido en redes sociales: {prompt}"
+            )
+            if self.on_provider_start:
+                self.on_provider_start(ProviderType.PERPLEXITY)
+            try:
+                response = await perplexity.generate(
+                    prompt=research_prompt,
+                    system_prompt=system_prompt,
+                    temperature=0.3,
+                    max_tokens=self._budget(perplexity, "expert", research_prompt, system_prompt)
+                )
+            except Exception as e:
+                response = AIResponse(
+                    provider=ProviderType.PERPLEXITY, content="", success=False, error=str(e)
+                )
+            if self.on_provider_complete:
+                self.on_provider_complete(ProviderType.PERPLEXITY, response)
+            responses["research"] = response
+            stage_timings["research"] = int((time.time() - research_start) * 1000)
+            if response.success and response.content:
+                research_notes = f"INVESTIGACIÓN (datos actuales):\n{response.content}\n\n"
+            else:
+                logger.warning(f"Investigación no disponible para CREATIVE_BUNDLE: {response.error}")
+
+        # Prefijo idéntico para todos los formatos
+        system_prompt = self.prompt_builder.build_system_prompt(user_context, "creative")
+        shared_prefix = f"TEMA: {prompt}\n\n{research_notes}---\n\n"
+
+        async def generate_format(content_type: str) -> AIResponse:
+            format_prompt = shared_prefix + CREATIVE_PROMPTS[content_type].format(prompt=prompt)
+            if self.on_provider_start:
+                self.on_provider_start(ProviderType.DEEPSEEK)
+            format_start = time.time()
+            response = await deepseek.generate(
+                prompt=format_prompt,
+                system_prompt=system_prompt,
+                temperature=0.8,
+                max_tokens=self._budget(deepseek, "creative", format_prompt, system_prompt)
+            )
+            stage_timings[content_type] = int((time.time() - format_start) * 1000)
+            if self.on_provider_complete:
+                self.on_provider_complete(ProviderType.DEEPSEEK, response)
+            return response
+
+        formats_start = time.time()
+        results = await asyncio.gather(
+            *(generate_format(ct) for ct in content_types),
+            return_exceptions=True
+        )
+        stage_timings["formats"] = int((time.time() - formats_start) * 1000)
+
+        sections = []
+        formats = {}
+        for content_type, response in zip(content_types, results):
+            if isinstance(response, Exception):
+                response = AIResponse(
+                    provider=ProviderType.DEEPSEEK, content="", success=False, error=str(response)
+                )
+            responses[f"creative_{content_type}"] = response
+            formats[content_type] = {
+                "success": response.success,
+                "duration_ms": stage_timings.get(content_type, 0),
+                "error": response.error,
+            }
+            if response.success:
+                sections.append(f"## {content_type.upper()}\n\n{response.content}")
+
+        generated = len(sections)
+        failed = [ct for ct, info in formats.items() if not info["success"]]
+        return SwarmResult(
+            final_response="\n\n".join(sections),
+            mode=SwarmMode.CREATIVE_BUNDLE,
+            individual_responses=responses,
+            success=generated > 0,
+            error=f"Formatos fallidos: {', '.join(failed)}" if failed else None,
+            stage_timings=stage_timings,
+            metadata={
+                # Se cobra cada formato generado a su tarifa
+                "billing_mode": SwarmMode.CREATIVE.value,
+                "billing_operations": {
+                    f"creative_{ct}": self._billing_operation(SwarmMode.CREATIVE, ct)
+                    for ct, info in formats.items() if info["success"]
+                },
+                "formats": formats,
+                "research": bool(research_notes),
+            }
         )
 
     async def learn_preference(
@@ -0,0 +1,116 @@
+"""
+Agent Pilot - Caché de respuestas
+=================================
+Caché exacta para los modos FAST y CREATIVE: la misma consulta escrita con
+otras mayúsculas, tildes, puntuación, artículos o preposiciones ("Analiza
+la subida de tipos del BCE" / "analiza subida de tipos del bce?")
+reutiliza la respuesta sin llamar al proveedor.
+
+La clave es la secuencia de palabras con contenido (todo salvo artículos y
+preposiciones; las negaciones cuentan), así que dos preguntas distintas
+nunca comparten respuesta: "subida" y "bajada" de tipos son claves
+diferentes. No hay coincidencia aproximada; las paráfrasis reales ("lo que
+ha decidido el BCE") no aciertan.
+
+Las respuestas se personalizan con el perfil del usuario, así que la clave
+incluye el perfil (bio + memoria), el modo y el tipo de contenido.
+"""
+
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Palabras que no cambian la pregunta (las negaciones no están aquí)
+STOPWORDS = frozenset("""
+    a al algo ante con de del el en entre es esta este esto hacia la las lo
+    los me mi para por que se su sus te tu un una unas unos y o u
+    an and are at be for from how in is it of on the this to what
+""".split())
+
+
+def content_words(text: str) -> tuple:
+    """Palabras con contenido, normalizadas y en orden."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return tuple(w for w in _WORD_RE.findall(text) if w not in STOPWORDS)
+
+
+def content_key(text: str) -> str:
+    """Huella de content_words(text)."""
+    return hashlib.blake2b(" ".join(content_words(text)).encode("utf-8"), digest_size=16).hexdigest()
+
+
+@dataclass
+class CacheHit:
+    """Respuesta encontrada en la caché."""
+    response: str
+    age_s: int
+
+
+class ResponseCache:
+    """
+    Caché de respuestas por (perfil, consulta normalizada).
+
+    - TTL: las entradas caducadas no se devuelven y se borran al leerlas.
+    - Límite de memoria: al superar max_entries se descartan las entradas
+      menos usadas (LRU).
+    """
+
+    def __init__(self, ttl_seconds: int = 3600, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        self.stats: Counter = Counter()
+
+    @staticmethod
+    def partition_key(
+        bio_entrenamiento: dict,
+        memoria: list,
+        mode: str,
+        content_type: Optional[str] = None
+    ) -> str:
+        """Clave de partición: todo lo que cambia el system prompt."""
+        profile = json.dumps(
+            [bio_entrenamiento or {}, (memoria or [])[-10:], mode, content_type],
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str
+        )
+        return hashlib.sha1(profile.encode("utf-8")).hexdigest()
+
+    def get(self, partition_key: str, prompt: str) -> Optional[CacheHit]:
+        """Busca la respuesta a la misma consulta en la partición."""
+        key = (partition_key, content_key(prompt))
+        entry = self._entries.get(key)
+        now = time.time()
+        if entry is None or now - entry[0] >= self.ttl_seconds:
+            if entry is not None:
+                del self._entries[key]
+            self.stats["miss"] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats["hit"] += 1
+        return CacheHit(response=entry[1], age_s=int(now - entry[0]))
+
+    def put(self, partition_key: str, prompt: str, response: str) -> None:
+        """Guarda la respuesta a un prompt."""
+        key = (partition_key, content_key(prompt))
+        self._entries[key] = (time.time(), response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
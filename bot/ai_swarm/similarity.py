@@ -0,0 +1,69 @@
+"""
+Agent Pilot - Similitud local entre respuestas
+==============================================
+Coseno sobre shingles de palabras (unigramas + bigramas), sin red ni
+dependencias. Sirve para detectar cuándo dos expertos dicen lo mismo y
+ahorrar la llamada al Juez.
+"""
+
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import List
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+
+def normalize_words(text: str) -> List[str]:
+    """Minúsculas, sin tildes y solo palabras de más de 2 letras."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [w for w in _WORD_RE.findall(text) if len(w) > 2]
+
+
+def shingles(text: str) -> Counter:
+    """Vector disperso de unigramas y bigramas de palabras."""
+    words = normalize_words(text)
+    features = Counter(words)
+    features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return features
+
+
+def cosine(a: Counter, b: Counter) -> float:
+    """Coseno entre dos vectores dispersos."""
+    if not a or not b:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(count * b.get(feature, 0) for feature, count in a.items())
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+
+def text_similarity(a: str, b: str) -> float:
+    """Similitud (0-1) entre dos textos."""
+    return cosine(shingles(a), shingles(b))
+
+
+def merge_responses(primary: str, secondary: str, novelty_threshold: float = 0.5) -> str:
+    """
+    Fusión ligera de dos respuestas que coinciden.
+
+    Parte de `primary` y le añade los párrafos de `secondary` que no
+    repiten ninguno de los ya incluidos.
+    """
+    kept = [shingles(p) for p in _PARAGRAPH_RE.split(primary) if p.strip()]
+    extra = []
+    for paragraph in _PARAGRAPH_RE.split(secondary):
+        if not paragraph.strip():
+            continue
+        vector = shingles(paragraph)
+        if all(cosine(vector, other) < novelty_threshold for other in kept):
+            extra.append(paragraph.strip())
+            kept.append(vector)
+
+    if not extra:
+        return primary
+    return primary.rstrip() + "\n\n" + "\n\n".join(extra)
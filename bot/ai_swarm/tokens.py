@@ -0,0 +1,188 @@
+"""
+Agent Pilot - Estimación de tokens y troceado de textos
+=======================================================
+Utilidades locales (sin red) para estimar el tamaño de un prompt y
+dividir textos largos en fragmentos solapados por frases.
+"""
+
+import re
+from typing import List
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+|\n{2,}")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estima los tokens BPE de un texto.
+
+    Aproximación: cada palabra cuenta ~1 token por cada 4 caracteres y cada
+    signo de puntuación cuenta como 1. Suele quedar a ±15% de los
+    tokenizadores reales en español e inglés.
+    """
+    if not text:
+        return 0
+    tokens = 0
+    for piece in _WORD_RE.findall(text):
+        tokens += (len(piece) + 3) // 4
+    return tokens
+
+
+def split_sentences(text: str) -> List[str]:
+    """Divide un texto en frases (y párrafos)."""
+    return [s.strip() for s in _SENTENCE_RE.split(text) if s and s.strip()]
+
+
+def _split_long_sentence(sentence: str, max_tokens: int) -> List[str]:
+    """Corta por palabras una frase que por sí sola supera max_tokens."""
+    parts, current, current_tokens = [], [], 0
+    for word in sentence.split():
+        word_tokens = estimate_tokens(word)
+        if current and current_tokens + word_tokens > max_tokens:
+            parts.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(word)
+        current_tokens += word_tokens
+    if current:
+        parts.append(" ".join(current))
+    return parts
+
+
+def split_into_chunks(
+    text: str,
+    max_tokens: int = 1500,
+    overlap_tokens: int = 150
+) -> List[str]:
+    """
+    Divide un texto en fragmentos de hasta max_tokens respetando frases.
+
+    Cada fragmento empieza con las últimas frases del anterior (hasta
+    overlap_tokens) para no perder contexto en los cortes.
+    """
+    sentences = []
+    for sentence in split_sentences(text):
+        if estimate_tokens(sentence) > max_tokens:
+            sentences.extend(_split_long_sentence(sentence, max_tokens))
+        else:
+            sentences.append(sentence)
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    for sentence in sentences:
+        sentence_tokens = estimate_tokens(sentence)
+        if current and current_tokens + sentence_tokens > max_tokens:
+            chunks.append(" ".join(current))
+
+            # Solape: arrastrar las últimas frases del fragmento anterior
+            overlap: List[str] = []
+            overlap_size = 0
+            for previous in reversed(current):
+                previous_tokens = estimate_tokens(previous)
+                if overlap_size + previous_tokens > overlap_tokens:
+                    break
+                overlap.insert(0, previous)
+                overlap_size += previous_tokens
+            if overlap_size + sentence_tokens > max_tokens:
+                overlap, overlap_size = [], 0
+
+            current, current_tokens = overlap, overlap_size
+
+        current.append(sentence)
+        current_tokens += sentence_tokens
+
+    if current:
+        chunks.append(" ".join(current))
+
+    return chunks
+
+
+# ============================================================================
+# PRESUPUESTO DE TOKENS
+# ============================================================================
+
+# Ventana de contexto (tokens) de cada modelo
+CONTEXT_LIMITS = {
+    "deepseek-chat": 64000,
+    "sonar-pro": 200000,
+    "gpt-4-turbo-preview": 128000,
+    "claude-3-5-sonnet-20241022": 200000,
+}
+
+# max_tokens por rol: (mínimo, máximo, tokens de salida por token de entrada).
+# Con ratio None la salida es fija (el máximo) y solo baja, hasta el mínimo,
+# si no cabe en el contexto: la longitud de una respuesta al usuario no
+# depende de lo corta que sea la pregunta.
+ROLE_BUDGETS = {
+    "expert": (300, 700, 0.5),       # Notas que solo lee el Juez
+    "chunk": (200, 500, 0.3),        # Ideas clave de un fragmento
+    "judge": (600, 1500, 0.5),       # Síntesis final del Consejo
+    "final": (500, 2000, None),      # Respuesta directa al usuario (FAST)
+    "creative": (1200, 3000, None),  # Guiones, hilos y captions
+}
+
+
+class PromptTooLargeError(ValueError):
+    """El prompt no cabe en la ventana de contexto del modelo."""
+
+
+class TokenBudgeter:
+    """
+    Calcula max_tokens por llamada según el rol y el tamaño del prompt.
+
+    El tiempo de generación crece con los tokens de salida, así que las
+    notas intermedias reciben presupuestos pequeños y la respuesta final
+    uno mayor. Antes de cada llamada comprueba que prompt + salida caben
+    en el contexto del modelo.
+    """
+
+    def __init__(
+        self,
+        role_budgets: dict = None,
+        context_limits: dict = None,
+        default_context: int = 32000,
+        safety_margin: int = 256
+    ):
+        self.role_budgets = role_budgets or ROLE_BUDGETS
+        self.context_limits = context_limits or CONTEXT_LIMITS
+        self.default_context = default_context
+        self.safety_margin = safety_margin
+
+    def context_limit(self, model: str) -> int:
+        return self.context_limits.get(model, self.default_context)
+
+    def max_tokens(
+        self,
+        role: str,
+        prompt: str,
+        system_prompt: str = "",
+        model: str = None
+    ) -> int:
+        """
+        Devuelve el max_tokens para una llamada.
+
+        Raises:
+            PromptTooLargeError: si no queda sitio ni para el mínimo del rol
+        """
+        minimum, maximum, ratio = self.role_budgets[role]
+        prompt_tokens = estimate_tokens(prompt) + estimate_tokens(system_prompt or "")
+
+        if ratio is None:
+            wanted = maximum
+        else:
+            wanted = min(maximum, minimum + int(prompt_tokens * ratio))
+        available = self.context_limit(model) - prompt_tokens - self.safety_margin
+        if available < minimum:
+            raise PromptTooLargeError(
+                f"El prompt (~{prompt_tokens} tokens) no cabe en el contexto de {model}"
+            )
+        return min(wanted, available)
+
+    def ensure_fits(self, model: str, prompt_tokens: int, role: str) -> None:
+        """Comprueba por adelantado que un prompt de prompt_tokens cabe con la salida mínima del rol."""
+        minimum = self.role_budgets[role][0]
+        if prompt_tokens + minimum + self.safety_margin > self.context_limit(model):
+            raise PromptTooLargeError(
+                f"El prompt (~{prompt_tokens} tokens) no cabe en el contexto de {model}"
+            )
@@ -0,0 +1,183 @@
+"""
+Agent Pilot Bot - Analytics Export
+==================================
+Streams transacciones, sesiones_ia and usuarios_pro into the local
+columnar store (see analytics/store.py), one keyset-paginated page at a
+time, so memory stays flat however big the tables are.
+
+Exports are incremental: a re-run appends only the rows created after the
+stored cursor, and an interrupted run resumes from its last page.
+usuarios_pro (for the plan of each user) is always re-exported in full.
+
+    python -m analytics.export [--data-dir analytics_data] [--full]
+"""
+
+import argparse
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+from config import settings
+from database.supabase_client import db
+from .store import Dictionaries, TableWriter
+
+logger = logging.getLogger(__name__)
+
+# table -> (columns to select, {column: (source field, kind)}, snapshot)
+# kind: "timestamp" (epoch seconds), "int32", "dict:<name>" (dictionary
+# code) or "bitmask:<name>" (JSON list of dictionary values as bits of an
+# int64, so at most MAX_BITMASK_CODES distinct values)
+TABLES = {
+    "transacciones": (
+        "id, usuario_id, tipo, creditos, operacion_tipo, created_at",
+        {
+            "ts": ("created_at", "timestamp"),
+            "usuario": ("usuario_id", "dict:usuario"),
+            "tipo": ("tipo", "dict:tipo"),
+            "operacion": ("operacion_tipo", "dict:operacion"),
+            "creditos": ("creditos", "int32"),
+        },
+        False,
+    ),
+    "sesiones_ia": (
+        "id, usuario_id, modo, proveedores_usados, tokens_totales, "
+        "duracion_total_ms, creditos_consumidos, estado, created_at",
+        {
+            "ts": ("created_at", "timestamp"),
+            "usuario": ("usuario_id", "dict:usuario"),
+            "modo": ("modo", "dict:modo"),
+            "estado": ("estado", "dict:estado"),
+            "proveedores": ("proveedores_usados", "bitmask:proveedor"),
+            "tokens": ("tokens_totales", "int32"),
+            "duracion_ms": ("duracion_total_ms", "int32"),
+            "creditos": ("creditos_consumidos", "int32"),
+        },
+        False,
+    ),
+    "usuarios_pro": (
+        "id, plan_actual, created_at",
+        {
+            "usuario": ("id", "dict:usuario"),
+            "plan": ("plan_actual", "dict:plan"),
+        },
+        True,
+    ),
+}
+
+MAX_BITMASK_CODES = 63
+
+_FRACTION_RE = re.compile(r"\.(\d+)")
+
+
+def parse_timestamp(value: str) -> int:
+    """Epoch seconds of a Postgres ISO timestamp (any fraction length)."""
+    value = _FRACTION_RE.sub(lambda m: "." + m.group(1)[:6].ljust(6, "0"), value, count=1)
+    return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+
+
+def _dtype(kind: str) -> str:
+    return "int64" if kind == "timestamp" or kind.startswith("bitmask:") else "int32"
+
+
+def encode_page(
+    rows: List[dict],
+    spec: Dict[str, tuple],
+    dictionaries: Dictionaries
+) -> Dict[str, np.ndarray]:
+    """Convert a page of rows to one array per column."""
+    columns = {}
+    for column, (field, kind) in spec.items():
+        values = [row.get(field) for row in rows]
+        if kind == "timestamp":
+            data = [parse_timestamp(v) if v else 0 for v in values]
+        elif kind.startswith("dict:"):
+            name = kind.split(":", 1)[1]
+            data = [dictionaries.encode(name, v) for v in values]
+        elif kind.startswith("bitmask:"):
+            name = kind.split(":", 1)[1]
+            data = []
+            for items in values:
+                mask = 0
+                for item in items or []:
+                    if item is None:
+                        continue
+                    code = dictionaries.encode(name, item)
+                    if code >= MAX_BITMASK_CODES:
+                        raise ValueError(
+                            f"'{name}' has more than {MAX_BITMASK_CODES} values; "
+                            f"{item!r} does not fit in the {column} bitmask"
+                        )
+                    mask |= 1 << code
+                data.append(mask)
+        else:
+            data = [v or 0 for v in values]
+        columns[column] = np.asarray(data, dtype=_dtype(kind))
+    return columns
+
+
+async def export_table(
+    data_dir: str,
+    table: str,
+    dictionaries: Dictionaries,
+    page_size: int = 5000,
+    full: bool = False
+) -> int:
+    """Export (or continue exporting) one table. Returns the rows written."""
+    select, spec, snapshot = TABLES[table]
+    writer = TableWriter(
+        data_dir,
+        table,
+        {column: _dtype(kind) for column, (_, kind) in spec.items()},
+        reset=full or snapshot,
+    )
+    cursor = tuple(writer.cursor) if writer.cursor else None
+    written = 0
+
+    while True:
+        rows = await db.get_rows_after(table, select, after=cursor, limit=page_size)
+        if not rows:
+            break
+        columns = encode_page(rows, spec, dictionaries)
+        cursor = (rows[-1]["created_at"], rows[-1]["id"])
+        dictionaries.save()
+        writer.append(columns, cursor)
+        written += len(rows)
+        if len(rows) < page_size:
+            break
+
+    logger.info(f"{table}: {written} new rows ({writer.rows} total)")
+    return written
+
+
+async def export_all(data_dir: str, page_size: int = 5000, full: bool = False) -> Dict[str, int]:
+    """Export every analytics table."""
+    dictionaries = Dictionaries(data_dir)
+    start = time.time()
+    written = {}
+    for table in TABLES:
+        written[table] = await export_table(data_dir, table, dictionaries, page_size, full)
+    logger.info(f"Export finished in {time.time() - start:.1f}s")
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export usage tables to the local columnar store")
+    parser.add_argument("--data-dir", default="analytics_data")
+    parser.add_argument("--page-size", type=int, default=5000)
+    parser.add_argument("--full", action="store_true", help="Re-export from scratch")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=getattr(logging, settings.log_level),
+    )
+    asyncio.run(export_all(args.data_dir, args.page_size, args.full))
+
+
+if __name__ == "__main__":
+    main()
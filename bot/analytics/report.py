@@ -0,0 +1,223 @@
+"""
+Agent Pilot Bot - Usage Reports
+===============================
+Aggregates over the exported columnar store (run analytics.export first).
+Every aggregate is a single vectorized group-by: dictionary codes are
+combined into one integer key and summed with np.bincount, so reports
+over millions of rows take well under a second.
+
+    python -m analytics.report [--data-dir analytics_data] [--days 30] [--top 10]
+"""
+
+import argparse
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .store import load_dictionaries, load_table
+
+NONE_LABEL = "(none)"
+SECONDS_PER_DAY = 86400
+
+
+def group_by(
+    keys: Sequence[np.ndarray],
+    sizes: Sequence[int],
+    weights: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Sum `weights` (or count rows) for each combination of codes.
+
+    Codes are in [-1, size); -1 (NULL) lands in slot 0 of its axis.
+    Returns an array of shape (size_1 + 1, size_2 + 1, ...).
+    """
+    shape = [size + 1 for size in sizes]
+    combined = np.zeros(len(keys[0]), dtype=np.int64)
+    for key, axis in zip(keys, shape):
+        combined *= axis
+        combined += key.astype(np.int64) + 1
+    counts = np.bincount(
+        combined,
+        weights=None if weights is None else weights.astype(np.float64),
+        minlength=int(np.prod(shape))
+    )
+    return counts.reshape(shape)
+
+
+def _labels(values: List[str]) -> List[str]:
+    return [NONE_LABEL] + list(values)
+
+
+class UsageReport:
+    """Aggregates over sesiones_ia and transacciones for a time window."""
+
+    def __init__(
+        self,
+        data_dir: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ):
+        self.dictionaries = load_dictionaries(data_dir)
+        self.sessions = self._window(load_table(data_dir, "sesiones_ia"), since, until)
+        self.transactions = self._window(load_table(data_dir, "transacciones"), since, until)
+
+        # usuario code -> plan code; the extra last slot maps code -1 to -1
+        users = load_table(data_dir, "usuarios_pro")
+        self.plan_of_user = np.full(self._size("usuario") + 1, -1, dtype=np.int32)
+        self.plan_of_user[users["usuario"]] = users["plan"]
+
+    @staticmethod
+    def _window(columns: Dict[str, np.ndarray], since, until) -> Dict[str, np.ndarray]:
+        if since is None and until is None:
+            return columns
+        ts = columns["ts"]
+        mask = np.ones(len(ts), dtype=bool)
+        if since is not None:
+            mask &= ts >= int(since.timestamp())
+        if until is not None:
+            mask &= ts < int(until.timestamp())
+        return {name: column[mask] for name, column in columns.items()}
+
+    def _size(self, dictionary: str) -> int:
+        return len(self.dictionaries.get(dictionary, []))
+
+    def _days(self, ts: np.ndarray) -> tuple:
+        """Day codes (0 = first day) and their labels."""
+        if len(ts) == 0:
+            return np.zeros(0, dtype=np.int64), []
+        days = ts // SECONDS_PER_DAY
+        first = int(days.min())
+        labels = [
+            datetime.fromtimestamp((first + i) * SECONDS_PER_DAY, timezone.utc).strftime("%Y-%m-%d")
+            for i in range(int(days.max()) - first + 1)
+        ]
+        return days - first, labels
+
+    @staticmethod
+    def _rows(tables: Sequence[np.ndarray], labels: Sequence[List[str]]) -> List[tuple]:
+        """Flatten aligned group-by results into (label..., value...) rows with activity."""
+        rows = []
+        for index in zip(*np.nonzero(tables[0])):
+            rows.append(
+                tuple(axis_labels[i] for axis_labels, i in zip(labels, index))
+                + tuple(int(table[index]) for table in tables)
+            )
+        return rows
+
+    # ---- Sesiones IA ----
+
+    def by_day_and_mode(self) -> List[tuple]:
+        """(day, mode, sessions, credits, tokens)"""
+        s = self.sessions
+        days, day_labels = self._days(s["ts"])
+        keys, sizes = [days, s["modo"]], [len(day_labels), self._size("modo")]
+        return self._rows(
+            [group_by(keys, sizes), group_by(keys, sizes, s["creditos"]), group_by(keys, sizes, s["tokens"])],
+            [_labels(day_labels), _labels(self.dictionaries.get("modo", []))],
+        )
+
+    def by_plan_and_mode(self) -> List[tuple]:
+        """(plan, mode, sessions, credits, tokens) using each user's current plan."""
+        s = self.sessions
+        plans = self.plan_of_user[s["usuario"]]
+        keys, sizes = [plans, s["modo"]], [self._size("plan"), self._size("modo")]
+        return self._rows(
+            [group_by(keys, sizes), group_by(keys, sizes, s["creditos"]), group_by(keys, sizes, s["tokens"])],
+            [_labels(self.dictionaries.get("plan", [])), _labels(self.dictionaries.get("modo", []))],
+        )
+
+    def by_provider(self) -> List[tuple]:
+        """(provider, sessions, tokens, avg duration ms) over sessions that used it."""
+        s = self.sessions
+        rows = []
+        for bit, provider in enumerate(self.dictionaries.get("proveedor", [])):
+            used = (s["proveedores"] & np.int64(1 << bit)) != 0
+            count = int(used.sum())
+            if count:
+                rows.append((
+                    provider,
+                    count,
+                    int(s["tokens"][used].sum(dtype=np.int64)),
+                    int(s["duracion_ms"][used].mean()),
+                ))
+        return sorted(rows, key=lambda row: -row[2])
+
+    # ---- Transacciones ----
+
+    def credits_by_day_and_type(self) -> List[tuple]:
+        """(day, tipo, transactions, net credits)"""
+        t = self.transactions
+        days, day_labels = self._days(t["ts"])
+        keys, sizes = [days, t["tipo"]], [len(day_labels), self._size("tipo")]
+        return self._rows(
+            [group_by(keys, sizes), group_by(keys, sizes, t["creditos"])],
+            [_labels(day_labels), _labels(self.dictionaries.get("tipo", []))],
+        )
+
+    def top_users(self, n: int = 10) -> List[tuple]:
+        """(user id, plan, credits consumed) for the n heaviest users."""
+        t = self.transactions
+        spent = t["creditos"] < 0
+        users = t["usuario"][spent]
+        totals = group_by([users], [self._size("usuario")], -t["creditos"][spent])
+        top = np.argsort(totals)[::-1][:n]
+
+        user_ids = _labels(self.dictionaries.get("usuario", []))
+        plan_labels = self.dictionaries.get("plan", [])
+        rows = []
+        for slot in top:
+            if totals[slot] <= 0:
+                break
+            plan = self.plan_of_user[slot - 1] if slot else -1
+            rows.append((
+                user_ids[slot],
+                plan_labels[plan] if plan >= 0 else NONE_LABEL,
+                int(totals[slot]),
+            ))
+        return rows
+
+
+def _print_table(title: str, headers: Sequence[str], rows: List[tuple]) -> None:
+    print(f"\n{title}")
+    widths = [
+        max(len(str(header)), *(len(str(row[i])) for row in rows)) if rows else len(str(header))
+        for i, header in enumerate(headers)
+    ]
+    print("  " + "  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  " + "  ".join(
+            str(value).rjust(w) if isinstance(value, int) else str(value).ljust(w)
+            for value, w in zip(row, widths)
+        ))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Usage reports over the exported analytics data")
+    parser.add_argument("--data-dir", default="analytics_data")
+    parser.add_argument("--days", type=int, default=None, help="Only the last N days")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    since = None
+    if args.days:
+        since = datetime.fromtimestamp(time.time() - args.days * SECONDS_PER_DAY, timezone.utc)
+
+    start = time.perf_counter()
+    report = UsageReport(args.data_dir, since=since)
+    _print_table("Sessions by day and mode", ["day", "mode", "sessions", "credits", "tokens"],
+                 report.by_day_and_mode())
+    _print_table("Sessions by plan and mode", ["plan", "mode", "sessions", "credits", "tokens"],
+                 report.by_plan_and_mode())
+    _print_table("Providers", ["provider", "sessions", "tokens", "avg ms"],
+                 report.by_provider())
+    _print_table("Credits by day and transaction type", ["day", "type", "transactions", "credits"],
+                 report.credits_by_day_and_type())
+    _print_table(f"Top {args.top} users by credits consumed", ["user", "plan", "credits"],
+                 report.top_users(args.top))
+    print(f"\nReport computed in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
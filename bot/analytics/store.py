@@ -0,0 +1,128 @@
+"""
+Agent Pilot Bot - Columnar Store
+================================
+Append-only columnar files for analytics exports. Each table is a
+directory with one raw binary file per column (read back as memory-mapped
+NumPy arrays) and a meta.json with the row count and the export cursor.
+String columns are dictionary-encoded; the dictionaries are shared by all
+tables of a data directory (dictionaries.json), so codes can be joined
+across tables.
+"""
+
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def _write_json(path: str, data) -> None:
+    """Write JSON atomically (a crash leaves the previous version)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _read_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class Dictionaries:
+    """String <-> int code mappings shared by a data directory."""
+
+    def __init__(self, data_dir: str):
+        self.path = os.path.join(data_dir, "dictionaries.json")
+        self.values: Dict[str, List[str]] = _read_json(self.path, {})
+        self._codes = {
+            name: {value: code for code, value in enumerate(values)}
+            for name, values in self.values.items()
+        }
+
+    def encode(self, name: str, value: Optional[str]) -> int:
+        """Code for a value (-1 for NULL), adding it if it's new."""
+        if value is None:
+            return -1
+        codes = self._codes.setdefault(name, {})
+        code = codes.get(value)
+        if code is None:
+            code = len(codes)
+            codes[value] = code
+            self.values.setdefault(name, []).append(value)
+        return code
+
+    def save(self) -> None:
+        _write_json(self.path, self.values)
+
+
+class TableWriter:
+    """Appends pages of rows to a table directory."""
+
+    def __init__(self, data_dir: str, table: str, dtypes: Dict[str, str], reset: bool = False):
+        self.dir = os.path.join(data_dir, table)
+        self.meta_path = os.path.join(self.dir, "meta.json")
+        self.dtypes = dtypes
+        os.makedirs(self.dir, exist_ok=True)
+
+        self.meta = {} if reset else _read_json(self.meta_path, {})
+        if self.meta.get("columns", dtypes) != dtypes:
+            raise ValueError(f"Column layout of {table} changed; export it again with --full")
+        self.meta.setdefault("rows", 0)
+        self.meta.setdefault("cursor", None)
+        self.meta["columns"] = dtypes
+
+        # Drop rows written after the last committed meta.json (crash mid-page)
+        for column, dtype in dtypes.items():
+            path = self._column_path(column)
+            size = self.meta["rows"] * np.dtype(dtype).itemsize
+            with open(path, "ab") as f:
+                f.truncate(size)
+
+    @property
+    def rows(self) -> int:
+        return self.meta["rows"]
+
+    @property
+    def cursor(self):
+        return self.meta["cursor"]
+
+    def _column_path(self, column: str) -> str:
+        return os.path.join(self.dir, f"{column}.bin")
+
+    def append(self, columns: Dict[str, np.ndarray], cursor) -> None:
+        """Append one page. Callers save the dictionaries first, then this commits."""
+        count = len(next(iter(columns.values())))
+        for column, dtype in self.dtypes.items():
+            with open(self._column_path(column), "ab") as f:
+                f.write(np.ascontiguousarray(columns[column], dtype=dtype).tobytes())
+        self.meta["rows"] += count
+        self.meta["cursor"] = cursor
+        _write_json(self.meta_path, self.meta)
+
+
+def load_table(data_dir: str, table: str) -> Dict[str, np.ndarray]:
+    """Memory-map every column of an exported table."""
+    table_dir = os.path.join(data_dir, table)
+    meta = _read_json(os.path.join(table_dir, "meta.json"), None)
+    if meta is None:
+        raise FileNotFoundError(f"{table} has not been exported to {data_dir}")
+
+    columns = {}
+    for column, dtype in meta["columns"].items():
+        if meta["rows"] == 0:
+            columns[column] = np.zeros(0, dtype=dtype)
+        else:
+            columns[column] = np.memmap(
+                os.path.join(table_dir, f"{column}.bin"),
+                dtype=dtype,
+                mode="r",
+                shape=(meta["rows"],),
+            )
+    return columns
+
+
+def load_dictionaries(data_dir: str) -> Dict[str, List[str]]:
+    return _read_json(os.path.join(data_dir, "dictionaries.json"), {})
@@ -0,0 +1,304 @@
+"""
+Agent Pilot Bot - Offline Batch Runner
+======================================
+Streams a JSONL file of prompts through the swarm outside Telegram
+(content calendars, backfills) and appends one JSONL result per input
+line as soon as it finishes ("line" is the 1-based input line).
+
+Input lines: {"prompt": "...", "id": optional, "mode": optional, plus
+optional process() arguments such as "content_type" or "research"}.
+
+Progress is checkpointed next to the output (<output>.checkpoint) as a
+watermark (every line up to it is done), its byte offset in the input and
+the few lines above it that already finished. After a crash, re-running
+the same command truncates the output to the last checkpoint and resumes
+at the watermark. Memory stays constant: the input is read lazily and
+results are written as they arrive.
+
+No credits are charged; the summary reports what the run would cost.
+
+    python batch.py prompts.jsonl results.jsonl --mode fast --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+
+from config import settings
+from ai_swarm.orchestrator import SwarmMode, SwarmResult, UserContext
+from core.handlers.message_handlers import build_user_context, get_council
+from database.credentials import credential_store
+from database.supabase_client import db
+from payments.pricing import pricing
+
+logger = logging.getLogger(__name__)
+
+# process() arguments accepted from input lines
+ITEM_OPTIONS = ("content_type", "content_types", "research")
+
+
+@dataclass
+class BatchReport:
+    """Summary of a batch run (cumulative across resumes)."""
+    lines: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    duplicates: int = 0
+    tokens: int = 0
+    credits: int = 0
+    duration_ms: int = 0
+
+    @property
+    def throughput(self) -> float:
+        """Lines per second."""
+        return self.lines / (self.duration_ms / 1000) if self.duration_ms else 0.0
+
+
+class BatchRunner:
+    """Runs a JSONL prompt file through CouncilOfWiseMen.process_many."""
+
+    def __init__(
+        self,
+        input_path: str,
+        output_path: str,
+        user_context: UserContext,
+        mode: SwarmMode = SwarmMode.FAST,
+        concurrency: int = 8,
+        provider_limits: Optional[Dict[str, int]] = None,
+        checkpoint_interval: float = 5.0
+    ):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.checkpoint_path = f"{output_path}.checkpoint"
+        self.user_context = user_context
+        self.mode = mode
+        self.concurrency = concurrency
+        self.provider_limits = provider_limits
+        self.checkpoint_interval = checkpoint_interval
+
+        self.report = BatchReport()
+        self._output = None
+        # Input read so far: (line number, byte offset after it)
+        self._read: Tuple[int, int] = (0, 0)
+        # Lines sent to the swarm and not finished: line -> byte offset where it starts
+        self._open: "OrderedDict[int, int]" = OrderedDict()
+        # Finished lines above the first open one
+        self._done: Set[int] = set()
+
+    # ---- Checkpoints ----
+
+    def _load_checkpoint(self) -> dict:
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return {}
+        if checkpoint.get("input") != os.path.abspath(self.input_path):
+            raise ValueError(f"{self.checkpoint_path} belongs to another input file")
+        return checkpoint
+
+    def _watermark(self) -> Tuple[int, int, list]:
+        """(last line with everything before it done, its input offset, finished lines above it)."""
+        if not self._open:
+            self._done.clear()
+            line, offset = self._read
+            return line, offset, []
+        first, offset = next(iter(self._open.items()))
+        self._done = {line for line in self._done if line > first}
+        return first - 1, offset, sorted(self._done)
+
+    def _save_checkpoint(self) -> None:
+        self._output.flush()
+        os.fsync(self._output.fileno())
+        line, offset, done = self._watermark()
+        checkpoint = {
+            "input": os.path.abspath(self.input_path),
+            "line": line,
+            "input_offset": offset,
+            "done": done,
+            "output_size": self._output.tell(),
+            "report": asdict(self.report),
+        }
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    # ---- Input ----
+
+    async def _items(self, source, skip: Set[int]) -> AsyncIterator[tuple]:
+        """Items for process_many, read lazily; invalid lines are answered directly."""
+        line, offset = self._read
+        for raw in iter(source.readline, b""):
+            start = offset
+            line += 1
+            offset += len(raw)
+            self._read = (line, offset)
+            if line in skip or not raw.strip():
+                continue
+            try:
+                entry = json.loads(raw)
+                prompt = entry["prompt"]
+                mode = SwarmMode(entry.get("mode") or self.mode.value)
+            except (ValueError, KeyError, TypeError) as e:
+                self._write({"line": line, "id": None, "success": False, "error": f"Invalid line: {e}"})
+                self._done.add(line)
+                continue
+
+            kwargs = {key: entry[key] for key in ITEM_OPTIONS if key in entry}
+            self._open[line] = start
+            yield (prompt, self.user_context, mode, kwargs), line, entry.get("id")
+
+    # ---- Output ----
+
+    def _write(self, record: dict) -> None:
+        self._output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.report.lines += 1
+        if record["success"]:
+            self.report.succeeded += 1
+        else:
+            self.report.failed += 1
+
+    def _record(self, line: int, item_id, result: SwarmResult) -> dict:
+        self.report.tokens += result.total_tokens
+        if result.metadata.get("duplicate_of") is not None:
+            self.report.duplicates += 1
+        if result.success:
+            self.report.credits += result.credits_consumed
+        return {
+            "line": line,
+            "id": item_id,
+            "mode": result.mode.value,
+            "success": result.success,
+            "response": result.final_response,
+            "error": result.error,
+            "tokens": result.total_tokens,
+            "credits": result.credits_consumed,
+            "duration_ms": result.total_duration_ms,
+        }
+
+    # ---- Run ----
+
+    async def run(self, restart: bool = False) -> BatchReport:
+        checkpoint = {} if restart else self._load_checkpoint()
+        if checkpoint:
+            self.report = BatchReport(**checkpoint["report"])
+            self._read = (checkpoint["line"], checkpoint["input_offset"])
+            logger.info(f"Resuming after line {checkpoint['line']} ({self.report.lines} lines done)")
+        skip = set(checkpoint.get("done", ()))
+        previous_ms = self.report.duration_ms
+        start = time.time()
+        last_checkpoint = start
+
+        council = get_council()
+        # process_many index -> (line, id)
+        positions: Dict[int, Tuple[int, Optional[str]]] = {}
+
+        async def items():
+            index = 0
+            async for item, line, item_id in self._items(source, skip):
+                positions[index] = (line, item_id)
+                index += 1
+                yield item
+
+        with open(self.input_path, "rb") as source, open(
+            self.output_path, "r+" if checkpoint else "w", encoding="utf-8"
+        ) as output:
+            self._output = output
+            source.seek(self._read[1])
+            # Results written after the last checkpoint are redone
+            output.truncate(checkpoint.get("output_size", 0))
+            output.seek(0, os.SEEK_END)
+
+            async for index, result in council.process_many(
+                items(), concurrency=self.concurrency, provider_limits=self.provider_limits
+            ):
+                line, item_id = positions.pop(index)
+                self._write(self._record(line, item_id, result))
+                del self._open[line]
+                self._done.add(line)
+
+                if time.time() - last_checkpoint >= self.checkpoint_interval:
+                    self.report.duration_ms = previous_ms + int((time.time() - start) * 1000)
+                    self._save_checkpoint()
+                    last_checkpoint = time.time()
+
+            self.report.duration_ms = previous_ms + int((time.time() - start) * 1000)
+            self._save_checkpoint()
+
+        await council.key_pools.flush_usage()
+        logger.info(
+            f"Batch {self.input_path}: {self.report.lines} lines "
+            f"({self.report.succeeded} ok, {self.report.failed} failed, "
+            f"{self.report.duplicates} duplicates) in {self.report.duration_ms} ms, "
+            f"{self.report.throughput:.1f} lines/s, {self.report.tokens} tokens, "
+            f"{self.report.credits} credits"
+        )
+        return self.report
+
+
+async def load_user_context(telegram_id: Optional[int], plan: str) -> UserContext:
+    """The user the batch runs as: a real user (bio, BYOA keys) or an anonymous one."""
+    if telegram_id is None:
+        return UserContext(user_id="batch", plan=plan)
+    user = await db.get_user_by_telegram_id(telegram_id)
+    if not user:
+        raise ValueError(f"No user with Telegram id {telegram_id}")
+    api_keys = {}
+    if pricing.plan(user.get("plan_actual", "free")).get("byoa_enabled"):
+        api_keys = await credential_store.get_api_keys(user["id"])
+    return build_user_context(user, api_keys)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a JSONL prompt file through the swarm")
+    parser.add_argument("input", help="JSONL file with one {\"prompt\": ...} per line")
+    parser.add_argument("output", help="JSONL results, one per input line")
+    parser.add_argument("--mode", default=SwarmMode.FAST.value, choices=[m.value for m in SwarmMode])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--provider-limit",
+        action="append",
+        default=[],
+        metavar="PROVIDER=N",
+        help="Max simultaneous calls to a provider, e.g. deepseek=16 (repeatable)",
+    )
+    parser.add_argument("--telegram-id", type=int, default=None, help="Run with this user's bio and API keys")
+    parser.add_argument("--plan", default="enterprise", help="Plan of the anonymous batch user")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=getattr(logging, settings.log_level),
+    )
+
+    provider_limits = {}
+    for limit in args.provider_limit:
+        provider, _, value = limit.partition("=")
+        provider_limits[provider] = int(value)
+
+    async def run():
+        await pricing.refresh()
+        runner = BatchRunner(
+            args.input,
+            args.output,
+            await load_user_context(args.telegram_id, args.plan),
+            mode=SwarmMode(args.mode),
+            concurrency=args.concurrency,
+            provider_limits=provider_limits or None,
+        )
+        report = await runner.run(restart=args.restart)
+        print(json.dumps({**asdict(report), "lines_per_s": round(report.throughput, 2)}))
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Cluster modules
@@ -0,0 +1,358 @@
+"""
+Agent Pilot Bot - Cluster Ingress
+=================================
+Receives Telegram updates (long polling, or a webhook) and routes each
+one to the worker that owns its user on a consistent hash ring, so every
+user's conversation state and caches live in a single process.
+
+Workers connect over TCP (see cluster/protocol.py) and can join or leave
+at any time. When a worker joins, the users that move to it have their
+state exported from their previous owner and imported into the new one;
+updates for them are held back until the handoff finishes, so they are
+handled in order. When a worker leaves, its users are rehashed onto the
+remaining workers and start with fresh conversation state.
+
+    python -m cluster.ingress --spawn 4             # ingress + 4 local workers
+    python -m cluster.ingress                       # workers started separately
+    python -m cluster.worker --ingress host:port    # (on other nodes)
+"""
+
+import argparse
+import asyncio
+import hmac
+import itertools
+import logging
+import multiprocessing
+import signal
+from collections import OrderedDict, deque
+from datetime import timedelta
+from typing import Deque, Dict, List, Optional, Tuple
+
+from telegram import Bot, Update
+from telegram.error import NetworkError, RetryAfter
+
+from config import settings
+from .protocol import STREAM_LIMIT, receive, routing_key, send
+from .ring import HashRing
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerConnection:
+    """An ingress-side worker connection with an ordered send queue."""
+
+    def __init__(self, name: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.name = name
+        self.reader = reader
+        self.writer = writer
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.sender: Optional[asyncio.Task] = None
+
+    async def run_sender(self) -> None:
+        while True:
+            message = await self.queue.get()
+            await send(self.writer, message)
+
+    def close(self) -> None:
+        if self.sender:
+            self.sender.cancel()
+        self.writer.close()
+
+
+class Ingress:
+    """Routes updates to workers by consistent hashing on the user id."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8470,
+        secret: Optional[str] = None,
+        vnodes: int = 128,
+        handoff_timeout: float = 5.0,
+        max_tracked_users: int = 100000
+    ):
+        if not secret:
+            raise ValueError("CLUSTER_SECRET is required: workers authenticate with it")
+        self.host = host
+        self.port = port
+        self.secret = secret
+        self.handoff_timeout = handoff_timeout
+        self.max_tracked_users = max_tracked_users
+        self.ring = HashRing(vnodes=vnodes)
+        self.workers: Dict[str, WorkerConnection] = {}
+        # Recently routed users and the worker holding their state
+        self._owners: "OrderedDict[int, str]" = OrderedDict()
+        # Users in a handoff: their held-back updates
+        self._held: Dict[int, Deque[dict]] = {}
+        # Export request id -> (worker asked, future of its reply)
+        self._pending_state: Dict[int, Tuple[str, asyncio.Future]] = {}
+        self._request_ids = itertools.count()
+        self._ready = asyncio.Event()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    # ---- Workers ----
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._handle_worker, self.host, self.port, limit=STREAM_LIMIT
+        )
+        logger.info(f"Ingress listening for workers on {self.host}:{self.port}")
+
+    async def _handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        hello = await receive(reader)
+        if (
+            not hello or hello.get("type") != "hello" or not hello.get("worker")
+            or not hmac.compare_digest(str(hello.get("secret") or ""), self.secret)
+        ):
+            logger.warning("Rejected a worker connection with a bad hello")
+            writer.close()
+            return
+
+        name = hello["worker"]
+        if name in self.workers:
+            logger.warning(f"Worker {name} reconnected; dropping the old connection")
+            self._remove_worker(name)
+
+        worker = WorkerConnection(name, reader, writer)
+        worker.sender = asyncio.create_task(worker.run_sender())
+        self.workers[name] = worker
+        await self._join(name)
+
+        try:
+            while True:
+                message = await receive(reader)
+                if message is None:
+                    break
+                if message.get("type") == "state":
+                    _, future = self._pending_state.pop(message.get("id"), (None, None))
+                    if future and not future.done():
+                        future.set_result(message.get("users") or {})
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Worker {name} connection error: {e}")
+        finally:
+            if self.workers.get(name) is worker:
+                self._remove_worker(name)
+
+    async def _join(self, name: str) -> None:
+        """Add a worker to the ring and hand off the users that move to it."""
+        self.ring.add(name)
+        self._broadcast_members()
+        self._ready.set()
+        logger.info(f"Worker {name} joined ({len(self.ring)} workers)")
+
+        moved: Dict[str, List[int]] = {}
+        for user_id, owner in self._owners.items():
+            if owner != name and self.ring.node_for(user_id) == name:
+                moved.setdefault(owner, []).append(user_id)
+                # Hold their updates from now on, before any await
+                self._held.setdefault(user_id, deque())
+        if moved:
+            await asyncio.gather(*(
+                self._handoff(old, name, users) for old, users in moved.items()
+            ))
+
+    async def _handoff(self, old: str, new: str, users: List[int]) -> None:
+        state = {}
+        source = self.workers.get(old)
+        if source is not None:
+            request_id = next(self._request_ids)
+            future = asyncio.get_running_loop().create_future()
+            self._pending_state[request_id] = (old, future)
+            source.queue.put_nowait({"type": "export", "id": request_id, "users": users})
+            try:
+                state = await asyncio.wait_for(future, self.handoff_timeout)
+            except asyncio.TimeoutError:
+                self._pending_state.pop(request_id, None)
+                logger.warning(f"Worker {old} didn't hand off {len(users)} users in time")
+
+        target = self.workers.get(new)
+        if target is not None and state:
+            target.queue.put_nowait({"type": "import", "users": state})
+        logger.info(f"Moved {len(users)} users from {old} to {new} ({len(state)} with state)")
+
+        # Release held updates in arrival order
+        for user_id in users:
+            self._owners[user_id] = new
+            for update in self._held.pop(user_id, ()):
+                self._deliver(user_id, update)
+
+    def _remove_worker(self, name: str) -> None:
+        worker = self.workers.pop(name, None)
+        if worker:
+            worker.close()
+        self.ring.remove(name)
+        # Handoffs from this worker go ahead without its state
+        for request_id, (asked, future) in list(self._pending_state.items()):
+            if asked == name:
+                del self._pending_state[request_id]
+                if not future.done():
+                    future.set_result({})
+        if not self.workers:
+            self._ready.clear()
+        self._broadcast_members()
+        logger.info(f"Worker {name} left ({len(self.ring)} workers)")
+
+    def _broadcast_members(self) -> None:
+        for worker in self.workers.values():
+            worker.queue.put_nowait({"type": "members", "count": len(self.workers)})
+
+    # ---- Routing ----
+
+    def route(self, update: dict) -> None:
+        """Send a raw update to the worker that owns its user."""
+        user_id = routing_key(update)
+        held = self._held.get(user_id)
+        if held is not None:
+            held.append(update)
+            return
+        self._deliver(user_id, update)
+
+    def _deliver(self, user_id: int, update: dict) -> None:
+        name = self.ring.node_for(user_id)
+        worker = self.workers.get(name) if name else None
+        if worker is None:
+            logger.error(f"No worker for update {update.get('update_id')}; dropped")
+            return
+        worker.queue.put_nowait({"type": "update", "update": update})
+
+        self._owners[user_id] = name
+        self._owners.move_to_end(user_id)
+        if len(self._owners) > self.max_tracked_users:
+            self._owners.popitem(last=False)
+
+    # ---- Update sources ----
+
+    async def poll(self, bot: Bot, timeout: int = 30) -> None:
+        """Long-poll getUpdates and route every update."""
+        offset = None
+        while True:
+            # Don't confirm updates to Telegram while nobody can take them
+            await self._ready.wait()
+            try:
+                updates = await bot.get_updates(
+                    offset=offset,
+                    timeout=timeout,
+                    allowed_updates=Update.ALL_TYPES,
+                    read_timeout=timeout + 10,
+                )
+            except RetryAfter as e:
+                delay = e.retry_after
+                if isinstance(delay, timedelta):
+                    delay = delay.total_seconds()
+                await asyncio.sleep(delay)
+                continue
+            except NetworkError as e:
+                logger.warning(f"getUpdates failed: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            for update in updates:
+                self.route(update.to_dict())
+                offset = update.update_id + 1
+
+    async def serve_webhook(self, bot: Bot, url: str, listen: str, port: int, secret_token: str) -> None:
+        """Receive updates on a webhook and route them."""
+        from aiohttp import web
+
+        if not secret_token:
+            raise ValueError("A webhook secret is required: without it anyone can post updates")
+
+        async def handle(request: web.Request) -> web.Response:
+            if not hmac.compare_digest(
+                request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), secret_token
+            ):
+                return web.Response(status=403)
+            if not self.workers:
+                # Telegram retries later
+                return web.Response(status=503)
+            self.route(await request.json())
+            return web.Response()
+
+        app = web.Application()
+        app.router.add_post("/telegram", handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, listen, port).start()
+        await bot.set_webhook(url, secret_token=secret_token, allowed_updates=Update.ALL_TYPES)
+        logger.info(f"Webhook {url} served on {listen}:{port}")
+        await asyncio.Event().wait()
+
+    def close(self) -> None:
+        for name in list(self.workers):
+            self._remove_worker(name)
+        if self._server:
+            self._server.close()
+
+
+def _process_main(name: str, address: str) -> None:
+    from cluster.worker import run_worker
+    asyncio.run(run_worker(name, address))
+
+
+async def run_ingress(args) -> None:
+    ingress = Ingress(
+        host=args.host,
+        port=args.port,
+        secret=settings.cluster_secret,
+        handoff_timeout=settings.cluster_handoff_timeout,
+    )
+    await ingress.start()
+
+    bot = Bot(settings.telegram_bot_token)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    async with bot:
+        if args.webhook_url:
+            source = asyncio.create_task(ingress.serve_webhook(
+                bot, args.webhook_url, args.webhook_listen, args.webhook_port,
+                settings.cluster_webhook_secret or settings.cluster_secret,
+            ))
+        else:
+            await bot.delete_webhook()
+            source = asyncio.create_task(ingress.poll(bot))
+        await stop.wait()
+        source.cancel()
+
+    ingress.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Route Telegram updates to bot workers by user")
+    parser.add_argument("--host", default=settings.cluster_ingress_host)
+    parser.add_argument("--port", type=int, default=settings.cluster_ingress_port)
+    parser.add_argument("--spawn", type=int, default=0, help="Local worker processes to start")
+    parser.add_argument("--webhook-url", default=None, help="Public URL; polls if omitted")
+    parser.add_argument("--webhook-listen", default="0.0.0.0")
+    parser.add_argument("--webhook-port", type=int, default=8443)
+    args = parser.parse_args()
+    if not settings.cluster_secret:
+        parser.error("set CLUSTER_SECRET: the ingress accepts only workers that know it")
+
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=getattr(logging, settings.log_level),
+    )
+
+    # Local workers start before the event loop and connect (with retries)
+    # once the ingress listens
+    processes = [
+        multiprocessing.Process(target=_process_main, args=(f"local-{i}", f"{args.host}:{args.port}"))
+        for i in range(args.spawn)
+    ]
+    for process in processes:
+        process.start()
+
+    asyncio.run(run_ingress(args))
+
+    # Each worker drains its own in-flight requests on SIGTERM
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
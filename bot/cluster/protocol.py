@@ -0,0 +1,57 @@
+"""
+Agent Pilot Bot - Cluster Protocol
+==================================
+Ingress <-> worker messages: one JSON object per line over TCP.
+
+    worker  -> ingress  {"type": "hello", "worker": name, "secret": ...}
+    ingress -> worker   {"type": "members", "count": n}
+    ingress -> worker   {"type": "update", "update": {...}}
+    ingress -> worker   {"type": "export", "users": [user ids]}
+    worker  -> ingress  {"type": "state", "users": {user id: {...}}}
+    ingress -> worker   {"type": "import", "users": {user id: {...}}}
+
+export/state/import move the conversation state of users whose owner
+changes when a worker joins.
+"""
+
+import asyncio
+import json
+from typing import Optional
+
+# Largest protocol line (a state handoff can carry many users)
+STREAM_LIMIT = 16 * 1024 * 1024
+
+# Update payload keys that carry the acting user under another name
+_USER_FIELDS = ("from", "user", "voter_chat")
+
+
+async def send(writer: asyncio.StreamWriter, message: dict) -> None:
+    writer.write(json.dumps(message, separators=(",", ":"), default=str).encode() + b"\n")
+    await writer.drain()
+
+
+async def receive(reader: asyncio.StreamReader) -> Optional[dict]:
+    """Next message, or None when the connection is closed."""
+    line = await reader.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def routing_key(update: dict) -> int:
+    """
+    Telegram user id an update belongs to, read from the raw JSON without
+    building an Update. Falls back to the chat id, then the update id, for
+    updates without a user (e.g. channel posts).
+    """
+    for key, payload in update.items():
+        if key == "update_id" or not isinstance(payload, dict):
+            continue
+        for field in _USER_FIELDS:
+            user = payload.get(field)
+            if isinstance(user, dict) and "id" in user:
+                return user["id"]
+        chat = payload.get("chat") or (payload.get("message") or {}).get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return chat["id"]
+    return update.get("update_id", 0)
@@ -0,0 +1,167 @@
+"""
+Agent Pilot Bot - Cluster Worker
+================================
+A full bot process (same handlers as main.py) without its own updater:
+it connects to the ingress, receives the updates of the users it owns
+and puts them on application.update_queue. Caches and
+context.user_data / chat_data of those users live here (persisted to
+state.<name>.sqlite3).
+
+Telegram's global flood limit is shared, so each worker sends at most
+TELEGRAM_GLOBAL_RATE / <number of workers> messages per second.
+
+    python -m cluster.worker --ingress 127.0.0.1:8470 [--name node-a]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+from typing import Dict, List, Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+from config import settings
+from core.messaging.outbound import outbound
+from .protocol import STREAM_LIMIT, receive, send
+
+logger = logging.getLogger(__name__)
+
+
+class ClusterWorker:
+    """Connection from a bot application to the ingress."""
+
+    def __init__(self, name: str, application: Application):
+        self.name = name
+        self.application = application
+
+    async def serve(self, host: str, port: int) -> None:
+        """Stay connected to the ingress, reconnecting with backoff."""
+        delay = 1.0
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(host, port, limit=STREAM_LIMIT)
+            except OSError as e:
+                logger.warning(f"Ingress {host}:{port} unreachable ({e}); retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+                continue
+
+            delay = 1.0
+            logger.info(f"Worker {self.name} connected to ingress {host}:{port}")
+            try:
+                await send(writer, {"type": "hello", "worker": self.name, "secret": settings.cluster_secret})
+                await self._read(reader, writer)
+            except (ConnectionError, ValueError) as e:
+                logger.warning(f"Ingress connection lost: {e}")
+            finally:
+                writer.close()
+            await asyncio.sleep(delay)
+
+    async def _read(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        while True:
+            message = await receive(reader)
+            if message is None:
+                return
+            kind = message.get("type")
+            if kind == "update":
+                update = Update.de_json(message["update"], self.application.bot)
+                await self.application.update_queue.put(update)
+            elif kind == "members":
+                self._share_global_rate(message["count"])
+            elif kind == "export":
+                await send(writer, {
+                    "type": "state",
+                    "id": message.get("id"),
+                    "users": self.export_users(message["users"]),
+                })
+            elif kind == "import":
+                self.import_users(message["users"])
+
+    def _share_global_rate(self, workers: int) -> None:
+        rate = settings.telegram_global_rate / max(workers, 1)
+        outbound.global_bucket.rate = rate
+        outbound.global_bucket.capacity = max(rate, 1.0)
+
+    def export_users(self, user_ids: List[int]) -> Dict[str, dict]:
+        """Conversation state of users moving to another worker (removed here)."""
+        state = {}
+        for user_id in user_ids:
+            # Private chats share the user's id
+            user_data = self.application.user_data.get(user_id)
+            chat_data = self.application.chat_data.get(user_id)
+            if user_data or chat_data:
+                state[str(user_id)] = {
+                    "user_data": dict(user_data or {}),
+                    "chat_data": dict(chat_data or {}),
+                }
+            self.application.drop_user_data(user_id)
+            self.application.drop_chat_data(user_id)
+        return state
+
+    def import_users(self, state: Dict[str, dict]) -> None:
+        for user_id, data in state.items():
+            user_id = int(user_id)
+            self.application.user_data[user_id].update(data.get("user_data") or {})
+            if data.get("chat_data"):
+                self.application.chat_data[user_id].update(data["chat_data"])
+
+
+def _state_path(name: str) -> Optional[str]:
+    """Per-worker state file (state.sqlite3 -> state.<name>.sqlite3)."""
+    if not settings.persistence_path:
+        return None
+    root, ext = os.path.splitext(settings.persistence_path)
+    return f"{root}.{name}{ext}"
+
+
+async def run_worker(name: str, address: str) -> None:
+    """Run one cluster worker until SIGINT/SIGTERM."""
+    # Imported here: main configures logging and builds every handler
+    from main import build_application, start_services, stop_services
+
+    host, port = address.rsplit(":", 1)
+    application = build_application(updater=False, state_path=_state_path(name))
+
+    async with application:
+        await start_services(application)
+        await application.start()
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        worker = ClusterWorker(name, application)
+        connection = asyncio.create_task(worker.serve(host, int(port)))
+        await stop.wait()
+
+        # Leaving the ring first: the ingress reroutes new updates right away
+        connection.cancel()
+        await stop_services()
+        await application.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Agent Pilot cluster worker")
+    parser.add_argument(
+        "--ingress",
+        default=f"{settings.cluster_ingress_host}:{settings.cluster_ingress_port}",
+        help="host:port of the ingress",
+    )
+    parser.add_argument(
+        "--name",
+        default=f"{socket.gethostname()}-{os.getpid()}",
+        help="Unique worker name (keep it stable across restarts to keep the same users)",
+    )
+    args = parser.parse_args()
+    if not settings.cluster_secret:
+        parser.error("set CLUSTER_SECRET to the ingress's secret")
+    asyncio.run(run_worker(args.name, args.ingress))
+
+
+if __name__ == "__main__":
+    main()
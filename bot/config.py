@@ -25,16 +25,67 @@ class Settings(BaseSettings):
     supabase_service_key: Optional[str] = Field(None, env="SUPABASE_SERVICE_KEY")
 
     # ---- AI Providers ----
+    # Several keys per provider can be given comma-separated (key pool)
     deepseek_api_key: Optional[str] = Field(None, env="DEEPSEEK_API_KEY")
     perplexity_api_key: Optional[str] = Field(None, env="PERPLEXITY_API_KEY")
     openai_api_key: Optional[str] = Field(None, env="OPENAI_API_KEY")
     anthropic_api_key: Optional[str] = Field(None, env="ANTHROPIC_API_KEY")
+    provider_key_concurrency: int = Field(8, env="PROVIDER_KEY_CONCURRENCY")
+
+    # ---- AI Swarm ----
+    swarm_agreement_threshold: float = Field(0.8, env="SWARM_AGREEMENT_THRESHOLD")
+    swarm_retain_raw: bool = Field(False, env="SWARM_RETAIN_RAW")
+    swarm_hedging_enabled: bool = Field(False, env="SWARM_HEDGING_ENABLED")
+    swarm_hedge_percentile: float = Field(0.9, env="SWARM_HEDGE_PERCENTILE")
+    swarm_hedge_budget: float = Field(0.05, env="SWARM_HEDGE_BUDGET")
+    swarm_hedge_fallback: Optional[str] = Field(None, env="SWARM_HEDGE_FALLBACK")
+    response_cache_enabled: bool = Field(False, env="RESPONSE_CACHE_ENABLED")
+    response_cache_ttl: int = Field(3600, env="RESPONSE_CACHE_TTL")
+    response_cache_max_entries: int = Field(10000, env="RESPONSE_CACHE_MAX_ENTRIES")
+
+    # ---- BYOA Credentials ----
+    credentials_encryption_key: Optional[str] = Field(None, env="CREDENTIALS_ENCRYPTION_KEY")
+    byoa_cache_ttl: int = Field(60, env="BYOA_CACHE_TTL")
+    byoa_watch_interval: int = Field(10, env="BYOA_WATCH_INTERVAL")
+
+    # ---- Anomaly Detection / Prompt Filter ----
+    anomaly_error_threshold: int = Field(10, env="ANOMALY_ERROR_THRESHOLD")
+    anomaly_injection_threshold: int = Field(3, env="ANOMALY_INJECTION_THRESHOLD")
+    anomaly_burst_limit: int = Field(20, env="ANOMALY_BURST_LIMIT")
+    anomaly_burst_window: int = Field(60, env="ANOMALY_BURST_WINDOW")
+    anomaly_pause_seconds: int = Field(900, env="ANOMALY_PAUSE_SECONDS")
+    prompt_filter_enabled: bool = Field(True, env="PROMPT_FILTER_ENABLED")
+    prompt_rules_path: Optional[str] = Field(None, env="PROMPT_RULES_PATH")
 
     # ---- Stripe ----
     stripe_secret_key: Optional[str] = Field(None, env="STRIPE_SECRET_KEY")
     stripe_webhook_secret: Optional[str] = Field(None, env="STRIPE_WEBHOOK_SECRET")
 
+    # ---- Outbound Messages ----
+    telegram_global_rate: float = Field(30.0, env="TELEGRAM_GLOBAL_RATE")
+    telegram_chat_rate: float = Field(1.0, env="TELEGRAM_CHAT_RATE")
+
+    # ---- Job Queue ----
+    job_queue_enabled: bool = Field(False, env="JOB_QUEUE_ENABLED")
+    job_queue_path: str = Field("jobs.sqlite3", env="JOB_QUEUE_PATH")
+    job_queue_visibility_timeout: int = Field(300, env="JOB_QUEUE_VISIBILITY_TIMEOUT")
+    job_queue_max_attempts: int = Field(3, env="JOB_QUEUE_MAX_ATTEMPTS")
+    job_workers: int = Field(4, env="JOB_WORKERS")
+
+    # ---- Conversation State ----
+    persistence_path: Optional[str] = Field("state.sqlite3", env="PERSISTENCE_PATH")
+    persistence_flush_interval: float = Field(10.0, env="PERSISTENCE_FLUSH_INTERVAL")
+
+    # ---- Cluster ----
+    cluster_ingress_host: str = Field("127.0.0.1", env="CLUSTER_INGRESS_HOST")
+    cluster_ingress_port: int = Field(8470, env="CLUSTER_INGRESS_PORT")
+    cluster_secret: Optional[str] = Field(None, env="CLUSTER_SECRET")
+    cluster_webhook_secret: Optional[str] = Field(None, env="CLUSTER_WEBHOOK_SECRET")
+    cluster_handoff_timeout: float = Field(5.0, env="CLUSTER_HANDOFF_TIMEOUT")
+
     # ---- App Config ----
+    shutdown_drain_timeout: int = Field(25, env="SHUTDOWN_DRAIN_TIMEOUT")
+    pricing_refresh_interval: int = Field(300, env="PRICING_REFRESH_INTERVAL")
     log_level: str = Field("INFO", env="LOG_LEVEL")
     environment: str = Field("development", env="ENVIRONMENT")
 
@@ -47,16 +98,20 @@ class Settings(BaseSettings):
 settings = Settings()
 
 
-# Credit costs per operation
+# Credit costs per operation (fallback; costes_operaciones takes precedence)
 CREDIT_COSTS = {
     "fast": 1,           # Single AI, quick response
     "consensus": 5,      # Multiple AIs, consensus
     "deep_analysis": 10, # Full analysis with all providers
+    "creative": 8,       # Creative content without a format: a reel
+    "creative:reel": 8,  # Reel script
+    "creative:thread": 15, # Twitter thread
+    "creative:caption": 4, # Instagram caption
     "social_post": 2,    # Generate social media post
     "image_gen": 5,      # Generate image
 }
 
-# Plan limits
+# Plan limits (fallback; planes_precios takes precedence)
 PLAN_LIMITS = {
     "free": {
         "credits_monthly": 50,
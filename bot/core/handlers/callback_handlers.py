@@ -9,6 +9,7 @@ from telegram import Update
 from telegram.ext import ContextTypes
 
 from database.supabase_client import db
+from payments.pricing import pricing
 
 
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -25,6 +26,8 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         "vincular": handle_vincular,
         "modo_fast": handle_modo_fast,
         "modo_consenso": handle_modo_consenso,
+        "modo_profundo": handle_modo_profundo,
+        "modo_auto": handle_modo_auto,
         "crear_post": handle_crear_post,
         "historial": handle_historial,
         "ajustes": handle_ajustes,
@@ -112,7 +115,7 @@ async def handle_modo_fast(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     await query.edit_message_text(
         "*Modo FAST seleccionado*\n\n"
         "Ahora envíame el texto o tema a analizar.\n"
-        "Coste: 1 credito",
+        f"Coste: {pricing.cost('fast')} creditos",
         parse_mode="Markdown"
     )
 
@@ -122,10 +125,10 @@ async def handle_modo_consenso(update: Update, context: ContextTypes.DEFAULT_TYP
     telegram_id = update.effective_user.id
     user = await db.get_user_by_telegram_id(telegram_id)
 
-    if user and user["plan_actual"] == "free":
+    if user and not pricing.plan(user["plan_actual"]).get("consensus_enabled"):
         query = update.callback_query
         await query.edit_message_text(
-            "❌ El modo Consenso no está disponible en el plan Free.\n\n"
+            "❌ El modo Consenso no está disponible en tu plan.\n\n"
             "Mejora tu plan en agentpilot.es/checkout"
         )
         return
@@ -137,7 +140,47 @@ async def handle_modo_consenso(update: Update, context: ContextTypes.DEFAULT_TYP
         "*Modo Consenso seleccionado*\n\n"
         "Multiples IAs analizaran tu consulta.\n"
         "Ahora enviame el texto o tema.\n"
-        "Coste: 5 creditos",
+        f"Coste: {pricing.cost('consensus')} creditos",
+        parse_mode="Markdown"
+    )
+
+
+async def handle_modo_auto(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle Auto (cascade) mode selection."""
+    context.user_data["analysis_mode"] = "cascade"
+    context.user_data["awaiting_analysis"] = True
+    query = update.callback_query
+    await query.edit_message_text(
+        "*Modo Auto seleccionado*\n\n"
+        "Responde una IA rapida y, solo si hace falta, el Consejo completo.\n"
+        "Ahora enviame el texto o tema.\n"
+        f"Coste: {pricing.cost('fast')} creditos, "
+        f"o {pricing.cost('consensus')} si se consulta al Consejo",
+        parse_mode="Markdown"
+    )
+
+
+async def handle_modo_profundo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle deep analysis mode selection."""
+    telegram_id = update.effective_user.id
+    user = await db.get_user_by_telegram_id(telegram_id)
+
+    if user and not pricing.plan(user["plan_actual"]).get("consensus_enabled"):
+        query = update.callback_query
+        await query.edit_message_text(
+            "❌ El análisis profundo no está disponible en tu plan.\n\n"
+            "Mejora tu plan en agentpilot.es/checkout"
+        )
+        return
+
+    context.user_data["analysis_mode"] = "deep_analysis"
+    context.user_data["awaiting_analysis"] = True
+    query = update.callback_query
+    await query.edit_message_text(
+        "*Modo Profundo seleccionado*\n\n"
+        "Todas las IAs disponibles analizaran tu consulta en paralelo.\n"
+        "Ahora enviame el texto o tema.\n"
+        f"Coste: {pricing.cost('deep_analysis')} creditos",
         parse_mode="Markdown"
     )
 
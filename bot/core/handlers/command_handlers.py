@@ -1,7 +1,7 @@
 """
 Agent Pilot Bot - Command Handlers
 ==================================
-Handlers for bot commands: /start, /menu, /saldo, /analizar, /perfil
+Handlers for bot commands: /start, /menu, /saldo, /analizar, /perfil, /cancelar
 Replace this placeholder with your complete handlers.
 """
 
@@ -9,7 +9,10 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from database.supabase_client import db
+from payments.pricing import pricing
 from config import settings
+from core.lifecycle import in_flight
+from core.handlers.message_handlers import get_job_queue
 
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -108,9 +111,9 @@ async def saldo_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         f"Créditos disponibles: *{credits}*\n"
         f"Plan actual: *{plan.title()}*\n\n"
         f"📊 Costes por operación:\n"
-        f"• Modo FAST: 1 crédito\n"
-        f"• Consenso: 5 créditos\n"
-        f"• Análisis profundo: 10 créditos\n\n"
+        f"• Modo FAST: {pricing.cost('fast')} créditos\n"
+        f"• Consenso: {pricing.cost('consensus')} créditos\n"
+        f"• Análisis profundo: {pricing.cost('deep_analysis')} créditos\n\n"
         f"¿Necesitas más? 👉 agentpilot.es/creditos"
     )
 
@@ -128,7 +131,8 @@ async def analizar_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         )
         return
 
-    if user["creditos_disponibles"] < 1:
+    fast, consensus = pricing.cost("fast"), pricing.cost("consensus")
+    if user["creditos_disponibles"] < fast:
         await update.message.reply_text(
             "❌ No tienes créditos suficientes.\n"
             "Compra más en agentpilot.es/creditos"
@@ -140,8 +144,12 @@ async def analizar_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 
     keyboard = [
         [
-            InlineKeyboardButton("⚡ FAST (1 cr)", callback_data="modo_fast"),
-            InlineKeyboardButton("🧠 Consenso (5 cr)", callback_data="modo_consenso"),
+            InlineKeyboardButton(f"⚡ FAST ({fast} cr)", callback_data="modo_fast"),
+            InlineKeyboardButton(f"🧠 Consenso ({consensus} cr)", callback_data="modo_consenso"),
+        ],
+        [
+            InlineKeyboardButton(f"🎯 Auto ({fast}-{consensus} cr)", callback_data="modo_auto"),
+            InlineKeyboardButton(f"🔬 Profundo ({pricing.cost('deep_analysis')} cr)", callback_data="modo_profundo"),
         ],
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -187,3 +195,27 @@ async def perfil_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
 
     await update.message.reply_text(text, parse_mode="Markdown")
+
+
+async def cancelar_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /cancelar command - Cancel the running analysis and queued ones."""
+    telegram_id = update.effective_user.id
+    awaiting = context.user_data.get("awaiting_analysis")
+    context.user_data["awaiting_analysis"] = False
+    context.user_data["analysis_mode"] = None
+
+    # The cancelled request replies on its own
+    running = in_flight.cancel_user(telegram_id)
+    queued = 0
+    if settings.job_queue_enabled:
+        queued = await get_job_queue().cancel_for_user(telegram_id)
+
+    if queued:
+        await update.message.reply_text(
+            f"❌ Cancelada(s) {queued} consulta(s) pendiente(s).\n"
+            f"No se han descontado créditos."
+        )
+    elif not running:
+        await update.message.reply_text(
+            "❌ Análisis cancelado." if awaiting else "No tienes ninguna consulta en curso."
+        )
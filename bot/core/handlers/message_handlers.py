@@ -4,12 +4,45 @@ Agent Pilot Bot - Message Handlers
 Handlers for text messages (non-commands).
 """
 
+import asyncio
+import logging
+from typing import Optional
+
 from telegram import Update
 from telegram.ext import ContextTypes
 
 from database.supabase_client import db
-from ai_swarm.orchestrator import CouncilOfWiseMen, SwarmMode, UserContext
-from config import settings, CREDIT_COSTS
+from database.credentials import credential_store
+from payments.pricing import pricing
+from ai_swarm.orchestrator import CouncilOfWiseMen, ProviderType, SwarmMode, SwarmResult, UserContext
+from ai_swarm.hedging import HedgePolicy
+from ai_swarm.response_cache import ResponseCache
+from config import settings
+from jobs.queue import JobQueue
+from core.messaging.outbound import outbound
+from core.lifecycle import CANCEL_SUPERSEDED, RequestCancelled, in_flight
+from core.middleware.anomaly import anomaly_detector
+from core.middleware.prompt_filter import prompt_filter
+
+logger = logging.getLogger(__name__)
+
+# Analysis modes selectable from the bot, keyed by context.user_data["analysis_mode"]
+ANALYSIS_MODES = {
+    "fast": SwarmMode.FAST,
+    "consensus": SwarmMode.CONSENSUS,
+    "deep_analysis": SwarmMode.DEEP,
+    "cascade": SwarmMode.CASCADE,
+}
+
+MODE_NAMES = {
+    SwarmMode.FAST: "Fast",
+    SwarmMode.CONSENSUS: "Consenso",
+    SwarmMode.DEEP: "Profundo",
+    SwarmMode.CASCADE: "Auto",
+}
+
+# Modes that need a plan with consensus_enabled
+PLAN_GATED_MODES = (SwarmMode.CONSENSUS, SwarmMode.DEEP)
 
 # Create the Council with system credentials (singleton)
 _council = None
@@ -28,13 +61,58 @@ def get_council() -> CouncilOfWiseMen:
         if settings.anthropic_api_key:
             system_credentials["anthropic"] = settings.anthropic_api_key
 
+        response_cache = None
+        if settings.response_cache_enabled:
+            response_cache = ResponseCache(
+                ttl_seconds=settings.response_cache_ttl,
+                max_entries=settings.response_cache_max_entries
+            )
+
         _council = CouncilOfWiseMen(
             system_credentials=system_credentials,
-            cost_config=CREDIT_COSTS
+            # Live views over the pricing catalog: refreshes apply without rebuilding
+            cost_config=pricing.costs,
+            byoa_cost_config=pricing.byoa_costs,
+            cascade_plan_policy=pricing.cascade_policy,
+            agreement_threshold=settings.swarm_agreement_threshold,
+            response_cache=response_cache,
+            key_concurrency=settings.provider_key_concurrency,
+            usage_sink=db.increment_api_usage,
+            retain_raw=settings.swarm_retain_raw,
+            hedging=HedgePolicy(
+                percentile=settings.swarm_hedge_percentile,
+                budget=settings.swarm_hedge_budget
+            ) if settings.swarm_hedging_enabled else None,
+            hedge_fallback=(
+                ProviderType(settings.swarm_hedge_fallback) if settings.swarm_hedge_fallback else None
+            )
         )
     return _council
 
 
+_job_queue = None
+
+def get_job_queue() -> JobQueue:
+    """Get or create the job queue singleton."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(
+            settings.job_queue_path,
+            visibility_timeout=settings.job_queue_visibility_timeout,
+            max_attempts=settings.job_queue_max_attempts,
+        )
+    return _job_queue
+
+
+def analysis_cost(mode: SwarmMode, user: dict) -> int:
+    """Credits a request may cost, used to check the balance before running it."""
+    if mode == SwarmMode.CASCADE:
+        # Worst case: escalation to consensus, if the plan allows it
+        plan = pricing.plan(user.get("plan_actual", "free"))
+        return pricing.cost("consensus" if plan.get("consensus_enabled") else "fast")
+    return pricing.cost(mode.value)
+
+
 def build_user_context(user: dict, api_keys: dict = None) -> UserContext:
     """Build UserContext from database user record."""
     return UserContext(
@@ -78,9 +156,46 @@ async def handle_analysis_request(
     text: str
 ) -> None:
     """Process an analysis request."""
+    if not in_flight.accepting:
+        await update.message.reply_text(
+            "El bot se esta reiniciando. Reenvia tu mensaje en un minuto."
+        )
+        return
+
+    blocked = anomaly_detector.check_request(user)
+    if blocked:
+        context.user_data["awaiting_analysis"] = False
+        await update.message.reply_text(
+            f"Tu cuenta no puede hacer consultas ahora mismo: {blocked}.\n"
+            f"Si crees que es un error, contacta con soporte."
+        )
+        return
+
+    if settings.prompt_filter_enabled:
+        screening = prompt_filter.check(text)
+        if not screening.allowed:
+            anomaly_detector.record_rejected_prompt(user["id"])
+            context.user_data["awaiting_analysis"] = False
+            await update.message.reply_text(
+                "No puedo procesar este mensaje: parece un intento de alterar "
+                "las instrucciones del asistente. No se han descontado creditos."
+            )
+            return
+
     mode_str = context.user_data.get("analysis_mode", "fast")
-    mode = SwarmMode.CONSENSUS if mode_str == "consensus" else SwarmMode.FAST
-    cost = CREDIT_COSTS["consensus"] if mode == SwarmMode.CONSENSUS else CREDIT_COSTS["fast"]
+    mode = ANALYSIS_MODES.get(mode_str, SwarmMode.FAST)
+
+    # The mode may have been chosen before a plan downgrade
+    if mode in PLAN_GATED_MODES and not pricing.plan(user.get("plan_actual", "free")).get("consensus_enabled"):
+        context.user_data["awaiting_analysis"] = False
+        context.user_data["analysis_mode"] = None
+        await update.message.reply_text(
+            f"El modo {MODE_NAMES.get(mode, mode.value)} no está disponible en tu plan.\n\n"
+            f"Mejora tu plan en agentpilot.es/checkout"
+        )
+        return
+
+    cost = analysis_cost(mode, user)
 
     # Check credits
     if user["creditos_disponibles"] < cost:
@@ -91,50 +206,134 @@ async def handle_analysis_request(
         )
         return
 
-    # Send "typing" action
-    await update.message.chat.send_action("typing")
-
-    # Process with AI
-    try:
-        council = get_council()
-        user_context = build_user_context(user)
-
-        # Call the orchestrator
-        result = await council.process(
-            prompt=text,
-            user_context=user_context,
-            mode=mode
+    if settings.job_queue_enabled and mode != SwarmMode.FAST:
+        # Long-running modes go through the durable queue; a newer request
+        # supersedes the user's pending ones
+        queue = get_job_queue()
+        await queue.cancel_for_user(update.effective_user.id)
+        await queue.enqueue("analysis", {
+            "telegram_id": update.effective_user.id,
+            "chat_id": update.effective_chat.id,
+            "mode": mode.value,
+            "prompt": text,
+        })
+        await update.message.reply_text(
+            "Solicitud recibida. Te enviare el resultado en cuanto este listo."
         )
+    else:
+        # Send "typing" action
+        await update.message.chat.send_action("typing")
 
-        if not result.success:
-            raise Exception(result.error or "Error desconocido")
+        try:
+            response = await in_flight.run(
+                update.effective_chat.id,
+                run_analysis(user, text, mode, cost),
+                user_id=update.effective_user.id
+            )
+            await outbound.reply(update, response, parse_mode="Markdown")
 
-        # Deduct credits after successful processing
-        await db.deduct_credits(
-            user["id"],
-            cost,
-            f"Analisis {mode.value}: {text[:50]}..."
-        )
+        except RequestCancelled as e:
+            stats = get_council().cancel_stats
+            logger.info(
+                f"Analysis of user {user['id']} cancelled ({e.reason}); "
+                f"{stats['calls']} provider calls / ~{stats['tokens_saved']} tokens saved so far"
+            )
+            if e.reason == CANCEL_SUPERSEDED:
+                await update.message.reply_text(
+                    "Consulta anterior cancelada: la has sustituido por una nueva.\n"
+                    "No se han descontado creditos."
+                )
+            else:
+                await update.message.reply_text(
+                    "Consulta cancelada. No se han descontado creditos."
+                )
 
-        # Format response
-        mode_name = "Consenso" if mode == SwarmMode.CONSENSUS else "Fast"
-        response = f"*Analisis ({mode_name})*\n\n"
-        response += result.final_response
-        response += f"\n\n_Creditos restantes: {user['creditos_disponibles'] - cost}_"
+        except asyncio.CancelledError:
+            # Cancelled by a draining shutdown, not by the user
+            await update.message.reply_text(
+                "Tu solicitud se interrumpio por un reinicio del servicio.\n"
+                "No se han descontado creditos. Vuelve a enviarla en un minuto."
+            )
 
-        await update.message.reply_text(response, parse_mode="Markdown")
-
-    except Exception as e:
-        await update.message.reply_text(
-            f"Error al procesar: {str(e)}\n"
-            f"No se han descontado creditos."
-        )
+        except Exception as e:
+            await update.message.reply_text(
+                f"Error al procesar: {str(e)}\n"
+                f"No se han descontado creditos."
+            )
 
     # Clear state
     context.user_data["awaiting_analysis"] = False
     context.user_data["analysis_mode"] = None
 
 
+def caused_by_user(result: SwarmResult) -> bool:
+    """
+    Whether a failed request is the user's doing: input the swarm rejected
+    or one of their own API keys failing. Outages, timeouts and quota on
+    our keys are not, and must not pause anyone.
+    """
+    if result.metadata.get("user_error"):
+        return True
+    return any(
+        not response.success and response.metadata.get("is_user_owned")
+        for response in result.individual_responses.values()
+    )
+
+
+async def run_analysis(
+    user: dict,
+    text: str,
+    mode: SwarmMode,
+    cost: int,
+    charge_key: Optional[str] = None
+) -> str:
+    """
+    Run the swarm for a request, deduct credits and format the reply.
+
+    Raises if the swarm fails; credits are only deducted on success.
+    The charge is the swarm's own count: CASCADE requests pay for the mode
+    that actually ran and BYOA keys get their discount. A charge_key makes
+    the charge happen once even if the request is run again (queued jobs).
+    """
+    council = get_council()
+    api_keys = {}
+    if pricing.plan(user.get("plan_actual", "free")).get("byoa_enabled"):
+        api_keys = await credential_store.get_api_keys(user["id"])
+    user_context = build_user_context(user, api_keys)
+
+    # Call the orchestrator
+    result = await council.process(
+        prompt=text,
+        user_context=user_context,
+        mode=mode
+    )
+
+    if not result.success:
+        if caused_by_user(result):
+            anomaly_detector.record_error(user["id"])
+        raise Exception(result.error or "Error desconocido")
+    anomaly_detector.record_success(user["id"])
+
+    # Never charge more than the amount checked up front
+    cost = min(cost, result.credits_consumed)
+
+    # Deduct credits after successful processing (never cut short by a shutdown)
+    with in_flight.protected():
+        await db.deduct_credits(
+            user["id"],
+            cost,
+            f"Analisis {mode.value}: {text[:50]}...",
+            idempotency_key=charge_key
+        )
+
+    # Format response
+    mode_name = MODE_NAMES.get(mode, mode.value)
+    response = f"*Analisis ({mode_name})*\n\n"
+    response += result.final_response
+    response += f"\n\n_Creditos restantes: {user['creditos_disponibles'] - cost}_"
+    return response
+
+
 async def handle_quick_analysis(
     update: Update,
     context: ContextTypes.DEFAULT_TYPE,
@@ -0,0 +1,140 @@
+"""
+Agent Pilot Bot - Lifecycle
+===========================
+Tracks in-flight swarm requests so a shutdown can drain them:
+stop accepting new analysis requests, wait up to a deadline for running
+ones, then cancel what is left. Sections marked with `protected()`
+(e.g. the credit deduction after a successful swarm run) are never
+cancelled halfway.
+
+Requests can also be cancelled per user: by /cancelar, or when the user
+sends a newer request (it supersedes the running one). Cancelling the
+request task cancels its whole swarm task tree (experts, judge) and
+closes the provider connections.
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from typing import Awaitable, Dict, Optional, Set, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Why a request was cancelled on purpose
+CANCEL_USER = "user"
+CANCEL_SUPERSEDED = "superseded"
+
+
+class RequestCancelled(Exception):
+    """A request cancelled per user (not by a shutdown)."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class InFlightTracker:
+    """Registry of running request tasks."""
+
+    def __init__(self):
+        self.accepting = True
+        self._tasks: Dict[asyncio.Task, int] = {}
+        self._protected: Set[asyncio.Task] = set()
+        # Latest request of each user
+        self._by_user: Dict[int, asyncio.Task] = {}
+        self._cancel_reasons: Dict[asyncio.Task, str] = {}
+        # Requests cancelled per user, by reason
+        self.cancelled: Counter = Counter()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def run(self, chat_id: int, coro: Awaitable[T], user_id: Optional[int] = None) -> T:
+        """
+        Run `coro` as a tracked task and return its result.
+
+        With `user_id`, the user's previous request (if still running) is
+        cancelled as superseded.
+
+        Raises asyncio.CancelledError if the task was cancelled by drain(),
+        RequestCancelled if it was cancelled by cancel_user().
+        """
+        if user_id is not None:
+            self.cancel_user(user_id, CANCEL_SUPERSEDED)
+
+        task = asyncio.ensure_future(coro)
+        self._tasks[task] = chat_id
+        if user_id is not None:
+            self._by_user[user_id] = task
+        try:
+            return await task
+        except asyncio.CancelledError:
+            reason = self._cancel_reasons.get(task)
+            if reason is not None:
+                raise RequestCancelled(reason) from None
+            raise
+        finally:
+            self._tasks.pop(task, None)
+            self._cancel_reasons.pop(task, None)
+            if user_id is not None and self._by_user.get(user_id) is task:
+                del self._by_user[user_id]
+
+    def cancel_user(self, user_id: int, reason: str = CANCEL_USER) -> bool:
+        """
+        Cancel the user's running request.
+
+        Returns False if there is none, or it is already in a protected
+        section (e.g. being charged) and will finish anyway.
+        """
+        task = self._by_user.get(user_id)
+        if task is None or task.done() or task in self._protected:
+            return False
+        self._cancel_reasons[task] = reason
+        task.cancel()
+        self.cancelled[reason] += 1
+        logger.info(f"Cancelled the request of user {user_id} ({reason})")
+        return True
+
+    @contextmanager
+    def protected(self):
+        """Mark the current task as uncancellable for the duration of the block."""
+        task = asyncio.current_task()
+        self._protected.add(task)
+        try:
+            yield
+        finally:
+            self._protected.discard(task)
+
+    async def drain(self, timeout: float, grace: float = 5.0) -> int:
+        """
+        Stop accepting requests and wait for in-flight ones.
+
+        After `timeout` seconds, unprotected tasks are cancelled; protected
+        sections get `grace` more seconds to finish. Returns the number of
+        cancelled tasks.
+        """
+        self.accepting = False
+        if not self._tasks:
+            return 0
+
+        logger.info(f"Draining {len(self._tasks)} in-flight requests (up to {timeout}s)")
+        _, pending = await asyncio.wait(list(self._tasks), timeout=timeout)
+
+        cancelled = 0
+        for task in pending:
+            if task not in self._protected:
+                task.cancel()
+                cancelled += 1
+
+        if pending:
+            await asyncio.wait(pending, timeout=grace)
+            logger.warning(f"Cancelled {cancelled} requests still running at shutdown")
+        return cancelled
+
+
+# Global instance
+in_flight = InFlightTracker()
@@ -0,0 +1,315 @@
+"""
+Agent Pilot Bot - Outbound Message Scheduler
+============================================
+All long or bulk replies go through here instead of raw reply_text:
+
+- Splits texts over Telegram's 4096 character limit on Markdown-safe
+  boundaries (paragraph, line, sentence, word; never inside an entity).
+- Enforces a global token bucket (~30 msg/s) and one per chat (~1 msg/s).
+  Global permits are granted in priority order, so interactive replies
+  overtake bulk sends.
+- Retries RetryAfter (flood control) after the requested delay, and
+  falls back to plain text if Telegram can't parse the Markdown (the
+  fallback does not use up a retry).
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import re
+import time
+import weakref
+from collections import OrderedDict
+from datetime import timedelta
+from typing import List, Optional
+
+from telegram import Bot, Message, Update
+from telegram.error import BadRequest, RetryAfter
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MAX_LENGTH = 4096
+
+# Priorities (lower is sent first)
+INTERACTIVE = 0
+BULK = 10
+
+_LINK_RE = re.compile(r"\[[^\]\n]*\]\([^)\n]*\)")
+
+
+# ---- Splitting ----
+
+def _entity_states(text: str) -> List[Optional[str]]:
+    """
+    Track legacy Markdown entities across `text` in one pass.
+
+    states[i] is the entity open just before position i ("```", "`", "*"
+    or "_"), or None if a cut at i would not break any entity.
+    """
+    states: List[Optional[str]] = [None] * (len(text) + 1)
+    open_entity: Optional[str] = None
+    i = 0
+    while i < len(text):
+        states[i] = open_entity
+        step = 1
+        if text.startswith("```", i) and open_entity in (None, "```"):
+            open_entity = None if open_entity else "```"
+            step = 3
+        elif open_entity in ("```", "`"):
+            # Nothing is parsed inside code
+            if text[i] == "`" and open_entity == "`":
+                open_entity = None
+        elif text[i] == "\\":
+            step = 2
+        elif text[i] in "*_`":
+            if open_entity == text[i]:
+                open_entity = None
+            elif open_entity is None:
+                open_entity = text[i]
+        elif text[i] == "[" and open_entity is None:
+            link = _LINK_RE.match(text, i)
+            if link:
+                step = link.end() - i
+        # Never cut inside a multi-character token (fence, escape, link)
+        for j in range(i + 1, min(i + step, len(text))):
+            states[j] = text[i]
+        i += step
+    states[len(text)] = open_entity
+    return states
+
+
+def split_message(text: str, limit: int = TELEGRAM_MAX_LENGTH) -> List[str]:
+    """
+    Split `text` into parts of at most `limit` characters.
+
+    Prefers paragraph, then line, sentence and word boundaries, and only
+    cuts where no Markdown entity is open. A code block that has to be
+    cut is closed and reopened so both parts stay valid. If the text is
+    not valid Markdown to begin with, entities are ignored (it will be
+    sent as plain text anyway).
+    """
+    parts: List[str] = []
+    remaining = text
+    check_entities = _entity_states(text)[-1] is None
+
+    while len(remaining) > limit:
+        window = remaining[:limit]
+        # States of the whole rest: a link crossing the window edge only
+        # parses as a link in full
+        states = _entity_states(remaining) if check_entities else None
+        cut = None
+        for separator in ("\n\n", "\n", ". ", " "):
+            position = window.rfind(separator)
+            while position > 0:
+                candidate = position + len(separator)
+                if states is None or states[candidate] is None:
+                    cut = candidate
+                    break
+                position = window.rfind(separator, 0, position)
+            if cut:
+                break
+
+        if cut is None:
+            # Only possible cut is inside a code block: close and reopen it
+            newline = window.rfind("\n", 0, limit - 4)
+            if states is not None and newline > 0 and states[newline + 1] == "```":
+                parts.append(remaining[:newline] + "\n```")
+                remaining = "```\n" + remaining[newline + 1:]
+                continue
+            cut = limit
+
+        parts.append(remaining[:cut].rstrip())
+        remaining = remaining[cut:].lstrip("\n")
+
+    if remaining.strip():
+        parts.append(remaining)
+    return parts
+
+
+# ---- Rate limiting ----
+
+class TokenBucket:
+    """Token bucket with priority-ordered waiters."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: list = []
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def pause(self, seconds: float) -> None:
+        """Grant no permits for `seconds` (flood control)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, priority: int = INTERACTIVE) -> None:
+        """Wait for a permit. Lower priority values are served first."""
+        now = time.monotonic()
+        self._refill(now)
+        if not self._waiters and now >= self._paused_until and self._tokens >= 1:
+            self._tokens -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        self._ensure_dispatcher()
+        self._wakeup.set()
+        await future
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        while True:
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._tokens -= 1
+                future.set_result(None)
+
+    def close(self) -> None:
+        if self._dispatcher:
+            self._dispatcher.cancel()
+
+
+class OutboundScheduler:
+    """Rate-limited, priority-aware sender for Telegram messages."""
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        max_retries: int = 5,
+        max_tracked_chats: int = 10000,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_tracked_chats = max_tracked_chats
+        self._chat_buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._chat_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = (
+            weakref.WeakValueDictionary()
+        )
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+            if len(self._chat_buckets) > self.max_tracked_chats:
+                _, evicted = self._chat_buckets.popitem(last=False)
+                evicted.close()
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def send_message(
+        self,
+        bot: Bot,
+        chat_id: int,
+        text: str,
+        parse_mode: Optional[str] = None,
+        priority: int = INTERACTIVE,
+        **kwargs
+    ) -> List[Message]:
+        """
+        Send `text` to `chat_id`, split into as many messages as needed.
+
+        Parts of one call are delivered in order; extra kwargs (e.g.
+        reply_markup) are attached to the last part only.
+        """
+        parts = split_message(text)
+        lock = self._chat_locks.get(chat_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._chat_locks[chat_id] = lock
+        sent = []
+
+        async with lock:
+            for index, part in enumerate(parts):
+                extra = kwargs if index == len(parts) - 1 else {}
+                sent.append(await self._send_part(
+                    bot, chat_id, part, parse_mode, priority, extra
+                ))
+
+        return sent
+
+    async def reply(
+        self,
+        update: Update,
+        text: str,
+        parse_mode: Optional[str] = None,
+        **kwargs
+    ) -> List[Message]:
+        """Interactive reply to the chat an update came from."""
+        return await self.send_message(
+            update.get_bot(), update.effective_chat.id, text,
+            parse_mode=parse_mode, priority=INTERACTIVE, **kwargs
+        )
+
+    async def _send_part(
+        self,
+        bot: Bot,
+        chat_id: int,
+        text: str,
+        parse_mode: Optional[str],
+        priority: int,
+        kwargs: dict,
+    ) -> Message:
+        retries = 0
+        while True:
+            await self._chat_bucket(chat_id).acquire(priority)
+            await self.global_bucket.acquire(priority)
+            try:
+                return await bot.send_message(chat_id, text, parse_mode=parse_mode, **kwargs)
+            except RetryAfter as e:
+                if retries == self.max_retries:
+                    raise
+                retries += 1
+                delay = e.retry_after
+                if isinstance(delay, timedelta):
+                    delay = delay.total_seconds()
+                logger.warning(f"Flood control for chat {chat_id}: retrying in {delay}s")
+                self.global_bucket.pause(delay)
+                self._chat_bucket(chat_id).pause(delay)
+            except BadRequest as e:
+                if parse_mode and "parse entities" in str(e).lower():
+                    logger.warning(f"Markdown rejected for chat {chat_id}, sending as plain text")
+                    parse_mode = None
+                    continue
+                raise
+
+
+# Global instance
+outbound = OutboundScheduler(
+    global_rate=settings.telegram_global_rate,
+    chat_rate=settings.telegram_chat_rate,
+)
@@ -0,0 +1,291 @@
+"""
+Agent Pilot Bot - Anomaly Detector
+==================================
+In-process replacement for the per-request `verificar_anomalias` call.
+Each user has sliding-window counters (errors they caused, rejected prompts,
+requests) kept in memory, so deciding whether to pause someone
+costs no database round trip.
+
+Only state transitions are written, in the background:
+usuarios_pro.estado / motivo_suspension / fecha_suspension (plus the
+errores_consecutivos and intentos_inyeccion counters) and a row in
+alertas_seguridad.
+
+    errors   >= error_threshold within error_window      -> pausado
+    requests >  burst_limit within burst_window          -> pausado
+    rejected >= injection_threshold within injection_window -> pausado
+
+Pauses lift by themselves after pause_seconds; rejected prompts keep
+counting for injection_window, so each further rejection pauses again.
+Suspensions are only set (for confirmed abuse) and lifted by hand in the
+database. The user row is still honored, so a state set by
+another process (or an admin) applies here too.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Set
+
+from config import settings
+from database.supabase_client import db
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = "activo"
+PAUSED = "pausado"
+SUSPENDED = "suspendido"
+
+# Seconds after a write during which a stale user row can't undo it
+SYNC_GRACE = 5.0
+
+
+class SlidingWindow:
+    """Event timestamps within the last `seconds`."""
+
+    __slots__ = ("seconds", "events")
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.events: deque = deque()
+
+    def add(self, now: float) -> int:
+        """Record an event and return the count in the window."""
+        self.events.append(now)
+        return self.count(now)
+
+    def count(self, now: float) -> int:
+        cutoff = now - self.seconds
+        events = self.events
+        while events and events[0] <= cutoff:
+            events.popleft()
+        return len(events)
+
+    def clear(self) -> None:
+        self.events.clear()
+
+
+class UserState:
+    """Counters and current state of one user."""
+
+    __slots__ = ("errors", "rejected", "requests", "status", "paused_until", "reason", "synced_at")
+
+    def __init__(self, detector: "AnomalyDetector"):
+        self.errors = SlidingWindow(detector.error_window)
+        self.rejected = SlidingWindow(detector.injection_window)
+        self.requests = SlidingWindow(detector.burst_window)
+        self.status = ACTIVE
+        self.paused_until = 0.0
+        self.reason: Optional[str] = None
+        # When the current status was written to usuarios_pro (None: pending)
+        self.synced_at: Optional[float] = 0.0
+
+    def idle(self, now: float) -> bool:
+        return (
+            self.status == ACTIVE
+            and not self.errors.count(now)
+            and not self.rejected.count(now)
+            and not self.requests.count(now)
+        )
+
+
+class AnomalyDetector:
+    """Per-user anomaly counters with local pause decisions."""
+
+    def __init__(
+        self,
+        error_threshold: int = 10,
+        error_window: float = 600,
+        injection_threshold: int = 3,
+        injection_window: float = 86400,
+        burst_limit: int = 20,
+        burst_window: float = 60,
+        pause_seconds: float = 900,
+        prune_above: int = 10000
+    ):
+        self.error_threshold = error_threshold
+        self.error_window = error_window
+        self.injection_threshold = injection_threshold
+        self.injection_window = injection_window
+        self.burst_limit = burst_limit
+        self.burst_window = burst_window
+        self.pause_seconds = pause_seconds
+        self.prune_above = prune_above
+        self._users: Dict[str, UserState] = {}
+        self._writes: Set[asyncio.Task] = set()
+
+    def _state(self, user_id: str) -> UserState:
+        state = self._users.get(user_id)
+        if state is None:
+            if len(self._users) >= self.prune_above:
+                self._prune()
+            state = self._users[user_id] = UserState(self)
+        return state
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for user_id in [uid for uid, state in self._users.items() if state.idle(now)]:
+            del self._users[user_id]
+
+    # ---- Checks ----
+
+    def check_request(self, user: dict) -> Optional[str]:
+        """
+        Count a request and return why the user is blocked (None if allowed).
+
+        Blocked requests are not counted towards the burst limit.
+        """
+        now = time.monotonic()
+        reason = self.blocked_reason(user, now)
+        if reason:
+            return reason
+
+        state = self._state(user["id"])
+        if state.requests.add(now) > self.burst_limit:
+            self._pause(
+                user["id"], state, now,
+                tipo="rafaga_peticiones",
+                reason=f"Más de {self.burst_limit} peticiones en {int(self.burst_window)}s",
+            )
+            return state.reason
+        return None
+
+    def blocked_reason(self, user: dict, now: Optional[float] = None) -> Optional[str]:
+        """Why the user can't make requests right now (None if they can)."""
+        now = now or time.monotonic()
+        state = self._users.get(user["id"])
+        estado = user.get("estado") or ACTIVE
+
+        if (
+            state and state.status != ACTIVE and estado == ACTIVE
+            and state.synced_at is not None and now - state.synced_at > SYNC_GRACE
+        ):
+            # Lifted by hand in the database (the row isn't a read from before our write)
+            state.status = ACTIVE
+            state.reason = None
+            state.rejected.clear()
+            state.errors.clear()
+            state.requests.clear()
+        if state and state.status == SUSPENDED:
+            return state.reason
+        if state and state.status == PAUSED:
+            if now < state.paused_until:
+                return state.reason
+            self._resume(user["id"], state)
+
+        # State written by another process, an admin or verificar_anomalias
+        if estado == SUSPENDED:
+            return user.get("motivo_suspension") or "Cuenta suspendida"
+        if estado == PAUSED and not self._pause_expired(user):
+            return user.get("motivo_suspension") or "Cuenta pausada temporalmente"
+        if estado == PAUSED and state is None:
+            # Pause from a previous run that has expired: lift it once
+            self._resume(user["id"], self._state(user["id"]))
+        return None
+
+    def _pause_expired(self, user: dict) -> bool:
+        since = user.get("fecha_suspension")
+        if not since:
+            return False
+        try:
+            paused_at = datetime.fromisoformat(since.replace("Z", "+00:00"))
+        except ValueError:
+            return True
+        return datetime.now(timezone.utc) - paused_at >= timedelta(seconds=self.pause_seconds)
+
+    # ---- Events ----
+
+    def record_error(self, user_id: str) -> None:
+        """A failed request caused by the user (see caused_by_user in the handlers)."""
+        now = time.monotonic()
+        state = self._state(user_id)
+        if state.errors.add(now) >= self.error_threshold and state.status == ACTIVE:
+            self._pause(
+                user_id, state, now,
+                tipo="error_api_repetido",
+                reason="Demasiados errores de API",
+            )
+
+    def record_success(self, user_id: str) -> None:
+        """A successful request: errors only count while consecutive."""
+        state = self._users.get(user_id)
+        if state:
+            state.errors.clear()
+
+    def record_rejected_prompt(self, user_id: str) -> None:
+        """A prompt rejected as an injection attempt."""
+        now = time.monotonic()
+        state = self._state(user_id)
+        if state.rejected.add(now) >= self.injection_threshold and state.status == ACTIVE:
+            # The filter is a heuristic: pause and alert, suspending stays a manual decision
+            self._pause(
+                user_id, state, now,
+                tipo="intento_inyeccion",
+                reason="Varios mensajes rechazados por el filtro de seguridad",
+            )
+
+    # ---- Transitions ----
+
+    def _pause(self, user_id: str, state: UserState, now: float, tipo: str, reason: str) -> None:
+        state.status = PAUSED
+        state.paused_until = now + self.pause_seconds
+        state.reason = reason
+        logger.warning(f"Pausing user {user_id} for {int(self.pause_seconds)}s: {reason}")
+        self._write(user_id, PAUSED, state, alert={
+            "tipo": tipo,
+            "severidad": "warning",
+            "descripcion": reason,
+            "accion_tomada": "pausa_temporal",
+        })
+
+    def _resume(self, user_id: str, state: UserState) -> None:
+        state.status = ACTIVE
+        state.reason = None
+        state.errors.clear()
+        state.requests.clear()
+        self._write(user_id, ACTIVE, state)
+
+    def _write(self, user_id: str, estado: str, state: UserState, alert: Optional[dict] = None) -> None:
+        """Persist a transition without blocking the request."""
+        now = time.monotonic()
+        state.synced_at = None
+        coro = db.record_anomaly_transition(
+            user_id,
+            estado=estado,
+            motivo=state.reason,
+            errores=state.errors.count(now),
+            inyecciones=state.rejected.count(now),
+            alert=alert,
+        )
+        try:
+            task = asyncio.get_running_loop().create_task(coro)
+        except RuntimeError:
+            coro.close()
+            logger.error(f"No event loop to record anomaly state of user {user_id}")
+            return
+        self._writes.add(task)
+        task.add_done_callback(lambda done: self._write_done(done, state, estado))
+
+    def _write_done(self, task: asyncio.Task, state: UserState, estado: str) -> None:
+        self._writes.discard(task)
+        if task.cancelled() or task.exception():
+            logger.error(f"Could not record anomaly state: {task.exception() if not task.cancelled() else 'cancelled'}")
+        elif state.status == estado:
+            state.synced_at = time.monotonic()
+
+    async def flush(self) -> None:
+        """Wait for pending transition writes (e.g. on shutdown)."""
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+
+# Global instance
+anomaly_detector = AnomalyDetector(
+    error_threshold=settings.anomaly_error_threshold,
+    injection_threshold=settings.anomaly_injection_threshold,
+    burst_limit=settings.anomaly_burst_limit,
+    burst_window=settings.anomaly_burst_window,
+    pause_seconds=settings.anomaly_pause_seconds
+)
@@ -10,6 +10,7 @@ from telegram import Update
 from telegram.ext import ContextTypes
 
 from database.supabase_client import db
+from payments.pricing import pricing
 
 
 def auth_middleware(func):
@@ -34,9 +35,7 @@ def auth_middleware(func):
 
 
 def require_plan(min_plan: str):
-    """Decorator to require minimum plan level."""
-    plan_levels = {"free": 0, "starter": 1, "pro": 2, "enterprise": 3}
-
+    """Decorator to require minimum plan level (ranked by the pricing catalog)."""
     def decorator(func):
         @wraps(func)
         async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
@@ -48,8 +47,8 @@ def require_plan(min_plan: str):
                 )
                 return
 
-            user_level = plan_levels.get(user["plan_actual"], 0)
-            required_level = plan_levels.get(min_plan, 0)
+            user_level = pricing.plan_level(user["plan_actual"])
+            required_level = pricing.plan_level(min_plan)
 
             if user_level < required_level:
                 await update.message.reply_text(
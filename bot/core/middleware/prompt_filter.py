@@ -0,0 +1,196 @@
+"""
+Agent Pilot Bot - Prompt Filter
+===============================
+Cheap local screen for prompt-injection attempts, run in the handler
+before the swarm spends provider tokens.
+
+Text is folded first: NFKD (fullwidth and compatibility forms), then
+reduced to lowercase ASCII, which drops accents, zero-width characters
+and other tricks used to split trigger words. Matching has two stages:
+
+1. Keyword gate: each rule lists the words that must appear for it to
+   possibly match; the message's words are looked up in one dict, so the
+   cost doesn't grow with the number of rules.
+2. The rules whose keywords appeared are compiled into one combined regex
+   (cached per set of rules) and the text is scanned once.
+
+Each matched rule adds its weight, and the heuristics (hidden characters,
+very long tokens such as encoded payloads) add theirs; the prompt is
+rejected when the score reaches `threshold`. No single rule reaches it on
+its own: a rejection needs two signals. Weak rules ("requires_other",
+e.g. "finge que") only count when another rule matched. Ordinary
+messages never get past the keyword gate.
+
+The rules file (prompt_rules.json) is reloaded when it changes (checked
+at most every `reload_interval` seconds); a broken file keeps the
+previous rules.
+"""
+
+import json
+import logging
+import os
+import re
+import string
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Pattern
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "prompt_rules.json")
+
+# Zero-width, bidi control, soft hyphen and tag characters
+_INVISIBLE_RE = re.compile(
+    r"[\u00ad\u180e\u200b-\u200f\u202a-\u202e\u2060-\u2064\u2066-\u2069\ufeff\U000e0000-\U000e007f]"
+)
+_WORD_SEPARATORS = str.maketrans(string.punctuation, " " * len(string.punctuation))
+
+
+def fold(text: str) -> str:
+    """Lowercase ASCII form of a text used for matching."""
+    text = unicodedata.normalize("NFKD", text)
+    return text.encode("ascii", "ignore").decode("ascii").lower()
+
+
+@dataclass
+class FilterResult:
+    """Outcome of screening one prompt."""
+    allowed: bool
+    score: int = 0
+    rules: List[str] = field(default_factory=list)
+
+
+@dataclass
+class RuleSet:
+    """Compiled rules of one version of the rules file."""
+    rules: List[dict] = field(default_factory=list)
+    threshold: int = 3
+    max_invisible_chars: int = 3
+    invisible_weight: int = 2
+    long_token_length: int = 200
+    long_token_weight: int = 2
+    # keyword -> bitmask of rules; rules without keywords are always tried
+    keywords: Dict[str, int] = field(default_factory=dict)
+    always: int = 0
+    _patterns: Dict[int, Pattern] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RuleSet":
+        rules = [rule for rule in data.get("rules", []) if rule.get("pattern")]
+        ruleset = cls(
+            rules=rules,
+            threshold=data.get("threshold", 3),
+            max_invisible_chars=data.get("max_invisible_chars", 3),
+            invisible_weight=data.get("invisible_weight", 2),
+            long_token_length=data.get("long_token_length", 200),
+            long_token_weight=data.get("long_token_weight", 2),
+        )
+        for i, rule in enumerate(rules):
+            if not rule.get("keywords"):
+                ruleset.always |= 1 << i
+            for keyword in rule.get("keywords", []):
+                ruleset.keywords[fold(keyword)] = ruleset.keywords.get(fold(keyword), 0) | 1 << i
+        # Compile everything now so a bad pattern fails the reload, not a request
+        ruleset.pattern((1 << len(rules)) - 1)
+        return ruleset
+
+    def pattern(self, mask: int) -> Pattern:
+        """Combined regex of the rules in `mask`, one named group per rule."""
+        compiled = self._patterns.get(mask)
+        if compiled is None:
+            if len(self._patterns) >= 256:
+                self._patterns.clear()
+            compiled = re.compile(
+                "|".join(
+                    f"(?P<r{i}>{rule['pattern']})"
+                    for i, rule in enumerate(self.rules) if mask >> i & 1
+                ),
+                re.MULTILINE,
+            )
+            self._patterns[mask] = compiled
+        return compiled
+
+
+class PromptFilter:
+    """Scores prompts against the rules file."""
+
+    def __init__(self, rules_path: Optional[str] = None, reload_interval: float = 10.0):
+        self.rules_path = rules_path or DEFAULT_RULES_PATH
+        self.reload_interval = reload_interval
+        self._rules = RuleSet()
+        self._mtime = None
+        self._next_check = 0.0
+        self._maybe_reload(force=True)
+
+    @property
+    def rules(self) -> RuleSet:
+        return self._rules
+
+    def _maybe_reload(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+
+        try:
+            mtime = os.stat(self.rules_path).st_mtime_ns
+            if mtime == self._mtime:
+                return
+            with open(self.rules_path, encoding="utf-8") as f:
+                rules = RuleSet.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, re.error) as e:
+            logger.error(f"Could not load prompt rules from {self.rules_path}: {e}")
+            return
+
+        self._rules, self._mtime = rules, mtime
+        logger.info(f"Loaded {len(rules.rules)} prompt rules from {self.rules_path}")
+
+    def check(self, text: str) -> FilterResult:
+        """Screen a prompt. Rejected prompts have allowed=False."""
+        self._maybe_reload()
+        rules = self._rules
+        folded = fold(text)
+        words = set(folded.translate(_WORD_SEPARATORS).split())
+
+        score = 0
+        matched = []
+        if len(_INVISIBLE_RE.findall(text)) > rules.max_invisible_chars:
+            score += rules.invisible_weight
+            matched.append("invisible_chars")
+        if words and max(map(len, words)) >= rules.long_token_length:
+            score += rules.long_token_weight
+            matched.append("long_token")
+
+        mask = rules.always
+        for word in words:
+            mask |= rules.keywords.get(word, 0)
+
+        if mask and score < rules.threshold:
+            # Rules marked requires_other only count next to another rule
+            pending = []
+            other_rule = False
+            for match in rules.pattern(mask).finditer(folded):
+                rule = rules.rules[int(match.lastgroup[1:])]
+                if rule["id"] in matched or rule in pending:
+                    continue
+                if rule.get("requires_other"):
+                    pending.append(rule)
+                    continue
+                other_rule = True
+                matched.append(rule["id"])
+                score += rule.get("weight", 1)
+                if score >= rules.threshold:
+                    break
+            if other_rule:
+                for rule in pending:
+                    matched.append(rule["id"])
+                    score += rule.get("weight", 1)
+
+        return FilterResult(allowed=score < rules.threshold, score=score, rules=matched)
+
+
+# Global instance
+prompt_filter = PromptFilter(settings.prompt_rules_path)
@@ -0,0 +1,76 @@
+"""
+Agent Pilot Bot - Startup Helpers
+=================================
+Background warm-up of lazily imported SDKs and a startup profile mode
+(`python main.py --profile-startup`) that reports import time per module.
+"""
+
+import asyncio
+import importlib
+import logging
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# SDKs imported lazily on first use; warmed in the background once ready
+LAZY_SDKS = ["openai", "aiohttp"]
+
+_PROFILE_SNIPPET = (
+    "import time; start = time.perf_counter(); "
+    "import main; main.build_application(); "
+    "print(f'READY {time.perf_counter() - start:.3f}')"
+)
+
+
+async def warm_up_sdks() -> None:
+    """Import lazy SDKs off the event loop so the first request doesn't pay for them."""
+    for module in LAZY_SDKS:
+        try:
+            await asyncio.to_thread(importlib.import_module, module)
+        except ImportError as e:
+            logger.warning(f"Could not preload {module}: {e}")
+
+
+def profile_startup(top: int = 20) -> None:
+    """
+    Build the application in a child interpreter with -X importtime and
+    print the time to ready plus the slowest modules and packages.
+    """
+    bot_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROFILE_SNIPPET],
+        capture_output=True,
+        text=True,
+        cwd=bot_dir,
+    )
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    ready = [line for line in proc.stdout.splitlines() if line.startswith("READY")]
+    if proc.returncode != 0 or not ready:
+        print(proc.stderr[-2000:])
+        print("Startup failed, see the error above.")
+        return
+
+    by_package = defaultdict(int)
+    for name, self_us, _ in modules:
+        by_package[name.split(".")[0]] += self_us
+
+    print(f"Time to ready: {float(ready[0].split()[1]) * 1000:.0f} ms "
+          f"({len(modules)} modules imported)\n")
+
+    print(f"Slowest {top} modules (cumulative ms / self ms):")
+    for name, self_us, cumulative_us in sorted(modules, key=lambda m: -m[2])[:top]:
+        print(f"  {cumulative_us / 1000:8.1f} {self_us / 1000:8.1f}  {name}")
+
+    print(f"\nSlowest {top} packages (self ms):")
+    for name, self_us in sorted(by_package.items(), key=lambda p: -p[1])[:top]:
+        print(f"  {self_us / 1000:8.1f}  {name}")
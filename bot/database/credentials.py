@@ -0,0 +1,195 @@
+"""
+Agent Pilot Bot - BYOA Credential Store
+=======================================
+Loads users' own API keys (credenciales_api), decrypts them and keeps
+them in memory for a short TTL, so BYOA requests don't pay a database
+round trip or a decryption per message.
+
+Keys are Fernet tokens encrypted with CREDENTIALS_ENCRYPTION_KEY (several
+comma-separated keys are accepted for rotation; the first one is current).
+Rows that are not Fernet tokens are treated as legacy plaintext and
+counted (plaintext_ids) so the migration can be tracked.
+Decrypted keys are never logged: log lines use api_key_hint.
+
+The dashboard edits credenciales_api directly, so watch_forever() checks
+the cached users' rows every watch_interval seconds and drops the ones
+that changed: a revoked or replaced key stops being used within that
+interval instead of the full TTL.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from config import settings
+from database.supabase_client import db
+
+logger = logging.getLogger(__name__)
+
+# Every Fernet token starts with the version byte 0x80, base64-encoded
+FERNET_PREFIX = "gAAAAA"
+
+# Columns whose change invalidates a user's cached keys (not the usage counter)
+VERSION_COLUMNS = ("id", "api_key_encrypted", "prioridad", "limite_mensual", "estado_verificacion")
+
+
+def _version(rows: list) -> FrozenSet[tuple]:
+    return frozenset(tuple(row.get(column) for column in VERSION_COLUMNS) for row in rows)
+
+
+class CredentialStore:
+    """TTL cache of decrypted BYOA keys per user."""
+
+    def __init__(
+        self,
+        encryption_key: Optional[str] = None,
+        ttl_seconds: int = 60,
+        prune_above: int = 1024,
+        watch_interval: int = 10
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.prune_above = prune_above
+        self.watch_interval = watch_interval
+        self._encryption_key = encryption_key
+        self._cipher = None
+        # user_id -> (expires, keys, version of the rows they came from)
+        self._cache: Dict[str, Tuple[float, Dict[str, List[dict]], FrozenSet[tuple]]] = {}
+        # Credentials seen stored in plaintext
+        self.plaintext_ids: Set[str] = set()
+
+    @property
+    def cipher(self):
+        """MultiFernet built on first use (None if no key is configured)."""
+        if self._cipher is None and self._encryption_key:
+            from cryptography.fernet import Fernet, MultiFernet
+            self._cipher = MultiFernet([
+                Fernet(key.strip())
+                for key in self._encryption_key.split(",")
+                if key.strip()
+            ])
+        return self._cipher
+
+    def encrypt(self, api_key: str) -> str:
+        """Encrypt a key for storage in credenciales_api.api_key_encrypted."""
+        if self.cipher is None:
+            raise ValueError("CREDENTIALS_ENCRYPTION_KEY is not configured")
+        return self.cipher.encrypt(api_key.encode()).decode()
+
+    async def get_api_keys(self, user_id: str) -> Dict[str, List[dict]]:
+        """
+        Get a user's usable keys per provider, highest priority first, in
+        the format the swarm's key pools expect:
+        {provider: [{api_key, priority, monthly_limit, used, credential_id}]}.
+        Cached for ttl_seconds.
+        """
+        now = time.monotonic()
+        cached = self._cache.get(user_id)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        try:
+            rows = await db.get_api_credentials(user_id)
+        except Exception as e:
+            # Fall back to system keys; don't cache so the next message retries
+            logger.error(f"Could not load API credentials for user {user_id}: {e}")
+            return {}
+
+        keys: Dict[str, List[dict]] = {}
+        for row in rows:
+            if not self._is_usable(row):
+                continue
+            api_key = self._decrypt(row)
+            if api_key:
+                keys.setdefault(row["proveedor"], []).append({
+                    "api_key": api_key,
+                    "priority": row.get("prioridad") or 0,
+                    "monthly_limit": row.get("limite_mensual"),
+                    "used": row.get("uso_actual_mes") or 0,
+                    "credential_id": row["id"],
+                })
+
+        if len(self._cache) >= self.prune_above:
+            self._cache = {
+                uid: entry for uid, entry in self._cache.items() if entry[0] > now
+            }
+        self._cache[user_id] = (now + self.ttl_seconds, keys, _version(rows))
+        return keys
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """Forget cached keys for a user (e.g. after a revocation), or for everyone."""
+        if user_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(user_id, None)
+
+    async def check_changes(self) -> int:
+        """Drop cached users whose credentials changed. Returns how many."""
+        now = time.monotonic()
+        cached = [uid for uid, entry in self._cache.items() if entry[0] > now]
+        if not cached:
+            return 0
+        rows = await db.get_api_credential_versions(cached)
+        by_user: Dict[str, list] = {uid: [] for uid in cached}
+        for row in rows:
+            by_user.setdefault(row["usuario_id"], []).append(row)
+
+        changed = 0
+        for uid in cached:
+            entry = self._cache.get(uid)
+            if entry and entry[2] != _version(by_user[uid]):
+                self.invalidate(uid)
+                changed += 1
+        return changed
+
+    async def watch_forever(self) -> None:
+        """Background task: check_changes every watch_interval seconds."""
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                changed = await self.check_changes()
+            except Exception as e:
+                logger.error(f"Could not check API credentials for changes: {e}")
+                continue
+            if changed:
+                logger.info(f"Reloading API keys of {changed} users after a change")
+
+    @staticmethod
+    def _is_usable(row: dict) -> bool:
+        if row.get("estado_verificacion") == "invalida":
+            return False
+        limit = row.get("limite_mensual")
+        return limit is None or (row.get("uso_actual_mes") or 0) < limit
+
+    def _decrypt(self, row: dict) -> Optional[str]:
+        token = row["api_key_encrypted"]
+        label = f"{row['proveedor']} key ...{row.get('api_key_hint') or '?'}"
+
+        if not token.startswith(FERNET_PREFIX):
+            # Legacy plaintext row
+            if row["id"] not in self.plaintext_ids:
+                self.plaintext_ids.add(row["id"])
+                logger.warning(
+                    f"{label} is stored in plaintext "
+                    f"({len(self.plaintext_ids)} plaintext credentials seen)"
+                )
+            return token
+
+        if self.cipher is None:
+            logger.warning(f"Skipping {label}: CREDENTIALS_ENCRYPTION_KEY is not set")
+            return None
+
+        from cryptography.fernet import InvalidToken
+        try:
+            return self.cipher.decrypt(token.encode()).decode()
+        except InvalidToken:
+            logger.warning(f"Skipping {label}: cannot be decrypted with the configured key")
+            return None
+
+
+# Global instance
+credential_store = CredentialStore(
+    encryption_key=settings.credentials_encryption_key,
+    ttl_seconds=settings.byoa_cache_ttl,
+    watch_interval=settings.byoa_watch_interval
+)
@@ -0,0 +1,223 @@
+"""
+Agent Pilot Bot - Conversation State Persistence
+================================================
+SQLite (WAL) persistence for python-telegram-bot, so context.user_data
+(e.g. the awaiting_analysis / analysis_mode flow) survives restarts.
+
+- Lazy loading: nothing is loaded at startup; a user's (or chat's) state
+  is read the first time one of their updates is handled. Values already
+  in memory (e.g. handed off by a cluster worker) are kept.
+- Dirty tracking: the Application hands over the state of every user it
+  touched each update_interval; states whose serialized hash didn't
+  change are skipped.
+- Batched flushes: changed states are staged and written together in one
+  transaction, off the event loop.
+
+Transient keys (TRANSIENT_KEYS, e.g. the cached database row) are never
+stored.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from typing import Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+# Per-request caches that must not outlive the process
+TRANSIENT_KEYS = {"db_user"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    kind TEXT NOT NULL,      -- user, chat, bot, conversation:<name>
+    key TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+"""
+
+
+def _serialize(data) -> str:
+    if isinstance(data, dict):
+        data = {k: v for k, v in data.items() if k not in TRANSIENT_KEYS}
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def _digest(serialized: str) -> bytes:
+    return hashlib.blake2b(serialized.encode(), digest_size=16).digest()
+
+
+class SQLitePersistence(BasePersistence):
+    """Lazily loaded, batch-written conversation state in SQLite."""
+
+    def __init__(self, path: str, update_interval: float = 10):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=True, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+        # (kind, key) -> digest of the stored version
+        self._stored: Dict[Tuple[str, str], bytes] = {}
+        # (kind, key) -> serialized data to write, or None to delete
+        self._pending: Dict[Tuple[str, str], Optional[str]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    # ---- SQLite ----
+
+    def _read(self, kind: str, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM state WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _read_kind(self, kind: str) -> Dict[str, str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, data FROM state WHERE kind = ?", (kind,)).fetchall()
+        return dict(rows)
+
+    def _write(self, batch: Dict[Tuple[str, str], Optional[str]]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO state (kind, key, data) VALUES (?, ?, ?) "
+                    "ON CONFLICT (kind, key) DO UPDATE SET data = excluded.data",
+                    [(kind, key, data) for (kind, key), data in batch.items() if data is not None],
+                )
+                self._conn.executemany(
+                    "DELETE FROM state WHERE kind = ? AND key = ?",
+                    [(kind, key) for (kind, key), data in batch.items() if data is None],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # ---- Staging ----
+
+    def _stage(self, kind: str, key, data) -> None:
+        entry = (kind, str(key))
+        serialized = _serialize(data)
+        digest = _digest(serialized)
+        if self._stored.get(entry) == digest:
+            return
+        self._stored[entry] = digest
+        self._pending[entry] = serialized
+        self._schedule_flush()
+
+    def _stage_delete(self, kind: str, key) -> None:
+        entry = (kind, str(key))
+        self._stored.pop(entry, None)
+        self._pending[entry] = None
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        # One write per update_persistence round: the Application stages
+        # every changed user in the same loop iteration
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_pending())
+
+    async def _flush_pending(self) -> None:
+        while self._pending:
+            batch, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                logger.error(f"Could not persist {len(batch)} conversation states: {e}")
+                # Retry on the next round; newer staged versions win
+                self._pending = {**batch, **self._pending}
+                for entry in batch:
+                    self._stored.pop(entry, None)
+                return
+
+    async def _load_into(self, kind: str, key: int, target: dict) -> None:
+        entry = (kind, str(key))
+        if entry in self._stored or entry in self._pending:
+            return
+        serialized = await asyncio.to_thread(self._read, kind, str(key))
+        if serialized is None:
+            # Known empty: don't look it up again
+            self._stored[entry] = b""
+            return
+        self._stored[entry] = _digest(serialized)
+        for name, value in json.loads(serialized).items():
+            target.setdefault(name, value)
+
+    # ---- BasePersistence ----
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        serialized = await asyncio.to_thread(self._read, "bot", "")
+        if serialized is None:
+            return {}
+        self._stored[("bot", "")] = _digest(serialized)
+        return json.loads(serialized)
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        rows = await asyncio.to_thread(self._read_kind, f"conversation:{name}")
+        return {tuple(json.loads(key)): json.loads(data) for key, data in rows.items()}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        kind = f"conversation:{name}"
+        if new_state is None:
+            self._stage_delete(kind, json.dumps(list(key)))
+        else:
+            self._stage(kind, json.dumps(list(key)), new_state)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._stage("user", user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._stage("chat", chat_id, data)
+
+    async def update_bot_data(self, data: dict) -> None:
+        self._stage("bot", "", data)
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._stage_delete("user", user_id)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._stage_delete("chat", chat_id)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        await self._load_into("user", user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        await self._load_into("chat", chat_id, chat_data)
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """Write everything staged (called by the Application on shutdown)."""
+        if self._flush_task is not None:
+            await self._flush_task
+        if self._pending:
+            await self._flush_pending()
+        with self._lock:
+            self._conn.close()
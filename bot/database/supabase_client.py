@@ -5,11 +5,14 @@ Database operations for users, credits, and transactions.
 Replace this placeholder with your complete supabase_client.py
 """
 
-from typing import Optional
-from supabase import create_client, Client
+from datetime import datetime, timezone
+from typing import Optional, TYPE_CHECKING
 
 from config import settings
 
+if TYPE_CHECKING:
+    from supabase import Client
+
 
 class SupabaseClient:
     """Client for interacting with Supabase database."""
@@ -19,14 +22,18 @@ class SupabaseClient:
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
-            cls._instance._client = create_client(
-                settings.supabase_url,
-                settings.supabase_key
-            )
+            cls._instance._client = None
         return cls._instance
 
     @property
-    def client(self) -> Client:
+    def client(self) -> "Client":
+        # Created on first use so importing handlers doesn't load the SDK
+        if self._client is None:
+            from supabase import create_client
+            self._client = create_client(
+                settings.supabase_url,
+                settings.supabase_key
+            )
         return self._client
 
     # ---- User Operations ----
@@ -89,27 +96,52 @@ class SupabaseClient:
         ).eq("id", user_id).single().execute()
         return response.data["creditos_disponibles"]
 
-    async def deduct_credits(self, user_id: str, amount: int, concepto: str) -> bool:
-        """Deduct credits from user's balance. Returns False if insufficient."""
+    async def deduct_credits(
+        self, user_id: str, amount: int, concepto: str,
+        idempotency_key: Optional[str] = None
+    ) -> bool:
+        """
+        Deduct credits from user's balance. Returns False if insufficient.
+
+        With idempotency_key, a charge already recorded under that key is
+        not repeated (returns True), e.g. when a job is redelivered.
+        """
+        if idempotency_key and await self.has_charge(idempotency_key):
+            return True
+
         # Get current balance
         current = await self.get_credits(user_id)
         if current < amount:
             return False
 
-        # Deduct and record transaction
-        new_balance = current - amount
-        await self.update_user(user_id, creditos_disponibles=new_balance)
-
-        # Record transaction
-        self.client.table("transacciones").insert({
+        transaction = {
             "usuario_id": user_id,
             "tipo": "consumo",
             "creditos": -amount,
             "concepto": concepto,
-        }).execute()
+        }
+        new_balance = current - amount
+        if idempotency_key:
+            # Recorded first: the unique index rejects a concurrent duplicate
+            # before the balance changes
+            transaction["metadata"] = {"idempotency_key": idempotency_key}
+            self.client.table("transacciones").insert(transaction).execute()
+            await self.update_user(user_id, creditos_disponibles=new_balance)
+            return True
+
+        # Deduct and record transaction
+        await self.update_user(user_id, creditos_disponibles=new_balance)
+        self.client.table("transacciones").insert(transaction).execute()
 
         return True
 
+    async def has_charge(self, idempotency_key: str) -> bool:
+        """Whether a charge was already recorded under idempotency_key."""
+        response = self.client.table("transacciones").select("id").eq(
+            "metadata->>idempotency_key", idempotency_key
+        ).limit(1).execute()
+        return bool(response.data)
+
     async def add_credits(
         self, user_id: str, amount: int, concepto: str,
         stripe_payment_id: Optional[str] = None
@@ -130,6 +162,126 @@ class SupabaseClient:
 
         return new_balance
 
+    # ---- Security ----
+
+    async def record_anomaly_transition(
+        self,
+        user_id: str,
+        estado: str,
+        motivo: Optional[str],
+        errores: int,
+        inyecciones: int,
+        alert: Optional[dict] = None
+    ) -> None:
+        """Write an anomaly state change and, if given, its security alert."""
+        self.client.table("usuarios_pro").update({
+            "estado": estado,
+            "motivo_suspension": motivo,
+            "fecha_suspension": datetime.now(timezone.utc).isoformat() if estado != "activo" else None,
+            "errores_consecutivos": errores,
+            "intentos_inyeccion": inyecciones,
+        }).eq("id", user_id).execute()
+
+        if alert:
+            self.client.table("alertas_seguridad").insert({
+                "usuario_id": user_id,
+                **alert,
+            }).execute()
+
+    # ---- Pricing ----
+
+    async def get_operation_costs(self) -> list:
+        """Get active operation costs (costes_operaciones)."""
+        response = self.client.table("costes_operaciones").select(
+            "operacion, creditos_base, creditos_con_api_propia"
+        ).eq("es_activo", True).execute()
+        return response.data or []
+
+    async def get_plans(self) -> list:
+        """Get active plans (planes_precios)."""
+        response = self.client.table("planes_precios").select(
+            "nombre, precio_mensual_eur, creditos_mensuales, features, orden"
+        ).eq("es_activo", True).execute()
+        return response.data or []
+
+    # ---- Subscription Renewal ----
+
+    async def get_due_renewals(
+        self, until: str, plans: list, after: Optional[tuple] = None, limit: int = 1000
+    ) -> list:
+        """
+        Get users whose plan renewal is due, ordered by (fecha_renovacion_plan, id).
+        `after` is the (fecha_renovacion_plan, id) of the last row of the previous page.
+        """
+        query = self.client.table("usuarios_pro").select(
+            "id, plan_actual, fecha_renovacion_plan"
+        ).lte("fecha_renovacion_plan", until).in_("plan_actual", plans)
+        if after:
+            fecha, user_id = after
+            query = query.or_(
+                f'fecha_renovacion_plan.gt."{fecha}",'
+                f'and(fecha_renovacion_plan.eq."{fecha}",id.gt.{user_id})'
+            )
+        response = query.order("fecha_renovacion_plan").order("id").limit(limit).execute()
+        return response.data or []
+
+    async def renew_plans(self, user_ids: list, plan_credits: dict, until: str) -> list:
+        """Grant monthly credits to a batch of due users (see renovar_planes_lote)."""
+        plans = list(plan_credits)
+        response = self.client.rpc("renovar_planes_lote", {
+            "p_ids": user_ids,
+            "p_planes": plans,
+            "p_creditos": [plan_credits[plan] for plan in plans],
+            "p_hasta": until,
+        }).execute()
+        return response.data or []
+
+    # ---- Analytics Export ----
+
+    async def get_rows_after(
+        self, table: str, columns: str, after: Optional[tuple] = None, limit: int = 5000
+    ) -> list:
+        """
+        Page through a table ordered by (created_at, id).
+        `after` is the (created_at, id) of the last row of the previous page.
+        """
+        query = self.client.table(table).select(columns)
+        if after:
+            created_at, row_id = after
+            query = query.or_(
+                f'created_at.gt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.gt.{row_id})'
+            )
+        response = query.order("created_at").order("id").limit(limit).execute()
+        return response.data or []
+
+    # ---- API Credential Operations ----
+
+    async def get_api_credentials(self, user_id: str) -> list:
+        """Get a user's active BYOA credentials, highest priority first."""
+        response = self.client.table("credenciales_api").select(
+            "id, proveedor, api_key_encrypted, api_key_hint, prioridad, "
+            "limite_mensual, uso_actual_mes, estado_verificacion"
+        ).eq("usuario_id", user_id).eq("es_activa", True).order(
+            "prioridad", desc=True
+        ).execute()
+        return response.data or []
+
+    async def get_api_credential_versions(self, user_ids: list) -> list:
+        """Active BYOA credentials of several users, without usage counters."""
+        response = self.client.table("credenciales_api").select(
+            "id, usuario_id, api_key_encrypted, prioridad, limite_mensual, estado_verificacion"
+        ).in_("usuario_id", user_ids).eq("es_activa", True).execute()
+        return response.data or []
+
+    async def increment_api_usage(self, increments: dict) -> None:
+        """Add {credential_id: calls} to uso_actual_mes in one round trip."""
+        ids = list(increments)
+        self.client.rpc("incrementar_uso_credenciales", {
+            "p_ids": ids,
+            "p_incrementos": [increments[i] for i in ids],
+        }).execute()
+
     # ---- Linking Code Operations ----
 
     async def get_user_by_link_code(self, code: str) -> Optional[dict]:
@@ -0,0 +1,4 @@
+# Job queue modules
+from .queue import Job, JobQueue
+
+__all__ = ["Job", "JobQueue"]
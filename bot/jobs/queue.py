@@ -0,0 +1,295 @@
+"""
+Agent Pilot Bot - Durable Job Queue
+===================================
+SQLite-backed job queue for long-running swarm requests.
+
+Jobs are claimed with a lease (visibility timeout). A worker that dies
+without acking lets the lease expire and the job becomes visible again,
+so delivery is at-least-once. Failed jobs are retried with backoff until
+max_attempts, then marked as failed; jobs whose last lease expired are
+returned once by reap_dead() so the worker can tell the user. A user's
+queued or running jobs can be cancelled (see cancel_for_user); a worker
+running one notices at its next heartbeat and stops it.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued',   -- queued, running, done, failed, cancelled
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_expires_at REAL,
+    worker_id TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_available ON jobs(status, available_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs(status, lease_expires_at);
+"""
+
+
+@dataclass
+class Job:
+    """A claimed job."""
+    id: str
+    kind: str
+    payload: dict
+    attempts: int
+    max_attempts: int
+    state: dict = field(default_factory=dict)
+
+
+class JobQueue:
+    """Durable queue with leases, retries and at-least-once delivery."""
+
+    def __init__(
+        self,
+        path: str,
+        visibility_timeout: int = 300,
+        max_attempts: int = 3,
+        retry_backoff: float = 10.0,
+    ):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ---- Producer ----
+
+    async def enqueue(self, kind: str, payload: dict) -> str:
+        """Add a job to the queue. Returns the job ID."""
+        return await asyncio.to_thread(self._enqueue, kind, payload)
+
+    def _enqueue(self, kind: str, payload: dict) -> str:
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, payload, max_attempts, available_at, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), self.max_attempts, now, now, now),
+            )
+        return job_id
+
+    async def cancel_for_user(self, telegram_id: int) -> int:
+        """Cancel the user's queued and running jobs. Returns how many were cancelled."""
+        return await asyncio.to_thread(self._cancel_for_user, telegram_id)
+
+    def _cancel_for_user(self, telegram_id: int) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', lease_expires_at = NULL, updated_at = ? "
+                "WHERE status IN ('queued', 'running') "
+                "AND json_extract(payload, '$.telegram_id') = ?",
+                (now, telegram_id),
+            )
+        return cursor.rowcount
+
+    # ---- Consumer ----
+
+    async def claim(self, worker_id: str) -> Optional[Job]:
+        """Lease the next visible job, or return None if the queue is empty."""
+        return await asyncio.to_thread(self._claim, worker_id)
+
+    def _claim(self, worker_id: str) -> Optional[Job]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Expired leases that already used every attempt are left to reap_dead
+                row = self._conn.execute(
+                    "SELECT id, kind, payload, state, attempts, max_attempts FROM jobs "
+                    "WHERE (status = 'queued' AND available_at <= ?) "
+                    "OR (status = 'running' AND lease_expires_at <= ? AND attempts < max_attempts) "
+                    "ORDER BY available_at LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+
+                job_id, kind, payload, state, attempts, max_attempts = row
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                    "worker_id = ?, lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                    (worker_id, now + self.visibility_timeout, now, job_id),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return Job(
+            id=job_id,
+            kind=kind,
+            payload=json.loads(payload),
+            attempts=attempts + 1,
+            max_attempts=max_attempts,
+            state=json.loads(state),
+        )
+
+    async def reap_dead(self) -> List[Job]:
+        """
+        Mark jobs whose last lease expired as failed and return them (each
+        one once), so their users can be told.
+        """
+        return await asyncio.to_thread(self._reap_dead)
+
+    def _reap_dead(self) -> List[Job]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, kind, payload, state, attempts, max_attempts FROM jobs "
+                    "WHERE status = 'running' AND lease_expires_at <= ? "
+                    "AND attempts >= max_attempts",
+                    (now,),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE jobs SET status = 'failed', last_error = "
+                    "COALESCE(last_error, 'visibility timeout'), lease_expires_at = NULL, "
+                    "updated_at = ? WHERE id = ?",
+                    [(now, row[0]) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return [
+            Job(
+                id=job_id,
+                kind=kind,
+                payload=json.loads(payload),
+                attempts=attempts,
+                max_attempts=max_attempts,
+                state=json.loads(state),
+            )
+            for job_id, kind, payload, state, attempts, max_attempts in rows
+        ]
+
+    async def extend_lease(self, job_id: str, worker_id: str) -> bool:
+        """Push the visibility timeout forward. False if the lease was lost."""
+        return await asyncio.to_thread(self._extend_lease, job_id, worker_id)
+
+    def _extend_lease(self, job_id: str, worker_id: str) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (now + self.visibility_timeout, now, job_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    async def save_state(self, job_id: str, state: dict) -> None:
+        """Persist progress so a redelivered job can skip finished steps."""
+        await asyncio.to_thread(self._save_state, job_id, state)
+
+    def _save_state(self, job_id: str, state: dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(state), time.time(), job_id),
+            )
+
+    async def ack(self, job_id: str, worker_id: str) -> bool:
+        """Mark a job as done. False if the lease was lost (cancelled or taken over)."""
+        return await asyncio.to_thread(self._ack, job_id, worker_id)
+
+    def _ack(self, job_id: str, worker_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'done', lease_expires_at = NULL, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (time.time(), job_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    async def nack(self, job_id: str, worker_id: str, error: str) -> bool:
+        """
+        Report a failed attempt.
+
+        Returns True if the job will be retried, False if it is now dead.
+        """
+        return await asyncio.to_thread(self._nack, job_id, worker_id, error)
+
+    def _nack(self, job_id: str, worker_id: str, error: str) -> bool:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts, max_attempts FROM jobs "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (job_id, worker_id),
+            ).fetchone()
+            if row is None:
+                return False
+            attempts, max_attempts = row
+            if attempts >= max_attempts:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', last_error = ?, "
+                    "lease_expires_at = NULL, updated_at = ? WHERE id = ?",
+                    (error, now, job_id),
+                )
+                return False
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', last_error = ?, available_at = ?, "
+                "lease_expires_at = NULL, updated_at = ? WHERE id = ?",
+                (error, now + self.retry_backoff * attempts, now, job_id),
+            )
+            return True
+
+    async def release(self, job_id: str, worker_id: str) -> None:
+        """Return a job to the queue without counting the attempt (e.g. on shutdown)."""
+        await asyncio.to_thread(self._release, job_id, worker_id)
+
+    def _release(self, job_id: str, worker_id: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), "
+                "available_at = ?, lease_expires_at = NULL, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (now, now, job_id, worker_id),
+            )
+
+    # ---- Stats ----
+
+    async def counts(self) -> dict:
+        """Number of jobs per status."""
+        return await asyncio.to_thread(self._counts)
+
+    def _counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return dict(rows)
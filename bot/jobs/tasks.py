@@ -0,0 +1,103 @@
+"""
+Agent Pilot Bot - Job Tasks
+===========================
+Handlers for each job kind processed by the worker pool.
+"""
+
+import logging
+
+from telegram import Bot
+
+from database.supabase_client import db
+from ai_swarm.orchestrator import SwarmMode
+from core.handlers.message_handlers import analysis_cost, run_analysis
+from core.messaging.outbound import BULK, outbound
+from .queue import Job, JobQueue
+
+logger = logging.getLogger(__name__)
+
+
+def charge_key(job: Job) -> str:
+    """Idempotency key of the credit charge for a job, stable across redeliveries."""
+    return f"job:{job.id}"
+
+
+def make_analysis_handler(bot: Bot):
+    """Build the handler for "analysis" jobs, delivering results with `bot`."""
+
+    async def handle_analysis_job(job: Job, queue: JobQueue) -> None:
+        payload = job.payload
+        chat_id = payload["chat_id"]
+
+        # A redelivered job that was already charged only needs delivery
+        response = job.state.get("response")
+        if response is None:
+            user = await db.get_user_by_telegram_id(payload["telegram_id"])
+            if not user:
+                logger.warning(f"Job {job.id}: user {payload['telegram_id']} not found")
+                return
+
+            mode = SwarmMode(payload["mode"])
+            cost = analysis_cost(mode, user)
+            if user["creditos_disponibles"] < cost:
+                await outbound.send_message(
+                    bot,
+                    chat_id,
+                    f"Creditos insuficientes.\n"
+                    f"Necesitas {cost} creditos, tienes {user['creditos_disponibles']}.",
+                    priority=BULK
+                )
+                return
+
+            try:
+                response = await run_analysis(
+                    user, payload["prompt"], mode, cost, charge_key=charge_key(job)
+                )
+            except Exception as e:
+                if job.attempts >= job.max_attempts:
+                    await outbound.send_message(
+                        bot,
+                        chat_id,
+                        f"Error al procesar: {str(e)}\n"
+                        f"No se han descontado creditos.",
+                        priority=BULK
+                    )
+                raise
+
+            await queue.save_state(job.id, {**job.state, "response": response})
+
+        await outbound.send_message(bot, chat_id, response, parse_mode="Markdown", priority=BULK)
+
+    return handle_analysis_job
+
+
+def make_dead_analysis_handler(bot: Bot):
+    """Build the handler for "analysis" jobs that died when their last lease expired."""
+
+    async def handle_dead_analysis_job(job: Job) -> None:
+        chat_id = job.payload["chat_id"]
+
+        # Charged and answered before the worker died: the result only needs delivery
+        response = job.state.get("response")
+        if response is not None:
+            await outbound.send_message(bot, chat_id, response, parse_mode="Markdown", priority=BULK)
+            return
+
+        if await db.has_charge(charge_key(job)):
+            await outbound.send_message(
+                bot,
+                chat_id,
+                "Error al procesar: el servicio se interrumpio al enviar tu resultado.\n"
+                "Contacta con soporte para recuperarlo.",
+                priority=BULK
+            )
+        else:
+            await outbound.send_message(
+                bot,
+                chat_id,
+                "Error al procesar: el servicio no respondio a tiempo.\n"
+                "No se han descontado creditos.",
+                priority=BULK
+            )
+
+    return handle_dead_analysis_job
@@ -0,0 +1,146 @@
+"""
+Agent Pilot Bot - Job Worker
+============================
+Async worker loop that claims jobs from the JobQueue and runs them.
+Jobs that die because their last lease expired are handed to the
+dead-job handler of their kind, so the user hears about it.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from typing import Awaitable, Callable, Dict, Optional
+
+from .queue import Job, JobQueue
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Job, JobQueue], Awaitable[None]]
+DeadJobHandler = Callable[[Job], Awaitable[None]]
+
+
+class JobWorker:
+    """Runs `concurrency` claim loops against a JobQueue."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, JobHandler],
+        concurrency: int = 4,
+        poll_interval: float = 1.0,
+        drain_timeout: float = 25.0,
+        heartbeat_interval: float = 5.0,
+        dead_handlers: Optional[Dict[str, DeadJobHandler]] = None,
+    ):
+        self.queue = queue
+        self.handlers = handlers
+        self.dead_handlers = dead_handlers or {}
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.drain_timeout = drain_timeout
+        # Also how soon a cancelled job is noticed
+        self.heartbeat_interval = min(heartbeat_interval, max(1.0, queue.visibility_timeout / 3))
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = asyncio.Event()
+        self._slots: list = []
+
+    def stop(self) -> None:
+        """
+        Stop claiming new jobs. Running jobs get drain_timeout seconds to
+        finish; after that they are cancelled and returned to the queue.
+        """
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        asyncio.get_running_loop().call_later(self.drain_timeout, self._cancel_slots)
+
+    def _cancel_slots(self) -> None:
+        for slot in self._slots:
+            slot.cancel()
+
+    async def run(self) -> None:
+        """Run until stop() is called."""
+        logger.info(f"Job worker {self.worker_id} started ({self.concurrency} slots)")
+        self._slots = [
+            asyncio.create_task(self._loop(slot)) for slot in range(self.concurrency)
+        ]
+        self._slots.append(asyncio.create_task(self._reaper()))
+        await asyncio.gather(*self._slots, return_exceptions=True)
+        logger.info(f"Job worker {self.worker_id} stopped")
+
+    async def _loop(self, slot: int) -> None:
+        worker_id = f"{self.worker_id}:{slot}"
+        while not self._stopping.is_set():
+            job = await self.queue.claim(worker_id)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run_job(job, worker_id)
+
+    async def _reaper(self) -> None:
+        """Collect jobs whose last lease expired and run their dead-job handlers."""
+        while not self._stopping.is_set():
+            try:
+                for job in await self.queue.reap_dead():
+                    logger.error(
+                        f"Job {job.id} dead: lease expired on attempt "
+                        f"{job.attempts}/{job.max_attempts}"
+                    )
+                    handler = self.dead_handlers.get(job.kind)
+                    if handler is not None:
+                        try:
+                            await handler(job)
+                        except Exception as e:
+                            logger.error(f"Dead-job handler failed for job {job.id}: {e}")
+            except Exception as e:
+                logger.error(f"Reaping dead jobs failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.heartbeat_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_job(self, job: Job, worker_id: str) -> None:
+        handler = self.handlers.get(job.kind)
+        if handler is None:
+            await self.queue.nack(job.id, worker_id, f"No handler for job kind: {job.kind}")
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(job.id, worker_id))
+        run = asyncio.create_task(handler(job, self.queue))
+        try:
+            await asyncio.wait({run, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+            if not run.done() and heartbeat.exception() is None:
+                # Lease lost: the job was cancelled or another worker took it
+                run.cancel()
+                await asyncio.wait({run})
+                logger.info(f"Stopped job {job.id}: cancelled or lease lost")
+                return
+            await run
+        except asyncio.CancelledError:
+            # Shutting down: give the job back without burning an attempt
+            run.cancel()
+            await self.queue.release(job.id, worker_id)
+            raise
+        except Exception as e:
+            retried = await self.queue.nack(job.id, worker_id, str(e))
+            logger.error(
+                f"Job {job.id} failed (attempt {job.attempts}/{job.max_attempts}, "
+                f"{'retrying' if retried else 'giving up'}): {e}"
+            )
+        else:
+            if not await self.queue.ack(job.id, worker_id):
+                logger.warning(f"Job {job.id} finished after its lease was lost; not acked")
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job_id: str, worker_id: str) -> None:
+        """Keep the lease alive while the job is running."""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if not await self.queue.extend_lease(job_id, worker_id):
+                logger.warning(f"Lost lease on job {job_id}")
+                return
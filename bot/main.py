@@ -7,7 +7,11 @@ Replace this placeholder with your complete main.py
 
 import logging
 import asyncio
+import signal
+import sys
+from typing import Optional
 from telegram import Update
+from telegram.error import RetryAfter
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -23,10 +27,17 @@ from core.handlers.command_handlers import (
     saldo_command,
     analizar_command,
     perfil_command,
+    cancelar_command,
 )
 from core.handlers.callback_handlers import handle_callback
-from core.handlers.message_handlers import handle_message
+from core.handlers.message_handlers import handle_message, get_council
 from core.middleware.auth import auth_middleware
+from core.startup import profile_startup, warm_up_sdks
+from core.lifecycle import in_flight
+from payments.pricing import pricing
+from core.middleware.anomaly import anomaly_detector
+from database.persistence import SQLitePersistence
+from database.credentials import credential_store
 
 # Configure logging
 logging.basicConfig(
@@ -38,19 +49,69 @@ logger = logging.getLogger(__name__)
 
 async def error_handler(update: Update, context) -> None:
     """Handle errors in the bot."""
+    if isinstance(context.error, RetryAfter):
+        # Sends through core.messaging.outbound retry on their own; this is
+        # a direct reply_text that hit flood control
+        logger.warning(f"Flood control exceeded, retry after {context.error.retry_after}s")
+        return
     logger.error(f"Exception while handling an update: {context.error}")
 
 
-def main() -> None:
-    """Start the bot."""
-    logger.info("Starting Agent Pilot Bot...")
+async def start_services(application: Application) -> None:
+    """Build shared services once, then warm lazy SDKs in the background."""
+    await pricing.refresh()
+    application.create_task(pricing.refresh_forever())
+    application.create_task(credential_store.watch_forever())
+    get_council()
+    application.create_task(warm_up_sdks())
+
+
+async def stop_services() -> None:
+    """Finish (or interrupt) in-flight swarm requests and flush pending writes."""
+    await in_flight.drain(settings.shutdown_drain_timeout)
+    await get_council().key_pools.flush_usage()
+    await anomaly_detector.flush()
+
+
+async def drain_and_stop(application: Application) -> None:
+    """Drain in-flight requests, then stop polling."""
+    await stop_services()
+    application.stop_running()
+
+
+async def post_init(application: Application) -> None:
+    """Start shared services and drain on shutdown signals."""
+    await start_services(application)
+
+    # Drain on SIGINT/SIGTERM instead of stopping mid-request
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(
+                sig, lambda: application.create_task(drain_and_stop(application))
+            )
+        except NotImplementedError:
+            # Windows: no loop signal handlers, Ctrl+C stops without draining
+            pass
 
-    # Create application
-    application = (
-        Application.builder()
-        .token(settings.telegram_bot_token)
-        .build()
-    )
+
+def build_application(updater: bool = True, state_path: Optional[str] = None) -> Application:
+    """
+    Create the application and register all handlers.
+
+    Without an updater (cluster workers) updates are put on
+    application.update_queue by the caller and post_init is not run.
+    Conversation state is kept in `state_path` (default PERSISTENCE_PATH).
+    """
+    builder = Application.builder().token(settings.telegram_bot_token).post_init(post_init)
+    if not updater:
+        builder = builder.updater(None)
+    state_path = state_path or settings.persistence_path
+    if state_path:
+        builder = builder.persistence(
+            SQLitePersistence(state_path, update_interval=settings.persistence_flush_interval)
+        )
+    application = builder.build()
 
     # Add handlers
     application.add_handler(CommandHandler("start", start_command))
@@ -58,21 +119,37 @@ def main() -> None:
     application.add_handler(CommandHandler("saldo", saldo_command))
     application.add_handler(CommandHandler("analizar", analizar_command))
     application.add_handler(CommandHandler("perfil", perfil_command))
+    application.add_handler(CommandHandler("cancelar", cancelar_command))
 
     # Callback queries (inline buttons)
     application.add_handler(CallbackQueryHandler(handle_callback))
 
-    # Message handler (non-commands)
+    # Message handler (non-commands). Non-blocking, so /cancelar and newer
+    # messages are handled while an analysis is still running
     application.add_handler(
-        MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message)
+        MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message, block=False)
     )
 
     # Error handler
     application.add_error_handler(error_handler)
 
+    return application
+
+
+def main() -> None:
+    """Start the bot."""
+    if "--profile-startup" in sys.argv:
+        profile_startup()
+        return
+
+    logger.info("Starting Agent Pilot Bot...")
+
+    # Create application
+    application = build_application()
+
     # Run the bot
     logger.info("Bot is running. Press Ctrl+C to stop.")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    application.run_polling(allowed_updates=Update.ALL_TYPES, stop_signals=None)
 
 
 if __name__ == "__main__":
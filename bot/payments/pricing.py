@@ -0,0 +1,168 @@
+"""
+Agent Pilot Bot - Pricing Catalog
+=================================
+In-memory snapshot of operation costs (costes_operaciones) and plans
+(planes_precios). The snapshot is loaded at startup, refreshed in the
+background and swapped atomically; readers never query the database or
+take a lock.
+
+Bot modes map to DB operations through OPERATION_ALIASES; CREATIVE is
+priced per format ("creative:<content_type>"). Anything the tables don't
+define falls back to CREDIT_COSTS / PLAN_LIMITS in config.py.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, Optional
+
+from config import CREDIT_COSTS, PLAN_LIMITS, settings
+from database.supabase_client import db
+
+logger = logging.getLogger(__name__)
+
+# Bot mode / operation name -> costes_operaciones.operacion
+OPERATION_ALIASES = {
+    "fast": "analisis_rapido",
+    "consensus": "analisis_consenso",
+    "creative": "guion_reel",  # No content_type: a reel
+    "creative:reel": "guion_reel",
+    "creative:thread": "hilo_twitter",
+    "creative:caption": "caption_instagram",
+}
+
+
+@dataclass(frozen=True)
+class PricingSnapshot:
+    """Immutable view of prices and plans at one point in time."""
+    costs: Dict[str, int]
+    byoa_costs: Dict[str, int]
+    plans: Dict[str, dict]
+    source: str = "config"
+    loaded_at: float = field(default_factory=time.time)
+    cascade_policy: Dict[str, str] = field(init=False)
+
+    def __post_init__(self):
+        # CASCADE only escalates to the Council on plans with consensus
+        object.__setattr__(self, "cascade_policy", {
+            name: "auto" if plan.get("consensus_enabled") else "never"
+            for name, plan in self.plans.items()
+        })
+
+    @classmethod
+    def from_config(cls) -> "PricingSnapshot":
+        plans = {
+            name: {**limits, "level": level}
+            for level, (name, limits) in enumerate(PLAN_LIMITS.items())
+        }
+        return cls(costs=dict(CREDIT_COSTS), byoa_costs={}, plans=plans)
+
+    @classmethod
+    def from_rows(cls, cost_rows: list, plan_rows: list) -> "PricingSnapshot":
+        """Build a snapshot from DB rows, on top of the config defaults."""
+        base = cls.from_config()
+
+        costs = dict(base.costs)
+        byoa_costs = {}
+        for row in cost_rows:
+            costs[row["operacion"]] = row["creditos_base"]
+            if row.get("creditos_con_api_propia") is not None:
+                byoa_costs[row["operacion"]] = row["creditos_con_api_propia"]
+        for alias, operation in OPERATION_ALIASES.items():
+            if operation in costs:
+                costs[alias] = costs[operation]
+            if operation in byoa_costs:
+                byoa_costs[alias] = byoa_costs[operation]
+
+        plans = {name: dict(limits) for name, limits in base.plans.items()}
+        # Level = position by (orden, price); seeded rows all have orden 0
+        ordered = sorted(
+            plan_rows,
+            key=lambda row: (row.get("orden") or 0, float(row.get("precio_mensual_eur") or 0))
+        )
+        for level, row in enumerate(ordered):
+            features = row.get("features") or {}
+            plan = plans.setdefault(row["nombre"], {})
+            plan.update({
+                "credits_monthly": row.get("creditos_mensuales") or 0,
+                "consensus_enabled": bool(features.get("modo_consenso", plan.get("consensus_enabled"))),
+                "byoa_enabled": bool(features.get("byoa_permitido", plan.get("byoa_enabled"))),
+                "level": level,
+            })
+
+        return cls(costs=costs, byoa_costs=byoa_costs, plans=plans, source="db")
+
+
+class LiveMapping(Mapping):
+    """Read-only mapping that always reads the catalog's current snapshot."""
+
+    def __init__(self, getter: Callable[[], Mapping]):
+        self._getter = getter
+
+    def __getitem__(self, key):
+        return self._getter()[key]
+
+    def __iter__(self) -> Iterator:
+        return iter(self._getter())
+
+    def __len__(self) -> int:
+        return len(self._getter())
+
+
+class PricingCatalog:
+    """Current prices and plans, refreshed in the background."""
+
+    def __init__(self, refresh_interval: int = 300):
+        self.refresh_interval = refresh_interval
+        self._snapshot = PricingSnapshot.from_config()
+
+        # Live views for components configured once at startup
+        self.costs = LiveMapping(lambda: self._snapshot.costs)
+        self.byoa_costs = LiveMapping(lambda: self._snapshot.byoa_costs)
+        self.cascade_policy = LiveMapping(lambda: self._snapshot.cascade_policy)
+
+    @property
+    def snapshot(self) -> PricingSnapshot:
+        return self._snapshot
+
+    def cost(self, operation: str, default: Optional[int] = None) -> int:
+        costs = self._snapshot.costs
+        if default is None:
+            return costs[operation]
+        return costs.get(operation, default)
+
+    def byoa_cost(self, operation: str) -> Optional[int]:
+        return self._snapshot.byoa_costs.get(operation)
+
+    def plan(self, name: str) -> dict:
+        """Limits of a plan (free's if unknown)."""
+        plans = self._snapshot.plans
+        return plans.get(name) or plans.get("free", {})
+
+    def plan_level(self, name: str) -> int:
+        return self.plan(name).get("level", 0)
+
+    async def refresh(self) -> bool:
+        """Reload from the DB. Keeps the current snapshot if that fails."""
+        try:
+            cost_rows = await db.get_operation_costs()
+            plan_rows = await db.get_plans()
+        except Exception as e:
+            logger.error(f"Could not refresh pricing catalog: {e}")
+            return False
+
+        # One reference assignment: readers see the old or the new snapshot
+        self._snapshot = PricingSnapshot.from_rows(cost_rows, plan_rows)
+        return True
+
+    async def refresh_forever(self) -> None:
+        """Background task: refresh every refresh_interval seconds."""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh()
+
+
+# Global instance
+pricing = PricingCatalog(refresh_interval=settings.pricing_refresh_interval)
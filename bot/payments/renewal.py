@@ -0,0 +1,135 @@
+"""
+Agent Pilot Bot - Subscription Renewal
+======================================
+Grants monthly plan credits to every user whose fecha_renovacion_plan is
+due. Due users are read in keyset-paginated batches and each batch is
+renewed by one set-based SQL call (renovar_planes_lote), which updates the
+balances, writes the transacciones rows and moves the renewal dates
+forward in a single transaction.
+
+Safe to re-run after a crash: renewed users are no longer due, so a second
+run only picks up what the first one didn't finish.
+
+    python -m payments.renewal [--until 2025-01-01T00:00:00+00:00] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from config import settings
+from database.supabase_client import db
+from payments.pricing import pricing
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RenewalReport:
+    """Summary of a renewal run."""
+    until: str
+    batches: int = 0
+    due: int = 0
+    renewed: int = 0
+    credits_granted: int = 0
+    duration_ms: int = 0
+
+    @property
+    def skipped(self) -> int:
+        """Due users not renewed by this run (e.g. renewed concurrently)."""
+        return self.due - self.renewed
+
+
+class RenewalEngine:
+    """Renews due subscriptions in batches."""
+
+    def __init__(
+        self,
+        batch_size: int = 1000,
+        plan_credits: Optional[Dict[str, int]] = None
+    ):
+        self.batch_size = batch_size
+        self.plan_credits = plan_credits or {
+            plan: limits["credits_monthly"]
+            for plan, limits in pricing.snapshot.plans.items()
+            if limits.get("credits_monthly")
+        }
+
+    async def run(
+        self,
+        until: Optional[datetime] = None,
+        dry_run: bool = False
+    ) -> RenewalReport:
+        """
+        Renew every subscription due at `until` (default: now).
+
+        With dry_run, only counts the due users.
+        """
+        until = (until or datetime.now(timezone.utc)).isoformat()
+        report = RenewalReport(until=until)
+        start = time.time()
+        plans = list(self.plan_credits)
+        cursor = None
+
+        while True:
+            batch = await db.get_due_renewals(until, plans, after=cursor, limit=self.batch_size)
+            if not batch:
+                break
+            report.batches += 1
+            report.due += len(batch)
+            cursor = (batch[-1]["fecha_renovacion_plan"], batch[-1]["id"])
+
+            if not dry_run:
+                renewed = await db.renew_plans(
+                    [user["id"] for user in batch], self.plan_credits, until
+                )
+                report.renewed += len(renewed)
+                report.credits_granted += sum(row["creditos"] for row in renewed)
+                logger.info(
+                    f"Renewal batch {report.batches}: {len(renewed)}/{len(batch)} users renewed"
+                )
+
+            if len(batch) < self.batch_size:
+                break
+
+        report.duration_ms = int((time.time() - start) * 1000)
+        logger.info(
+            f"Renewal {'dry run ' if dry_run else ''}until {until}: "
+            f"{report.due} due, {report.renewed} renewed, "
+            f"{report.credits_granted} credits granted in {report.duration_ms} ms"
+        )
+        return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Grant monthly credits to due subscriptions")
+    parser.add_argument(
+        "--until",
+        type=datetime.fromisoformat,
+        default=None,
+        help="Renew subscriptions due at this ISO timestamp (default: now)",
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Only count due users")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=getattr(logging, settings.log_level),
+    )
+
+    async def renew():
+        # Grant the credits currently set in planes_precios
+        await pricing.refresh()
+        engine = RenewalEngine(batch_size=args.batch_size)
+        await engine.run(until=args.until, dry_run=args.dry_run)
+
+    asyncio.run(renew())
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,7 @@ Manages credit operations and Stripe integration.
 
 from typing import Optional
 from database.supabase_client import db
-from config import CREDIT_COSTS, PLAN_LIMITS
+from payments.pricing import pricing
 
 
 class TokenManager:
@@ -29,7 +29,7 @@ class TokenManager:
         Returns:
             Tuple of (success, remaining_credits)
         """
-        cost = custom_cost or CREDIT_COSTS.get(operation, 1)
+        cost = custom_cost or pricing.cost(operation, 1)
 
         success = await db.deduct_credits(user_id, cost, f"Operación: {operation}")
 
@@ -75,7 +75,7 @@ class TokenManager:
         Returns:
             New credit balance
         """
-        credits = PLAN_LIMITS.get(plan, {}).get("credits_monthly", 0)
+        credits = pricing.snapshot.plans.get(plan, {}).get("credits_monthly", 0)
 
         return await db.add_credits(
             user_id,
@@ -83,6 +83,17 @@ class TokenManager:
             f"Créditos mensuales plan {plan}"
         )
 
+    @staticmethod
+    async def renew_due_subscriptions(batch_size: int = 1000):
+        """
+        Grant monthly credits to every subscription due now, in bulk.
+
+        Returns:
+            RenewalReport with the counts of the run
+        """
+        from payments.renewal import RenewalEngine
+        return await RenewalEngine(batch_size=batch_size).run()
+
     @staticmethod
     async def refund_credits(user_id: str, amount: int, reason: str) -> int:
         """
@@ -0,0 +1,15 @@
+"""
+Agent Pilot Bot - Test Configuration
+====================================
+Puts the bot package on sys.path (modules import each other as
+top-level packages) and provides the settings Settings() requires.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test-token")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
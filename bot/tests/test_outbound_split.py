@@ -0,0 +1,64 @@
+"""split_message: length limit and Markdown entity balancing."""
+
+import pytest
+
+from core.messaging.outbound import _entity_states, split_message
+
+
+def balanced(part: str) -> bool:
+    return _entity_states(part)[-1] is None
+
+
+def test_short_text_is_one_part():
+    assert split_message("*Analisis*\n\nTodo bien.") == ["*Analisis*\n\nTodo bien."]
+
+
+def test_parts_respect_limit_and_keep_text():
+    text = "\n\n".join(f"Parrafo {i}: " + "palabra " * 30 for i in range(40))
+    parts = split_message(text, limit=500)
+
+    assert len(parts) > 1
+    assert all(len(part) <= 500 for part in parts)
+    assert " ".join(" ".join(parts).split()) == " ".join(text.split())
+
+
+@pytest.mark.parametrize("entity", ["*", "_", "`"])
+def test_never_cuts_inside_an_entity(entity):
+    text = " ".join(
+        f"{entity}dato importante numero {i}{entity} y texto normal" for i in range(60)
+    )
+    parts = split_message(text, limit=300)
+
+    assert len(parts) > 1
+    for part in parts:
+        assert len(part) <= 300
+        assert balanced(part), part
+
+
+def test_never_cuts_inside_a_link():
+    text = " ".join(
+        f"Fuente [informe del banco {i}](https://example.com/informe/{i})" for i in range(30)
+    )
+    for part in split_message(text, limit=200):
+        assert part.count("[") == part.count("]")
+        assert part.count("(") == part.count(")")
+
+
+def test_long_code_block_is_closed_and_reopened():
+    code = "\n".join(f"linea_{i} = {i} * 2" for i in range(100))
+    text = f"Codigo:\n\n```\n{code}\n```"
+    parts = split_message(text, limit=400)
+
+    assert len(parts) > 1
+    for part in parts:
+        assert len(part) <= 400
+        assert balanced(part), part
+    assert parts[1].startswith("```\n")
+
+
+def test_unbalanced_markdown_is_split_as_plain_text():
+    text = "*sin cerrar " + "palabra " * 200
+    parts = split_message(text, limit=300)
+
+    assert all(len(part) <= 300 for part in parts)
+    assert parts[0].startswith("*sin cerrar")
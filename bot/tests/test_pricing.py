@@ -0,0 +1,70 @@
+"""PricingSnapshot: DB operations resolve to bot modes through the aliases."""
+
+from config import CREDIT_COSTS
+from payments.pricing import OPERATION_ALIASES, PricingSnapshot
+
+COST_ROWS = [
+    {"operacion": "analisis_rapido", "creditos_base": 2, "creditos_con_api_propia": 1},
+    {"operacion": "analisis_consenso", "creditos_base": 6, "creditos_con_api_propia": None},
+    {"operacion": "guion_reel", "creditos_base": 8, "creditos_con_api_propia": 3},
+    {"operacion": "hilo_twitter", "creditos_base": 15, "creditos_con_api_propia": 5},
+    {"operacion": "caption_instagram", "creditos_base": 4, "creditos_con_api_propia": 2},
+]
+
+PLAN_ROWS = [
+    {"nombre": "pro", "creditos_mensuales": 2500, "precio_mensual_eur": "29.00",
+     "features": {"modo_consenso": True, "byoa_permitido": True}},
+    {"nombre": "free", "creditos_mensuales": 30, "precio_mensual_eur": "0",
+     "features": {"modo_consenso": False, "byoa_permitido": False}},
+]
+
+
+def test_modes_resolve_to_db_operations():
+    snapshot = PricingSnapshot.from_rows(COST_ROWS, PLAN_ROWS)
+
+    assert snapshot.costs["fast"] == 2
+    assert snapshot.costs["consensus"] == 6
+    assert snapshot.costs["creative"] == 8
+    assert snapshot.source == "db"
+
+
+def test_creative_is_priced_per_content_type():
+    snapshot = PricingSnapshot.from_rows(COST_ROWS, PLAN_ROWS)
+
+    assert snapshot.costs["creative:reel"] == 8
+    assert snapshot.costs["creative:thread"] == 15
+    assert snapshot.costs["creative:caption"] == 4
+    assert snapshot.byoa_costs["creative:thread"] == 5
+    assert snapshot.byoa_costs["creative:caption"] == 2
+
+
+def test_byoa_prices_only_where_defined():
+    snapshot = PricingSnapshot.from_rows(COST_ROWS, PLAN_ROWS)
+
+    assert snapshot.byoa_costs["fast"] == 1
+    assert "consensus" not in snapshot.byoa_costs
+
+
+def test_missing_operations_fall_back_to_config():
+    snapshot = PricingSnapshot.from_rows(COST_ROWS[:1], [])
+
+    assert snapshot.costs["fast"] == 2
+    assert snapshot.costs["deep_analysis"] == CREDIT_COSTS["deep_analysis"]
+    assert snapshot.costs["creative:thread"] == CREDIT_COSTS["creative:thread"]
+
+
+def test_config_defines_every_alias():
+    snapshot = PricingSnapshot.from_config()
+
+    assert all(alias in snapshot.costs for alias in OPERATION_ALIASES)
+    assert snapshot.byoa_costs == {}
+
+
+def test_plans_are_levelled_by_price():
+    snapshot = PricingSnapshot.from_rows(COST_ROWS, PLAN_ROWS)
+
+    assert snapshot.plans["free"]["level"] == 0
+    assert snapshot.plans["pro"]["level"] == 1
+    assert snapshot.plans["pro"]["credits_monthly"] == 2500
+    assert snapshot.cascade_policy["pro"] == "auto"
+    assert snapshot.cascade_policy["free"] == "never"
@@ -0,0 +1,76 @@
+"""Response cache: exact-match hit/miss contract, TTL and LRU limit."""
+
+import pytest
+
+from ai_swarm import response_cache as response_cache_module
+from ai_swarm.response_cache import ResponseCache, content_key
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(ttl_seconds=60, max_entries=3)
+
+
+@pytest.fixture
+def partition():
+    return ResponseCache.partition_key({"nicho": "finanzas"}, [], "fast")
+
+
+def test_same_question_with_different_form_hits(cache, partition):
+    cache.put(partition, "Analiza la subida de tipos del BCE", "respuesta")
+
+    hit = cache.get(partition, "analiza subida de tipos del bce?")
+    assert hit is not None
+    assert hit.response == "respuesta"
+    assert cache.stats["hit"] == 1
+
+
+@pytest.mark.parametrize("other", [
+    "Analiza la bajada de tipos del BCE",
+    "No analiza la subida de tipos del BCE",
+    "Tipos del BCE: analiza la subida",
+])
+def test_different_question_misses(cache, partition, other):
+    cache.put(partition, "Analiza la subida de tipos del BCE", "respuesta")
+
+    assert cache.get(partition, other) is None
+    assert cache.stats["miss"] == 1
+
+
+def test_partitions_do_not_share_answers(cache, partition):
+    other_profile = ResponseCache.partition_key({"nicho": "fitness"}, [], "fast")
+    other_mode = ResponseCache.partition_key({"nicho": "finanzas"}, [], "creative", "reel")
+    cache.put(partition, "Ideas para un reel", "respuesta")
+
+    assert cache.get(other_profile, "Ideas para un reel") is None
+    assert cache.get(other_mode, "Ideas para un reel") is None
+
+
+def test_expired_entries_miss_and_are_dropped(cache, partition, monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(response_cache_module.time, "time", lambda: now)
+    cache.put(partition, "Pregunta", "respuesta")
+
+    now += 59
+    assert cache.get(partition, "Pregunta").age_s == 59
+
+    now += 1
+    assert cache.get(partition, "Pregunta") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted(cache, partition):
+    for question in ("uno", "dos", "tres"):
+        cache.put(partition, question, question)
+    cache.get(partition, "uno")
+    cache.put(partition, "cuatro", "cuatro")
+
+    assert len(cache) == 3
+    assert cache.get(partition, "dos") is None
+    assert cache.get(partition, "uno").response == "uno"
+    assert cache.stats["evicted"] == 1
+
+
+def test_content_key_ignores_case_accents_and_stopwords():
+    assert content_key("¿Qué opinas de la inflación?") == content_key("que opinas inflacion")
+    assert content_key("subida de tipos") != content_key("tipos de subida")
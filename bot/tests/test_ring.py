@@ -0,0 +1,64 @@
+"""HashRing: stable ownership and minimal movement when workers change."""
+
+from cluster.ring import HashRing
+
+USERS = range(10_000)
+
+
+def owners(ring: HashRing) -> dict:
+    return {user: ring.node_for(user) for user in USERS}
+
+
+def test_empty_ring_has_no_owner():
+    assert HashRing().node_for(42) is None
+
+
+def test_mapping_is_stable_across_instances_and_insertion_order():
+    first = HashRing(["w1", "w2", "w3"])
+    second = HashRing(["w3", "w1", "w2"])
+
+    assert owners(first) == owners(second)
+
+
+def test_keys_spread_over_all_nodes():
+    ring = HashRing(["w1", "w2", "w3", "w4"])
+    counts = {}
+    for node in owners(ring).values():
+        counts[node] = counts.get(node, 0) + 1
+
+    assert set(counts) == {"w1", "w2", "w3", "w4"}
+    assert min(counts.values()) > len(USERS) / 4 * 0.7
+
+
+def test_adding_a_node_only_moves_keys_to_it():
+    ring = HashRing(["w1", "w2", "w3"])
+    before = owners(ring)
+    ring.add("w4")
+    after = owners(ring)
+
+    moved = [user for user in USERS if before[user] != after[user]]
+    assert all(after[user] == "w4" for user in moved)
+    assert len(moved) < len(USERS) / 4 * 1.3
+
+
+def test_removing_a_node_only_moves_its_keys():
+    ring = HashRing(["w1", "w2", "w3", "w4"])
+    before = owners(ring)
+    ring.remove("w2")
+    after = owners(ring)
+
+    for user in USERS:
+        if before[user] != "w2":
+            assert after[user] == before[user]
+        else:
+            assert after[user] in {"w1", "w3", "w4"}
+
+
+def test_add_and_remove_are_idempotent():
+    ring = HashRing(["w1", "w2"])
+    before = owners(ring)
+    ring.add("w1")
+    ring.remove("w9")
+
+    assert len(ring) == 2
+    assert owners(ring) == before
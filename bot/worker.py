@@ -0,0 +1,102 @@
+"""
+Agent Pilot Bot - Job Worker Entry Point
+========================================
+Runs the swarm worker pool that consumes the durable job queue.
+Scale it independently from the Telegram front end:
+
+    python worker.py --processes 2 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import signal
+
+from telegram import Bot
+
+from config import settings
+from jobs.queue import JobQueue
+from jobs.tasks import make_analysis_handler, make_dead_analysis_handler
+from jobs.worker import JobWorker
+from core.handlers.message_handlers import get_council
+from payments.pricing import pricing
+from core.middleware.anomaly import anomaly_detector
+from database.credentials import credential_store
+
+# Configure logging
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    level=getattr(logging, settings.log_level),
+)
+logger = logging.getLogger(__name__)
+
+
+async def run_worker(concurrency: int) -> None:
+    """Run one worker process until SIGINT/SIGTERM."""
+    queue = JobQueue(
+        settings.job_queue_path,
+        visibility_timeout=settings.job_queue_visibility_timeout,
+        max_attempts=settings.job_queue_max_attempts,
+    )
+    bot = Bot(settings.telegram_bot_token)
+    await pricing.refresh()
+    refresher = asyncio.create_task(pricing.refresh_forever())
+    watcher = asyncio.create_task(credential_store.watch_forever())
+
+    async with bot:
+        worker = JobWorker(
+            queue,
+            handlers={"analysis": make_analysis_handler(bot)},
+            dead_handlers={"analysis": make_dead_analysis_handler(bot)},
+            concurrency=concurrency,
+            drain_timeout=settings.shutdown_drain_timeout,
+        )
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stop)
+        await worker.run()
+        await get_council().key_pools.flush_usage()
+        await anomaly_detector.flush()
+
+    refresher.cancel()
+    watcher.cancel()
+    queue.close()
+
+
+def _process_main(concurrency: int) -> None:
+    asyncio.run(run_worker(concurrency))
+
+
+def main() -> None:
+    """Start the worker pool."""
+    parser = argparse.ArgumentParser(description="Agent Pilot job workers")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=settings.job_workers)
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _process_main(args.concurrency)
+        return
+
+    processes = [
+        multiprocessing.Process(target=_process_main, args=(args.concurrency,))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    # Forward shutdown signals so each child drains its own jobs
+    def forward(signum, frame):
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGINT, forward)
+    signal.signal(signal.SIGTERM, forward)
+
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -76,6 +76,8 @@ CREATE INDEX idx_usuarios_telegram_id ON usuarios_pro(telegram_user_id);
 CREATE INDEX idx_usuarios_email ON usuarios_pro(email);
 CREATE INDEX idx_usuarios_plan ON usuarios_pro(plan_actual);
 CREATE INDEX idx_usuarios_estado ON usuarios_pro(estado);
+CREATE INDEX idx_usuarios_renovacion ON usuarios_pro(fecha_renovacion_plan, id)
+    WHERE fecha_renovacion_plan IS NOT NULL;
 
 -- ============================================================================
 -- TABLA: credenciales_api
@@ -188,6 +190,9 @@ CREATE INDEX idx_transacciones_usuario ON transacciones(usuario_id);
 CREATE INDEX idx_transacciones_tipo ON transacciones(tipo);
 CREATE INDEX idx_transacciones_fecha ON transacciones(created_at);
 CREATE INDEX idx_transacciones_stripe ON transacciones(stripe_payment_id);
+-- Cobros idempotentes (p. ej. trabajos de la cola reentregados)
+CREATE UNIQUE INDEX idx_transacciones_idempotencia ON transacciones((metadata->>'idempotency_key'))
+    WHERE metadata ? 'idempotency_key';
 
 -- ============================================================================
 -- TABLA: sesiones_ia
@@ -522,6 +527,59 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- ============================================================================
+-- FUNCIÓN: Renovar planes por lotes
+-- Concede los créditos mensuales a los usuarios del lote que sigan pendientes
+-- (fecha_renovacion_plan <= p_hasta), registra sus transacciones y mueve la
+-- fecha al primer ciclo posterior a p_hasta. Idempotente: un usuario ya
+-- renovado deja de estar pendiente, así que repetir el lote no duplica nada.
+-- ============================================================================
+CREATE OR REPLACE FUNCTION renovar_planes_lote(
+    p_ids UUID[],
+    p_planes TEXT[],
+    p_creditos INTEGER[],
+    p_hasta TIMESTAMPTZ
+)
+RETURNS TABLE(usuario_id UUID, creditos INTEGER, saldo_actual INTEGER) AS $$
+    WITH planes AS (
+        SELECT plan, creditos
+        FROM unnest(p_planes, p_creditos) AS p(plan, creditos)
+        WHERE creditos > 0
+    ),
+    pendientes AS (
+        SELECT u.id, u.plan_actual, u.creditos_disponibles, u.fecha_renovacion_plan,
+               p.creditos,
+               EXTRACT(YEAR FROM age(p_hasta, u.fecha_renovacion_plan))::INTEGER * 12
+               + EXTRACT(MONTH FROM age(p_hasta, u.fecha_renovacion_plan))::INTEGER
+               + 1 AS meses
+        FROM usuarios_pro u
+        JOIN planes p ON p.plan = u.plan_actual
+        WHERE u.id = ANY(p_ids)
+          AND u.fecha_renovacion_plan <= p_hasta
+        FOR UPDATE OF u
+    ),
+    renovados AS (
+        UPDATE usuarios_pro u
+        SET creditos_disponibles = u.creditos_disponibles + r.creditos,
+            fecha_renovacion_plan = r.fecha_renovacion_plan + r.meses * INTERVAL '1 month'
+        FROM pendientes r
+        WHERE u.id = r.id
+        RETURNING u.id, r.plan_actual, r.creditos, r.creditos_disponibles AS saldo_anterior,
+                  u.creditos_disponibles AS saldo_posterior, r.fecha_renovacion_plan AS periodo
+    ),
+    movimientos AS (
+        INSERT INTO transacciones (
+            usuario_id, tipo, creditos, saldo_anterior, saldo_posterior,
+            concepto, operacion_tipo, metadata
+        )
+        SELECT id, 'suscripcion', creditos, saldo_anterior, saldo_posterior,
+               'Créditos mensuales plan ' || plan_actual, 'renovacion_plan',
+               jsonb_build_object('periodo', periodo)
+        FROM renovados
+    )
+    SELECT id, creditos, saldo_posterior FROM renovados;
+$$ LANGUAGE sql;
+
 -- ============================================================================
 -- FUNCIÓN: Verificar anomalías de usuario
 -- ============================================================================
@@ -569,6 +627,22 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- ============================================================================
+-- FUNCIÓN: Incrementar uso mensual de credenciales BYOA (por lotes)
+-- ============================================================================
+CREATE OR REPLACE FUNCTION incrementar_uso_credenciales(
+    p_ids UUID[],
+    p_incrementos INTEGER[]
+)
+RETURNS void AS $$
+BEGIN
+    UPDATE credenciales_api c
+    SET uso_actual_mes = COALESCE(c.uso_actual_mes, 0) + u.incremento
+    FROM unnest(p_ids, p_incrementos) AS u(id, incremento)
+    WHERE c.id = u.id;
+END;
+$$ LANGUAGE plpgsql;
+
 -- ============================================================================
 -- ROW LEVEL SECURITY (RLS)
 -- ============================================================================